@@ -0,0 +1 @@
+# Initialisation du module de benchmark
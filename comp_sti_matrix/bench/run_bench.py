@@ -0,0 +1,316 @@
+"""Benchmark des étapes de l'analyse STI sur des jeux de données synthétiques."""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import statistics
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from comp_sti_matrix.bench.synthetic import generer_dataset
+from comp_sti_matrix.core.sti_loader import STILoader
+from comp_sti_matrix.core.readers import LECTEURS
+from comp_sti_matrix.core.main import STIAnalyzer
+from comp_sti_matrix.core.profiling import rss_max_mo
+from comp_sti_matrix.core.moteur_polars import (
+    MOTEUR_POLARS,
+    choisir_moteur,
+    comparer_paire_polars,
+    consolider_polars,
+    preparer_lazy,
+    source_lazy,
+)
+from comp_sti_matrix.core.utils_structural import (
+    KEY_COLS,
+    get_matrix_pairs,
+    preparer_matrice,
+    compare_matrix_entries_multi,
+    analyser_divergences_documentaires,
+    export_df_excel,
+)
+
+
+def chronometrer(fonction, repeat: int):
+    """Exécute `fonction` `repeat` fois ; renvoie (durées, dernier résultat)."""
+    durees = []
+    resultat = None
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        resultat = fonction()
+        durees.append(time.perf_counter() - debut)
+    return durees, resultat
+
+
+def mesure(taille: int, etape: str, durees: list[float], **extra) -> dict:
+    """Formate une mesure pour le fichier JSON."""
+    return {
+        "size": taille,
+        "stage": etape,
+        "median_s": statistics.median(durees),
+        "min_s": min(durees),
+        "repeat": len(durees),
+        **extra,
+    }
+
+
+def bench_lecteurs(taille: int, config_path: str, nom: str, repeat: int) -> list[dict]:
+    """
+    Chronomètre la lecture de la matrice `nom` par chaque lecteur : moteurs
+    Excel via STILoader, puis CSV et Parquet sur un export de la même feuille.
+    """
+    mesures = []
+    for lecteur in ("pandas", "calamine", "openpyxl"):
+        loader = STILoader(config_path, use_cache=False, reader=lecteur)
+        durees, _ = chronometrer(lambda: loader.get_matrix(nom), repeat)
+        mesures.append(mesure(taille, f"STILoader.get_matrix[{lecteur}]", durees))
+
+    loader = STILoader(config_path, use_cache=False, prune_columns=False)
+    df = loader.get_matrix(nom)
+    colonnes = loader.get_required_columns(nom)
+    base = os.path.join(loader.excel_dir, nom)
+    exports = {
+        "csv": (base + ".csv", lambda p: df.to_csv(p, sep="\t", index=False, encoding="utf-8-sig")),
+        "parquet": (base + ".parquet", lambda p: df.astype(str).to_parquet(p, index=False)),
+    }
+    for lecteur, (chemin, exporter) in exports.items():
+        try:
+            exporter(chemin)
+        except ImportError as e:
+            logging.warning("Lecteur %s non mesuré : %s", lecteur, e)
+            continue
+        durees, _ = chronometrer(
+            lambda: LECTEURS[lecteur](chemin, None, 0, colonnes, {}), repeat
+        )
+        mesures.append(mesure(taille, f"STILoader.get_matrix[{lecteur}]", durees))
+    return mesures
+
+
+def memes_tables(attendu, obtenu) -> bool:
+    """Deux DataFrames ont-ils les mêmes colonnes, lignes et valeurs, dans le même ordre ?"""
+    if attendu is None or obtenu is None:
+        return attendu is None and obtenu is None
+    try:
+        pd.testing.assert_frame_equal(
+            attendu.astype(object), obtenu.astype(object),
+            check_dtype=False, check_index_type=False,
+        )
+    except AssertionError:
+        return False
+    return True
+
+
+def bench_polars(taille, loader, labels, attendu, res_sti, repeat) -> list[dict]:
+    """
+    Chronomètre le moteur polars (lecture Parquet, préparation, comparaison
+    et analyse documentaire d'une paire ; consolidation) et vérifie que ses tables sont celles du moteur
+    pandas (`attendu` : exclusifs, commun, divergents, analyse) : l'étape
+    porte `parity` à False sinon.
+    """
+    if choisir_moteur(MOTEUR_POLARS) != MOTEUR_POLARS:
+        return []
+    fields = loader.get_fields_to_compare()
+    durees, (_, exclusifs, commun, divergents, analyse) = chronometrer(
+        lambda: comparer_paire_polars(
+            [preparer_lazy(source_lazy(nom, loader), nom, loader) for nom in labels],
+            labels,
+            fields,
+        ),
+        repeat,
+    )
+    exclusifs_attendus, commun_attendu, divergents_attendus, analyse_attendue = attendu
+    parite = (
+        all(memes_tables(exclusifs_attendus[nom], exclusifs[nom]) for nom in labels)
+        and memes_tables(commun_attendu, commun)
+        and memes_tables(divergents_attendus, divergents)
+        and memes_tables(analyse_attendue[0], analyse[0])
+        and analyse_attendue[1:] == analyse[1:]
+    )
+    mesures = [mesure(taille, "comparer_paire_polars", durees, parity=parite)]
+
+    durees, consolide = chronometrer(lambda: consolider_polars(res_sti), repeat)
+    parite = memes_tables(STIAnalyzer.consolider_dfs(res_sti), consolide)
+    mesures.append(mesure(taille, "consolider_polars", durees, parity=parite))
+    return mesures
+
+
+def _analyse_complete(config_path: str, low_memory: bool):
+    """Exécute l'analyse complète ; renvoie (durée, pic RSS du processus en Mo)."""
+    logging.getLogger().setLevel(logging.WARNING)
+    debut = time.perf_counter()
+    STIAnalyzer(config_path, force=True, low_memory=low_memory).run()
+    return time.perf_counter() - debut, rss_max_mo()
+
+
+def bench_memoire(taille: int, config_path: str, repeat: int) -> list[dict]:
+    """
+    Analyse complète avec et sans --low-memory, chaque exécution dans un
+    processus neuf pour que le pic RSS lui soit propre.
+    """
+    mesures = []
+    contexte = multiprocessing.get_context("spawn")
+    for low_memory in (False, True):
+        durees, pics = [], []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as pool:
+                duree, pic = pool.submit(_analyse_complete, config_path, low_memory).result()
+            durees.append(duree)
+            pics.append(pic)
+        etape = "STIAnalyzer.run[low-memory]" if low_memory else "STIAnalyzer.run"
+        pic = max((p for p in pics if p is not None), default=None)
+        mesures.append(mesure(taille, etape, durees, peak_rss_mb=pic))
+    return mesures
+
+
+def bench_taille(taille: int, workdir: str, repeat: int, familles, n_fields: int) -> list[dict]:
+    """Génère un jeu de `taille` exigences et chronomètre chaque étape."""
+    root = os.path.join(workdir, f"size_{taille}", "_".join(familles))
+    config_path = generer_dataset(
+        root, n_requirements=taille, familles=familles, n_fields=n_fields
+    )
+    mesures = []
+
+    loader = STILoader(config_path, use_cache=False)
+    nom_x, nom_y = get_matrix_pairs(loader)[0]
+    durees, df_brut = chronometrer(lambda: loader.get_matrix(nom_x), repeat)
+    mesures.append(
+        mesure(taille, "STILoader.get_matrix", durees, rows=len(df_brut), cols=df_brut.shape[1])
+    )
+
+    loader_cache = STILoader(config_path, use_cache=True)
+    loader_cache.get_matrix(nom_x)  # Remplit le cache
+    durees, _ = chronometrer(lambda: loader_cache.get_matrix(nom_x), repeat)
+    mesures.append(mesure(taille, "STILoader.get_matrix[cache]", durees))
+    mesures.extend(bench_lecteurs(taille, config_path, nom_x, repeat))
+
+    dfs = [preparer_matrice(nom, loader_cache)[0] for nom in (nom_x, nom_y)]
+    labels = [nom_x, nom_y]
+    fields = loader.get_fields_to_compare()
+    durees, (_, exclusifs, commun, divergents) = chronometrer(
+        lambda: compare_matrix_entries_multi(
+            dfs, labels, key_cols=KEY_COLS, compare_fields=True, fields_to_compare=fields
+        ),
+        repeat,
+    )
+    mesures.append(
+        mesure(taille, "compare_matrix_entries_multi", durees, diff_rows=len(divergents))
+    )
+
+    durees, analyse = chronometrer(
+        lambda: analyser_divergences_documentaires(divergents, source_cols=labels), repeat
+    )
+    mesures.append(mesure(taille, "analyser_divergences_documentaires", durees))
+
+    res_sti = {f"STI{k}": analyse[0] for k in range(4)}
+    durees, consolide = chronometrer(lambda: STIAnalyzer.consolider_dfs(res_sti), repeat)
+    mesures.append(mesure(taille, "consolider_dfs", durees))
+    mesures.extend(
+        bench_polars(
+            taille, loader_cache, labels, (exclusifs, commun, divergents, analyse), res_sti, repeat
+        )
+    )
+
+    export_path = os.path.join(root, "output", "bench_export.xlsx")
+    durees, _ = chronometrer(lambda: export_df_excel(divergents, export_path), repeat)
+    mesures.append(mesure(taille, "export_df_excel", durees, rows=len(divergents)))
+
+    mesures.extend(bench_memoire(taille, config_path, repeat))
+
+    return mesures
+
+
+def comparer_baseline(resultats: list[dict], baseline_path: str, tolerance: float) -> bool:
+    """Affiche les ratios par rapport à la baseline ; False si une étape régresse."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {
+            (m["size"], m["stage"]): m for m in json.load(f)["results"]
+        }
+    ok = True
+    print(f"\n{'taille':>8}  {'étape':<40} {'base (s)':>10} {'actuel (s)':>10} {'ratio':>7}")
+    for m in resultats:
+        ref = baseline.get((m["size"], m["stage"]))
+        if ref is None or ref["median_s"] == 0:
+            continue
+        ratio = m["median_s"] / ref["median_s"]
+        alerte = " <-- régression" if ratio > tolerance else ""
+        ok &= ratio <= tolerance
+        print(
+            f"{m['size']:>8}  {m['stage']:<40} {ref['median_s']:>10.4f} "
+            f"{m['median_s']:>10.4f} {ratio:>7.2f}{alerte}"
+        )
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de l'analyse STI")
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[1000, 5000, 20000],
+        help="Nombres d'exigences par matrice"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure")
+    parser.add_argument("--families", nargs="+", default=["GE", "H2"])
+    parser.add_argument("--fields", type=int, default=3, help="Nombre de champs comparés")
+    parser.add_argument(
+        "--output", "-o", default="bench_results.json", help="Fichier JSON des résultats"
+    )
+    parser.add_argument("--baseline", help="Résultats JSON de référence à comparer")
+    parser.add_argument(
+        "--tolerance", type=float, default=1.25,
+        help="Ratio actuel / baseline au-delà duquel une étape est en régression"
+    )
+    parser.add_argument("--workdir", help="Dossier des jeux générés (défaut : temporaire)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        resultats = []
+        for taille in args.sizes:
+            mesures = bench_taille(taille, workdir, args.repeat, args.families, args.fields)
+            for m in mesures:
+                rss = m.get("peak_rss_mb")
+                print(
+                    f"{m['size']:>8}  {m['stage']:<40} {m['median_s']:>10.4f} s"
+                    + (f"  (RSS max {rss:.0f} Mo)" if rss is not None else "")
+                    + ("  <-- résultats différents du moteur pandas"
+                       if m.get("parity") is False else "")
+                )
+            resultats.extend(mesures)
+
+    rapport = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+        },
+        "results": resultats,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"Résultats enregistrés dans {args.output}")
+
+    ecarts = [m["stage"] for m in resultats if m.get("parity") is False]
+    if ecarts:
+        print(f"Moteur polars : résultats différents du moteur pandas ({', '.join(ecarts)})")
+    if args.baseline and not comparer_baseline(resultats, args.baseline, args.tolerance):
+        sys.exit(1)
+    if ecarts:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
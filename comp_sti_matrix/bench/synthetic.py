@@ -0,0 +1,221 @@
+"""Génère des jeux de données STI synthétiques (classeurs, configuration, PPD)."""
+
+import os
+import argparse
+import random
+
+import numpy as np
+import pandas as pd
+import yaml
+
+DOC_FIELDS = ["CAF_Comments", "MOP_design", "MOP_test"]
+SHEET_NAME = "Matrice STI"
+HEADER_ROW = 2
+
+
+def generer_references_documentaires(n_docs: int, rng: random.Random) -> list[str]:
+    """Tire `n_docs` identifiants DID/CMD/PM/SETC distincts."""
+    docs = set()
+    while len(docs) < n_docs:
+        prefixe = rng.choice(["DID", "CMD", "PM", "SETC"])
+        chiffres = 10 if prefixe == "DID" else rng.randint(6, 8)
+        docs.add(prefixe + "".join(rng.choice("0123456789") for _ in range(chiffres)))
+    return sorted(docs)
+
+
+def texte_commentaire(docs: list[str], rng: random.Random) -> str:
+    """Commentaire réaliste citant quelques documents au milieu du texte."""
+    cites = rng.sample(docs, k=rng.randint(0, 3))
+    phrases = [
+        "Conforme selon",
+        "Voir démonstration dans",
+        "Justifié par l'essai",
+        "Cf. note de calcul",
+    ]
+    morceaux = [f"{rng.choice(phrases)} {doc}." for doc in cites]
+    morceaux.append(rng.choice(["", "Sans objet.", "À confirmer avec le fournisseur."]))
+    return " ".join(m for m in morceaux if m)
+
+
+def generer_matrice_base(
+    n_requirements: int,
+    sti: str,
+    n_fields: int,
+    docs: list[str],
+    rng: random.Random,
+    n_textes_distincts: int = 200,
+) -> pd.DataFrame:
+    """
+    Matrice de référence d'une STI, avant dérivation par famille.
+
+    Les colonnes de commentaires reprennent un nombre limité de textes
+    distincts, comme dans les matrices réelles.
+    """
+    textes = [texte_commentaire(docs, rng) for _ in range(n_textes_distincts)]
+    n_refs = max(1, n_requirements // 4)
+    data = {
+        "Reference": [f"{sti}-{i % n_refs:05d}" for i in range(n_requirements)],
+        "Requirement": [
+            f"Exigence {i} : le sous-système doit respecter la clause {sti}.{i}."
+            for i in range(n_requirements)
+        ],
+        "isRequirement": [
+            rng.choice(["Vrai", "true", "1", "yes"]) if rng.random() < 0.9 else "Faux"
+            for _ in range(n_requirements)
+        ],
+    }
+    for col in DOC_FIELDS:
+        data[col] = [rng.choice(textes) for _ in range(n_requirements)]
+    for k in range(max(0, n_fields - len(DOC_FIELDS))):
+        data[f"Champ_{k}"] = [rng.choice(["OK", "NOK", "N/A", ""]) for _ in range(n_requirements)]
+    return pd.DataFrame(data)
+
+
+def deriver_famille(
+    base: pd.DataFrame,
+    champs: list[str],
+    docs: list[str],
+    taux_divergence: float,
+    taux_absence: float,
+    rng: random.Random,
+) -> pd.DataFrame:
+    """Copie de la matrice de base avec des divergences et des exigences absentes."""
+    df = base.copy()
+    masque = np.array([rng.random() >= taux_absence for _ in range(len(df))], dtype=bool)
+    df = df[masque].reset_index(drop=True)
+    for col in champs:
+        valeurs = df[col].to_numpy(dtype=object)
+        for i in range(len(valeurs)):
+            if rng.random() < taux_divergence:
+                valeurs[i] = texte_commentaire(docs, rng) if col in DOC_FIELDS else "Modifié"
+        df[col] = valeurs
+    return df
+
+
+def ecrire_classeur(df: pd.DataFrame, path: str, colonnes_brutes: dict) -> None:
+    """
+    Écrit la matrice comme un export réel : lignes de titre avant l'en-tête,
+    en-têtes avec retours à la ligne et espaces à nettoyer.
+    """
+    brut = df.rename(columns=colonnes_brutes)
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([["Matrice de conformité STI"], [None]]).to_excel(
+            writer, sheet_name=SHEET_NAME, header=False, index=False
+        )
+        brut.to_excel(writer, sheet_name=SHEET_NAME, startrow=HEADER_ROW, index=False)
+
+
+def generer_dataset(
+    root: str,
+    n_requirements: int = 1000,
+    familles=("GE", "H2"),
+    stis=("LOC",),
+    n_fields: int = 3,
+    taux_divergence: float = 0.05,
+    taux_absence: float = 0.02,
+    n_docs: int = 300,
+    n_extra_cols: int = 10,
+    seed: int = 0,
+) -> str:
+    """
+    Génère un jeu de données complet dans `root` et renvoie le chemin de
+    son sti_config.yaml.
+
+    Args:
+        root (str): Dossier du jeu de données (créé si besoin).
+        n_requirements (int): Nombre d'exigences par STI.
+        familles (tuple[str]): Préfixes des familles (GE, H2…).
+        stis (tuple[str]): Suffixes des matrices (une paire par famille et STI).
+        n_fields (int): Nombre de champs comparés (dont CAF_Comments, MOP_*).
+        taux_divergence (float): Probabilité qu'un champ diverge de la base.
+        taux_absence (float): Probabilité qu'une exigence manque à une famille.
+        n_docs (int): Taille du référentiel documentaire.
+        n_extra_cols (int): Colonnes supplémentaires non utilisées par l'analyse.
+        seed (int): Graine du générateur pseudo-aléatoire.
+    """
+    rng = random.Random(seed)
+    excel_dir = os.path.join(root, "excel_files")
+    os.makedirs(excel_dir, exist_ok=True)
+
+    docs = generer_references_documentaires(n_docs, rng)
+    champs = DOC_FIELDS[:n_fields] + [
+        f"Champ_{k}" for k in range(max(0, n_fields - len(DOC_FIELDS)))
+    ]
+    colonnes_brutes = {
+        "Requirement": "Requirement \n",
+        "CAF_Comments": "CAF\ncomments",
+    }
+
+    matrices = []
+    for sti in stis:
+        base = generer_matrice_base(n_requirements, sti, n_fields, docs, rng)
+        for k in range(n_extra_cols):
+            base[f"Colonne libre {k}"] = f"valeur {k}"
+        for famille in familles:
+            nom = f"{famille}_{sti}"
+            df = deriver_famille(base, champs, docs, taux_divergence, taux_absence, rng)
+            fichier = f"{nom}.xlsx"
+            ecrire_classeur(df, os.path.join(excel_dir, fichier), colonnes_brutes)
+            matrices.append(
+                {
+                    "name": nom,
+                    "file": fichier,
+                    "sti_sheet": SHEET_NAME,
+                    "sheets": {SHEET_NAME: {"header_row": HEADER_ROW}},
+                    "column_mapping": {"CAF comments": "CAF_Comments"},
+                }
+            )
+
+    config_path = os.path.join(root, "sti_config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(
+            {"matrices": matrices, "fields_to_compare": champs},
+            f,
+            allow_unicode=True,
+            sort_keys=False,
+        )
+
+    ppd = pd.DataFrame(
+        {
+            "N°": [str(i + 1) for i in range(len(docs))],
+            "Titre": [f"Document {doc}" for doc in docs],
+            "Référence ALSTOM": docs,
+            "Révision": [rng.choice(["A", "B", "C", "D"]) for _ in docs],
+        }
+    )
+    ppd.to_csv(
+        os.path.join(root, "PPD_export_DOORS.csv"),
+        sep="\t",
+        index=False,
+        encoding="utf-8-sig",
+    )
+    return config_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Génère un jeu de données STI synthétique")
+    parser.add_argument("--output", "-o", required=True, help="Dossier du jeu de données")
+    parser.add_argument("--requirements", "-n", type=int, default=1000)
+    parser.add_argument("--families", nargs="+", default=["GE", "H2"])
+    parser.add_argument("--stis", nargs="+", default=["LOC"])
+    parser.add_argument("--fields", type=int, default=3)
+    parser.add_argument("--divergence-rate", type=float, default=0.05)
+    parser.add_argument("--missing-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(
+        generer_dataset(
+            args.output,
+            n_requirements=args.requirements,
+            familles=tuple(args.families),
+            stis=tuple(args.stis),
+            n_fields=args.fields,
+            taux_divergence=args.divergence_rate,
+            taux_absence=args.missing_rate,
+            seed=args.seed,
+        )
+    )
@@ -0,0 +1,61 @@
+"""Convertit le PPD Excel d'un jeu de données en export DOORS."""
+import os
+import sys
+import argparse
+
+import yaml
+
+from comp_sti_matrix.core.ppd import PPD_DEFAULTS, convertir_ppd, convertir_ppd_dataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convertit le PPD Excel en export DOORS")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--config", "-c",
+        help="Configuration YAML du jeu de données (section 'ppd') ; "
+             "l'export est écrit à côté de la configuration"
+    )
+    source.add_argument("--source", "-s", help="Classeur PPD (.xls / .xlsx)")
+    parser.add_argument(
+        "--output-dir", "-o",
+        default=None,
+        help="Avec --source : dossier de l'export (défaut : dossier du PPD)"
+    )
+    parser.add_argument("--sheet", default=PPD_DEFAULTS["sheet"], help="Feuille du PPD")
+    parser.add_argument(
+        "--header-row", type=int, default=PPD_DEFAULTS["header_row"], help="Ligne d'en-tête"
+    )
+    parser.add_argument(
+        "--usecols", default=PPD_DEFAULTS["usecols"], help="Colonnes lues (ex : B:AM)"
+    )
+    parser.add_argument(
+        "--no-xlsx", action="store_true", help="N'écrit pas PPD_export_DOORS.xlsx"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Reconvertit même si le PPD n'a pas changé"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        chemins = convertir_ppd_dataset(
+            os.path.dirname(args.config), config, force=args.force
+        )
+        if chemins is None:
+            sys.exit(f"Pas de section 'ppd' dans {args.config}")
+    else:
+        chemins = convertir_ppd(
+            args.source,
+            args.output_dir or os.path.dirname(os.path.abspath(args.source)),
+            sheet=args.sheet,
+            header_row=args.header_row,
+            usecols=args.usecols,
+            xlsx=not args.no_xlsx,
+            force=args.force,
+        )
+    print(f"Export DOORS : {chemins['csv']}")
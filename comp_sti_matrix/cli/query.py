@@ -0,0 +1,81 @@
+"""Interroge la base des résultats (--results-db) sans rouvrir les classeurs."""
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+from comp_sti_matrix.core.resultats_db import (
+    DEFAULT_DB_NAME,
+    TABLES_PAIRE,
+    interroger,
+    lire_requete,
+)
+from comp_sti_matrix.core.utils_structural import export_dfs_excel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Interroge la base SQLite des résultats d’analyse STI "
+                    "(ex : exigences divergentes sur MOP_test dans toutes les STI)"
+    )
+    base = parser.add_mutually_exclusive_group(required=True)
+    base.add_argument("--db", help="Chemin de la base des résultats")
+    base.add_argument(
+        "--config", "-c",
+        help=f"Configuration YAML du jeu : base <dataset>/output/{DEFAULT_DB_NAME}"
+    )
+    parser.add_argument(
+        "--table", "-t",
+        choices=[*TABLES_PAIRE, "consolidation", "executions", "paires"],
+        default="divergences",
+        help="Table interrogée"
+    )
+    parser.add_argument("--field", "-f", help="Champ (ex : MOP_test)")
+    parser.add_argument("--sti", help="STI (ex : LOC)")
+    parser.add_argument("--reference", "-r", help="Référence d'exigence ('%%' : motif LIKE)")
+    parser.add_argument("--pair", help="Paire (ex : GE_LOC-H2_LOC)")
+    parser.add_argument("--dataset", help="Jeu de données (base partagée par un lot)")
+    parser.add_argument(
+        "--by-requirement",
+        action="store_true",
+        help="Une ligne par exigence, avec les STI et paires concernées"
+    )
+    parser.add_argument("--sql", help="Requête SQL libre (lecture seule), remplace les filtres")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximal de lignes")
+    parser.add_argument("--xlsx", default=None, help="Écrit aussi le résultat dans ce classeur")
+    parser.add_argument("--csv", default=None, help="Écrit aussi le résultat dans ce CSV")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    path = args.db or os.path.join(os.path.dirname(args.config), "output", DEFAULT_DB_NAME)
+    try:
+        if args.sql:
+            df = lire_requete(path, args.sql)
+        elif args.table in ("executions", "paires"):
+            df = lire_requete(path, f"SELECT * FROM {args.table} ORDER BY rowid")
+        else:
+            df = interroger(
+                path,
+                args.table,
+                {
+                    "champ": args.field,
+                    "sti": args.sti,
+                    "reference": args.reference,
+                    "paire": args.pair,
+                    "dataset": args.dataset,
+                },
+                par_exigence=args.by_requirement,
+                limite=args.limit,
+            )
+    except (OSError, ValueError, pd.errors.DatabaseError) as e:
+        sys.exit(str(e))
+
+    if args.xlsx:
+        export_dfs_excel({"Sheet1": df}, args.xlsx, as_text=False)
+    if args.csv:
+        df.to_csv(args.csv, index=False, encoding="utf-8-sig")
+    print(df.to_string(index=False))
+    print(f"{len(df)} ligne(s).")
@@ -1,6 +1,176 @@
 """Fait l'analyse."""
 import argparse
 from comp_sti_matrix.core.main import STIAnalyzer
+from comp_sti_matrix.core.readers import LECTEURS, READER_AUTO
+from comp_sti_matrix.core.pipeline import DEFAULT_PREFETCH
+from comp_sti_matrix.core.alignement import DEFAULT_SEUIL
+from comp_sti_matrix.core.resultats_db import DEFAULT_DB_NAME
+from comp_sti_matrix.core.moteur_polars import MOTEURS, MOTEUR_PANDAS
+from comp_sti_matrix.core.profiling import PROFILER
+
+def entier_positif(valeur: str) -> int:
+    """Type argparse : entier strictement positif."""
+    try:
+        nombre = int(valeur)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier attendu : {valeur!r}") from None
+    if nombre <= 0:
+        raise argparse.ArgumentTypeError(f"doit être strictement positif : {nombre}")
+    return nombre
+
+
+def ajouter_options_analyse(parser):
+    """Options de `STIAnalyzer`, communes à l'analyse d'un jeu et d'un lot."""
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Relit toujours les classeurs Excel sans utiliser le cache des matrices"
+    )
+    cache.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Ignore le cache existant et le reconstruit à partir des classeurs Excel"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Dossier du cache des matrices (défaut : <dataset>/output/cache)"
+    )
+    parser.add_argument(
+        "--store-max-mb",
+        type=int,
+        default=2048,
+        help="Mémoire maximale (Mo) des matrices préparées gardées entre les paires"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Nombre de processus pour analyser les paires en parallèle (0 : tous les cœurs)"
+    )
+    parser.add_argument(
+        "--single-workbook",
+        action="store_true",
+        help="Regroupe les tables de chaque paire dans un classeur multi-onglets"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recalcule toutes les paires même si leurs entrées n'ont pas changé"
+    )
+    parser.add_argument(
+        "--nway",
+        action="store_true",
+        help="Compare en une passe toutes les familles d'un même suffixe (GE/H2/…)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Mesure temps, CPU, mémoire et lignes par étape (output/profile_metrics.json)"
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Avec --profile : ajoute le pic tracemalloc par étape (plus lent)"
+    )
+    parser.add_argument(
+        "--profile-pair",
+        default=None,
+        help="Avec --profile : écrit un profil cProfile pour cette paire (ex : GE_LOC-H2_LOC)"
+    )
+    parser.add_argument(
+        "--all-columns",
+        action="store_true",
+        help="Lit toutes les colonnes des feuilles STI (types inférés) au lieu des seules colonnes utiles"
+    )
+    parser.add_argument(
+        "--reader",
+        choices=[READER_AUTO, *LECTEURS],
+        default=None,
+        help="Lecteur des matrices (remplace la clé 'reader' de la configuration ; "
+             "CSV et Parquet sont reconnus à l'extension)"
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=DEFAULT_PREFETCH,
+        help="Analyse séquentielle : nombre de paires préchargées d'avance pendant la "
+             "comparaison, avec écriture des résultats en arrière-plan (0 = désactivé)"
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="Réduit la mémoire : chaînes Arrow / catégories, non-requis non conservés"
+    )
+    parser.add_argument(
+        "--fuzzy-align",
+        type=float,
+        nargs="?",
+        const=DEFAULT_SEUIL,
+        default=None,
+        metavar="SEUIL",
+        help="Apparie les exigences exclusives presque identiques (similarité ≥ SEUIL, "
+             f"{DEFAULT_SEUIL} par défaut) et compare leurs champs ; ignoré avec --nway"
+    )
+    parser.add_argument(
+        "--results-db",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="CHEMIN",
+        help="Enregistre les résultats dans une base SQLite interrogeable "
+             f"(défaut : <dataset>/output/{DEFAULT_DB_NAME}) ; voir cli/query.py"
+    )
+    parser.add_argument(
+        "--no-pair-xlsx",
+        action="store_true",
+        help="N'écrit pas les classeurs xlsx de chaque paire (à utiliser avec --results-db)"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=entier_positif,
+        default=None,
+        metavar="MO",
+        help="Compare chaque paire hors mémoire (partitions Parquet sur disque) en "
+             "bornant la mémoire de travail à MO Mo ; séquentiel, sans --nway ni --fuzzy-align"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=MOTEURS,
+        default=MOTEUR_PANDAS,
+        help="Moteur de comparaison : polars exécute chaque paire en un plan de requête "
+             "paresseux multi-cœur (mêmes résultats) ; séquentiel, sans --nway ni --fuzzy-align"
+    )
+
+
+def options_analyse(args) -> dict:
+    """Arguments nommés de `STIAnalyzer` correspondant aux options lues."""
+    return dict(
+        use_cache=not args.no_cache,
+        rebuild_cache=args.rebuild_cache,
+        cache_dir=args.cache_dir,
+        store_max_bytes=args.store_max_mb * 1024**2,
+        jobs=args.jobs,
+        classeur_unique=args.single_workbook,
+        force=args.force,
+        nway=args.nway,
+        profile=args.profile,
+        profile_memory=args.profile_memory,
+        profile_pair=args.profile_pair,
+        prune_columns=not args.all_columns,
+        reader=args.reader,
+        prefetch=args.prefetch,
+        low_memory=args.low_memory,
+        alignement_flou=args.fuzzy_align,
+        base_resultats=args.results_db,
+        xlsx_paires=not args.no_pair_xlsx,
+        budget_memoire=(
+            args.memory_budget * 1024**2 if args.memory_budget is not None else None
+        ),
+        moteur=args.engine,
+    )
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Lance l’analyse STI")
@@ -9,9 +179,12 @@ def parse_args():
         required=True,
         help="Chemin du fichier de configuration YAML (ex : data/GE_H2/sti_config.yaml)"
     )
+    ajouter_options_analyse(parser)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    STIAnalyzer(args.config).run()
+    STIAnalyzer(args.config, **options_analyse(args)).run()
+    if args.profile:
+        print(PROFILER.tableau())
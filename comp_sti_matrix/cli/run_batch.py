@@ -0,0 +1,41 @@
+"""Fait l'analyse d'un lot de jeux de données."""
+import sys
+import argparse
+
+from comp_sti_matrix.core.batch import trouver_configs, analyser_lot, ecrire_bilan, tableau_bilan
+from comp_sti_matrix.cli.run_analysis import ajouter_options_analyse, options_analyse
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lance l’analyse STI sur plusieurs jeux de données")
+    parser.add_argument(
+        "configs",
+        nargs="+",
+        help="Configurations YAML, dossiers de jeux ou motifs glob "
+             "(ex : 'data/*/sti_config.yaml')"
+    )
+    parser.add_argument(
+        "--dataset-jobs",
+        type=int,
+        default=1,
+        help="Nombre de processus analysant chacun des jeux entiers (les paires d'un "
+             "jeu sont alors analysées en séquence)"
+    )
+    parser.add_argument(
+        "--summary",
+        default="bilan_lot.xlsx",
+        help="Classeur du bilan du lot (jeux, divergences par champ)"
+    )
+    ajouter_options_analyse(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configs = trouver_configs(args.configs)
+    if not configs:
+        sys.exit("Aucune configuration trouvée.")
+    bilans = analyser_lot(configs, processus=args.dataset_jobs, **options_analyse(args))
+    ecrire_bilan(bilans, args.summary)
+    print(tableau_bilan(bilans).to_string(index=False))
+    print(f"Bilan du lot : {args.summary}")
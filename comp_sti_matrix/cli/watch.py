@@ -0,0 +1,54 @@
+"""Analyse résidente : relance l'analyse quand les classeurs changent."""
+import argparse
+import threading
+
+from comp_sti_matrix.core.surveillance import (
+    Surveillance,
+    creer_serveur,
+    DEFAULT_INTERVALLE,
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+)
+from comp_sti_matrix.cli.run_analysis import ajouter_options_analyse, options_analyse
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Surveille un jeu de données et relance l’analyse STI à chaque modification"
+    )
+    parser.add_argument(
+        "--config", "-c",
+        required=True,
+        help="Chemin du fichier de configuration YAML (ex : data/GE_H2/sti_config.yaml)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVALLE,
+        help="Intervalle (s) entre deux relevés des fichiers"
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Adresse d'écoute de l'API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port de l'API")
+    parser.add_argument(
+        "--no-server", action="store_true", help="Surveillance seule, sans API HTTP"
+    )
+    ajouter_options_analyse(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    surveillance = Surveillance(args.config, intervalle=args.interval, **options_analyse(args))
+    serveur = None
+    if not args.no_server:
+        serveur = creer_serveur(surveillance, args.host, args.port)
+        threading.Thread(target=serveur.serve_forever, name="sti-api", daemon=True).start()
+        print(f"API : http://{args.host}:{serveur.server_port}/status (POST /run, GET /report)")
+    print(f"Surveillance de {args.config} (Ctrl+C pour arrêter)")
+    try:
+        surveillance.surveiller()
+    except KeyboardInterrupt:
+        surveillance.arreter()
+    finally:
+        if serveur is not None:
+            serveur.shutdown()
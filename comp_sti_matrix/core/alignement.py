@@ -0,0 +1,192 @@
+"""
+Alignement approché des exigences exclusives de deux matrices.
+
+Deux exigences dont le texte ne diffère que par la ponctuation, les
+accents, la casse ou quelques caractères ont des clés différentes et
+sortent en « Entries only in X ». Leurs textes normalisés sont découpés
+en n-grammes de caractères, résumés par une signature MinHash, puis
+indexés par LSH (bandes de la signature) : seules les exigences qui
+partagent un seau sont comparées, au lieu de tous les couples. Les
+candidats sont vérifiés par la similarité de Jaccard exacte de leurs
+n-grammes, puis appariés un à un, du plus semblable au moins semblable.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEUIL = 0.85
+DEFAULT_NGRAMME = 3
+NB_HACHAGES = 64
+NB_BANDES = 16
+
+# Premier de Mersenne : (a·x + b) mod p reste dans un int64 pour x, a, b < p
+_PREMIER = (1 << 31) - 1
+_BLOC = 1 << 20  # Nombre de (n-gramme, hachage) évalués par bloc
+
+
+def options_alignement(section) -> dict:
+    """
+    Options de `aligner_exclusifs` depuis la section `fuzzy_alignment` de
+    la configuration (`threshold`, `ngram`, `same_reference`) ; `true`
+    active l'alignement avec les valeurs par défaut.
+    """
+    section = section if isinstance(section, dict) else {}
+    return {
+        "seuil": float(section.get("threshold", DEFAULT_SEUIL)),
+        "ngramme": int(section.get("ngram", DEFAULT_NGRAMME)),
+        "meme_reference": bool(section.get("same_reference", True)),
+    }
+
+
+def normaliser_texte(serie: pd.Series) -> pd.Series:
+    """Minuscules, sans accents ni ponctuation, espaces réduits."""
+    return (
+        serie.astype(str)
+        .str.normalize("NFKD")
+        .str.replace("[\u0300-\u036f]", "", regex=True)  # Accents (diacritiques combinants)
+        .str.lower()
+        .str.replace(r"[\W_]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def ngrammes(texte: str, n: int = DEFAULT_NGRAMME) -> frozenset:
+    """N-grammes de caractères du texte (le texte entier s'il est plus court)."""
+    if len(texte) <= n:
+        return frozenset([texte]) if texte else frozenset()
+    return frozenset(texte[i:i + n] for i in range(len(texte) - n + 1))
+
+
+def signatures_minhash(ensembles, nb_hachages: int = NB_HACHAGES, graine: int = 0):
+    """
+    Signatures MinHash (une ligne par ensemble non vide de n-grammes).
+
+    Les n-grammes sont hachés par `pd.util.hash_array` (stable d'une
+    exécution à l'autre), puis chaque permutation (a·x + b) mod p garde
+    le minimum par ensemble.
+    """
+    rng = np.random.default_rng(graine)
+    a = rng.integers(1, _PREMIER, size=nb_hachages, dtype=np.int64)
+    b = rng.integers(0, _PREMIER, size=nb_hachages, dtype=np.int64)
+
+    tailles = np.fromiter((len(e) for e in ensembles), dtype=np.int64, count=len(ensembles))
+    signatures = np.empty((len(ensembles), nb_hachages), dtype=np.int64)
+    if not len(ensembles):
+        return signatures
+    grammes = np.fromiter(
+        (g for e in ensembles for g in e), dtype=object, count=int(tailles.sum())
+    )
+    x = (pd.util.hash_array(grammes) % _PREMIER).astype(np.int64)
+    debuts = np.concatenate([[0], np.cumsum(tailles)[:-1]])
+
+    # Par blocs d'ensembles, pour borner le tableau (n-grammes × hachages)
+    par_bloc = max(1, _BLOC // nb_hachages)
+    i = 0
+    while i < len(ensembles):
+        fin = int(np.searchsorted(debuts, debuts[i] + par_bloc, side="left"))
+        fin = max(fin, i + 1)
+        bas, haut = debuts[i], debuts[fin - 1] + tailles[fin - 1]
+        valeurs = (x[bas:haut, None] * a + b) % _PREMIER
+        signatures[i:fin] = np.minimum.reduceat(valeurs, debuts[i:fin] - bas, axis=0)
+        i = fin
+    return signatures
+
+
+def candidats_lsh(signatures, cote, blocs, nb_bandes: int = NB_BANDES) -> pd.DataFrame:
+    """
+    Couples (gauche, droite) partageant au moins un seau LSH.
+
+    Args:
+        signatures: signatures MinHash, une ligne par texte.
+        cote: 0 (gauche) ou 1 (droite) pour chaque ligne.
+        blocs: clé de blocage par ligne (ex. Reference) ; seuls les textes
+            de même bloc peuvent être candidats.
+    """
+    lignes = signatures.shape[1] // nb_bandes
+    cote = np.asarray(cote)
+    blocs = pd.util.hash_array(np.asarray(blocs, dtype=object))
+    position = np.arange(len(signatures))
+    couples = []
+    for bande in range(nb_bandes):
+        tranche = pd.DataFrame(signatures[:, bande * lignes:(bande + 1) * lignes])
+        tranche["bloc"] = blocs
+        seaux = pd.DataFrame(
+            {"seau": pd.util.hash_pandas_object(tranche, index=False).to_numpy(), "pos": position}
+        )
+        couples.append(
+            seaux[cote == 0].merge(seaux[cote == 1], on="seau", suffixes=("_g", "_d"))[
+                ["pos_g", "pos_d"]
+            ]
+        )
+    return pd.concat(couples, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def aligner_exclusifs(
+    gauche: pd.DataFrame,
+    droite: pd.DataFrame,
+    colonne_texte: str = "Requirement",
+    colonne_bloc: str = "Reference",
+    seuil: float = DEFAULT_SEUIL,
+    ngramme: int = DEFAULT_NGRAMME,
+    meme_reference: bool = True,
+) -> pd.DataFrame:
+    """
+    Apparie les lignes de `gauche` et `droite` dont les textes sont proches.
+
+    Avec `meme_reference`, seules les lignes de même `colonne_bloc` sont
+    appariées. Chaque ligne est appariée au plus une fois.
+
+    Returns:
+        pd.DataFrame: colonnes `gauche`, `droite` (positions des lignes) et
+        `Similarité` (Jaccard des n-grammes), par similarité décroissante.
+    """
+    vide = pd.DataFrame({"gauche": [], "droite": [], "Similarité": []})
+    if gauche.empty or droite.empty:
+        return vide
+
+    textes = pd.concat(
+        [normaliser_texte(gauche[colonne_texte]), normaliser_texte(droite[colonne_texte])],
+        ignore_index=True,
+    )
+    ensembles = [ngrammes(t, ngramme) for t in textes]
+    cote = np.repeat([0, 1], [len(gauche), len(droite)])
+    valides = np.flatnonzero([len(e) > 0 for e in ensembles])
+    if meme_reference:
+        blocs = pd.concat(
+            [gauche[colonne_bloc], droite[colonne_bloc]], ignore_index=True
+        ).astype(str).to_numpy(dtype=object)[valides]
+    else:
+        blocs = np.zeros(len(valides), dtype=object)
+
+    signatures = signatures_minhash([ensembles[i] for i in valides])
+    couples = candidats_lsh(signatures, cote[valides], blocs)
+    if couples.empty:
+        return vide
+
+    pos_g = valides[couples["pos_g"].to_numpy()]
+    pos_d = valides[couples["pos_d"].to_numpy()]
+    similarites = np.fromiter(
+        (
+            len(ensembles[g] & ensembles[d]) / len(ensembles[g] | ensembles[d])
+            for g, d in zip(pos_g, pos_d)
+        ),
+        dtype=float,
+        count=len(pos_g),
+    )
+    retenus = similarites >= seuil
+    candidats = pd.DataFrame(
+        {
+            "gauche": pos_g[retenus],
+            "droite": pos_d[retenus] - len(gauche),
+            "Similarité": similarites[retenus],
+        }
+    ).sort_values(["Similarité", "gauche", "droite"], ascending=[False, True, True])
+
+    # Appariement glouton un à un, du couple le plus semblable au moins semblable
+    pris_g, pris_d, gardes = set(), set(), []
+    for i, (g, d) in enumerate(zip(candidats["gauche"], candidats["droite"])):
+        if g not in pris_g and d not in pris_d:
+            pris_g.add(g)
+            pris_d.add(d)
+            gardes.append(i)
+    return candidats.iloc[gardes].reset_index(drop=True)
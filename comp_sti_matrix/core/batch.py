@@ -0,0 +1,175 @@
+"""
+Analyse d'un lot de jeux de données (plusieurs sti_config.yaml) en un
+seul processus, ou réparti sur un pool de processus.
+
+Les jeux d'un même processus partagent les matrices déjà lues
+(`CacheLectures`) et le référentiel documentaire déjà chargé
+(`DocumentIndex.charger`) ; avec un `cache_dir` commun, ils partagent
+aussi le cache disque des matrices. Chaque jeu renvoie son bilan
+(`STIAnalyzer.run`), consolidé dans un bilan du lot.
+"""
+
+import os
+import glob
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from comp_sti_matrix.core.main import STIAnalyzer
+from comp_sti_matrix.core.matrix_store import CacheLectures, DEFAULT_MAX_BYTES
+from comp_sti_matrix.core.parallel import _rediriger_log
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.utils_structural import export_dfs_excel
+
+CONFIG_NAME = "sti_config.yaml"
+
+# Matrices lues, partagées par les jeux du processus (principal ou de travail)
+_LECTURES = {}
+
+
+def trouver_configs(motifs) -> list[str]:
+    """
+    Développe les chemins et motifs glob en fichiers de configuration.
+
+    Un dossier désigne son sti_config.yaml. Les doublons sont retirés et
+    l'ordre des motifs est conservé.
+    """
+    configs = []
+    for motif in motifs:
+        chemins = sorted(glob.glob(motif)) or [motif]
+        for chemin in chemins:
+            if os.path.isdir(chemin):
+                chemin = os.path.join(chemin, CONFIG_NAME)
+            if not os.path.isfile(chemin):
+                logging.warning("Configuration introuvable : %s", chemin)
+                continue
+            if chemin not in configs:
+                configs.append(chemin)
+    return configs
+
+
+def _lectures(max_bytes: int) -> CacheLectures:
+    """Cache des matrices lues du processus courant, créé au premier appel."""
+    if "cache" not in _LECTURES:
+        _LECTURES["cache"] = CacheLectures(max_bytes)
+    return _LECTURES["cache"]
+
+
+def analyser_jeu(config_path: str, options: dict) -> dict:
+    """
+    Analyse un jeu de données et renvoie son bilan, complété du statut,
+    de la durée et de l'éventuelle erreur (qui n'interrompt pas le lot).
+    """
+    debut = time.perf_counter()
+    try:
+        analyseur = STIAnalyzer(
+            config_path,
+            lectures=_lectures(options.get("store_max_bytes", DEFAULT_MAX_BYTES)),
+            **options,
+        )
+        bilan = analyseur.run()
+        bilan["statut"] = "ok"
+    except Exception as e:  # Un jeu en échec n'arrête pas le lot
+        logging.exception("Échec de l'analyse du jeu %s", config_path)
+        bilan = {
+            "dataset": os.path.dirname(config_path),
+            "config": config_path,
+            "statut": "échec",
+            "erreur": str(e),
+        }
+    finally:
+        PROFILER.extraire()  # Mesures propres à chaque jeu (profile_metrics.json)
+    bilan["duree_s"] = round(time.perf_counter() - debut, 3)
+    return bilan
+
+
+def _analyser_jeu_isole(config_path: str, options: dict) -> dict:
+    """`analyser_jeu` dans un processus de travail, log dans output/logs/analyse.log."""
+    log_dir = os.path.join(os.path.dirname(config_path), "output", "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    handler = _rediriger_log(os.path.join(log_dir, "analyse.log"))
+    try:
+        return analyser_jeu(config_path, options)
+    finally:
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+
+
+def analyser_lot(configs, processus: int = 1, **options) -> list[dict]:
+    """
+    Analyse les jeux de données `configs` et renvoie leurs bilans, dans l'ordre.
+
+    `options` sont celles de `STIAnalyzer`. Avec `processus` > 1, les jeux sont
+    répartis sur un pool de processus (chacun avec ses matrices partagées)
+    et les paires d'un jeu sont analysées séquentiellement.
+    """
+    if processus <= 1 or len(configs) <= 1:
+        bilans = []
+        for config_path in configs:
+            logging.info("Analyse du jeu %s", config_path)
+            bilans.append(analyser_jeu(config_path, options))
+        lectures = _LECTURES.get("cache")
+        if lectures is not None:
+            logging.info(
+                "Matrices lues partagées entre jeux : %s réutilisation(s), %s lecture(s).",
+                lectures.stats["hits"], lectures.stats["misses"],
+            )
+        return bilans
+
+    options = {**options, "jobs": 1}
+    logging.info("Analyse de %s jeux sur %s processus.", len(configs), processus)
+    with ProcessPoolExecutor(max_workers=processus) as pool:
+        futures = [pool.submit(_analyser_jeu_isole, c, options) for c in configs]
+        return [future.result() for future in futures]
+
+
+def tableau_bilan(bilans) -> pd.DataFrame:
+    """Une ligne par jeu de données."""
+    colonnes = {
+        "dataset": "Jeu de données",
+        "statut": "Statut",
+        "paires": "Paires",
+        "paires_en_echec": "Paires en échec",
+        "matrices_comparees": "Matrices comparées",
+        "divergences": "Divergences consolidées",
+        "documents_1": "Documents (source 1)",
+        "documents_2": "Documents (source 2)",
+        "duree_s": "Durée (s)",
+        "fichier": "Fichier consolidé",
+        "erreur": "Erreur",
+    }
+    df = pd.DataFrame(bilans).reindex(columns=list(colonnes)).convert_dtypes()
+    return df.rename(columns=colonnes)
+
+
+def divergences_par_champ(bilans) -> pd.DataFrame:
+    """Nombre de divergences consolidées par champ (lignes) et jeu analysé (colonnes)."""
+    comptes = {
+        bilan["dataset"]: bilan["divergences_par_champ"]
+        for bilan in bilans
+        if bilan["statut"] == "ok"
+    }
+    df = pd.DataFrame(comptes).fillna(0).astype(int)
+    df.index.name = "Champ"
+    if df.empty:
+        return df.reset_index()
+    df["Total"] = df.sum(axis=1)
+    return df.sort_values("Total", ascending=False).reset_index()
+
+
+def ecrire_bilan(bilans, path: str) -> None:
+    """Écrit le bilan du lot (jeux, divergences par champ) dans un classeur."""
+    dossier = os.path.dirname(path)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    export_dfs_excel(
+        {
+            "Jeux de données": tableau_bilan(bilans),
+            "Divergences par champ": divergences_par_champ(bilans),
+        },
+        path,
+        as_text=False,
+    )
+    logging.info("Bilan du lot exporté : %s", path)
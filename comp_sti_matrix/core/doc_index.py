@@ -0,0 +1,169 @@
+"""Index du référentiel documentaire (PPD exporté pour DOORS)."""
+
+import os
+import re
+import json
+import hashlib
+import logging
+
+import pandas as pd
+
+from comp_sti_matrix.core.profiling import PROFILER
+
+DOC_COLUMNS = ["Référence ALSTOM", "Titre", "Révision"]
+
+
+class DocumentIndex:
+    """
+    Titre et révision de chaque document, indexés par 'Référence ALSTOM'.
+
+    L'index est construit une fois (nettoyage vectorisé du référentiel) puis
+    sert à enrichir la colonne 'Différence' de toutes les analyses.
+    `charger` le conserve dans un fichier Parquet, invalidé dès que le CSV
+    source change, et le garde en mémoire pour les analyses suivantes du
+    processus (ex. jeux de données d'un lot partageant le référentiel).
+    """
+
+    # Chemin du référentiel -> (taille, date de modification, index)
+    _memoire = {}
+
+    def __init__(self, table: pd.DataFrame) -> None:
+        self.table = table
+        self.titres = dict(zip(table["Référence ALSTOM"], table["Titre"]))
+        self.revisions = dict(zip(table["Référence ALSTOM"], table["Révision"]))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.titres
+
+    @classmethod
+    def from_frame(cls, df_docs: pd.DataFrame) -> "DocumentIndex":
+        """Construit l'index depuis le référentiel ('Référence ALSTOM', 'Titre', 'Révision')."""
+        table = pd.DataFrame(
+            {
+                "Référence ALSTOM": df_docs["Référence ALSTOM"].astype(str).str.strip(),
+                "Titre": df_docs["Titre"].fillna("").astype(str).str.strip(),
+                "Révision": df_docs["Révision"].fillna("").astype(str).str.strip(),
+            }
+        )
+        # En cas de doublon, la dernière ligne du référentiel l'emporte
+        table = table.drop_duplicates("Référence ALSTOM", keep="last")
+        return cls(table.reset_index(drop=True))
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "DocumentIndex":
+        """Lit l'export DOORS (CSV tabulé) et construit l'index."""
+        df_ref = pd.read_csv(
+            csv_path,
+            sep="\t",
+            dtype={"N°": str},
+            usecols=lambda col: col in DOC_COLUMNS,
+            encoding="utf-8-sig",
+        )
+        return cls.from_frame(df_ref)
+
+    @classmethod
+    def from_parquet(cls, parquet_path: str) -> "DocumentIndex":
+        """Lit le Parquet écrit à côté de l'export DOORS (voir core/ppd.py)."""
+        return cls.from_frame(pd.read_parquet(parquet_path, columns=DOC_COLUMNS))
+
+    @classmethod
+    def charger(cls, csv_path: str, cache_dir: str = None) -> "DocumentIndex":
+        """
+        Voir `_charger` ; mesuré comme étape 'referentiel_documentaire'.
+        Un référentiel déjà chargé par le processus, inchangé, est réutilisé.
+        """
+        stat = os.stat(csv_path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        with PROFILER.stage("referentiel_documentaire") as mesure:
+            deja_charge = cls._memoire.get(os.path.abspath(csv_path))
+            if deja_charge is not None and deja_charge[:2] == version:
+                logging.info("Référentiel documentaire déjà chargé : %s", csv_path)
+                index = deja_charge[2]
+            else:
+                index = cls._charger(csv_path, cache_dir)
+                cls._memoire[os.path.abspath(csv_path)] = version + (index,)
+            mesure["rows"] = len(index)
+        return index
+
+    @classmethod
+    def _charger(cls, csv_path: str, cache_dir: str = None) -> "DocumentIndex":
+        """
+        Renvoie l'index du CSV, depuis le cache binaire s'il est à jour.
+
+        La clé du cache couvre le chemin, la taille et la date de modification
+        du CSV ; le nom du fichier porte aussi l'empreinte du seul chemin, pour
+        que des référentiels partageant `cache_dir` ne s'effacent pas entre eux.
+        Sans `cache_dir`, le CSV est toujours relu. Un fichier
+        .parquet (export PPD) est lu directement, sans cache.
+        """
+        if csv_path.endswith(".parquet"):
+            return cls.from_parquet(csv_path)
+        if cache_dir is None:
+            return cls.from_csv(csv_path)
+
+        stat = os.stat(csv_path)
+        key = json.dumps([os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns])
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        source = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:8]
+        cache_path = os.path.join(cache_dir, f"doc_index_{source}_{digest}.parquet")
+
+        if os.path.exists(cache_path):
+            try:
+                table = pd.read_parquet(cache_path)
+                logging.info("Référentiel documentaire lu depuis le cache %s", cache_path)
+                return cls(table)
+            except (ImportError, OSError, ValueError) as e:
+                logging.warning("Cache du référentiel illisible %s : %s", cache_path, e)
+
+        index = cls.from_csv(csv_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if re.fullmatch(rf"doc_index_({source}_)?[0-9a-f]{{16}}\.parquet", name):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    pass  # Déjà supprimé par un autre processus
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            index.table.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except ImportError as e:
+            logging.info("Cache du référentiel désactivé : %s", e)
+        return index
+
+    def enrichir_texte(self, cellule, motif: re.Pattern) -> str:
+        """Remplace chaque ligne '<label> : id1, id2' par la liste titrée des documents."""
+        if not isinstance(cellule, str):
+            return ""
+        lignes_enrichies = []
+        for ligne in cellule.strip().splitlines():
+            m = motif.match(ligne.strip())
+            if not m:
+                continue
+            prefixe, contenu = m.groups()
+            bloc = []
+            for doc_id in (s.strip() for s in contenu.split(",")):
+                titre = self.titres.get(doc_id, "❓")
+                rev = self.revisions.get(doc_id, "")
+                bloc.append(f"- {doc_id} – {rev} – {titre}")
+            lignes_enrichies.append(f"{prefixe} :\n  " + "\n  ".join(bloc))
+        return "\n".join(lignes_enrichies)
+
+    def enrichir(self, df_diff: pd.DataFrame, labels) -> pd.DataFrame:
+        """
+        Enrichit la colonne 'Différence' de `df_diff` (modifiée en place).
+
+        Le texte enrichi n'est calculé qu'une fois par valeur distincte de
+        'Différence', puis propagé à toute la colonne.
+        """
+        motif = re.compile(
+            f"^({re.escape(labels[0])}|{re.escape(labels[1])})\\s*:\\s*(.*)"
+        )
+        colonne = df_diff["Différence"]
+        distinctes = pd.unique(colonne.to_numpy(dtype=object))
+        enrichies = {valeur: self.enrichir_texte(valeur, motif) for valeur in distinctes}
+        df_diff["Différence"] = colonne.map(enrichies).fillna("")
+        return df_diff
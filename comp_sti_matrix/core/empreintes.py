@@ -0,0 +1,65 @@
+"""
+Empreintes de contenu des lignes de matrice.
+
+Chaque champ comparé reçoit une colonne d'empreintes (hachage 64 bits de
+sa valeur texte, telle que `compute_field_diffs` la compare) et chaque
+ligne une empreinte combinée de ces colonnes. Elles sont calculées une
+fois à la lecture de la matrice et conservées avec elle (cache disque et
+mémoire) : la comparaison champ à champ ne regarde plus que les clés dont
+l'empreinte de ligne diffère, et n'y relit en texte que les champs dont
+l'empreinte diffère.
+"""
+
+import numpy as np
+import pandas as pd
+
+EMPREINTE_LIGNE = "__empreinte"
+PREFIXE_EMPREINTE = "__empreinte:"
+
+
+def colonne_empreinte(champ: str) -> str:
+    """Nom de la colonne d'empreintes du champ `champ`."""
+    return PREFIXE_EMPREINTE + str(champ)
+
+
+def empreintes_texte(serie: pd.Series) -> np.ndarray:
+    """Hachages (uint64) des valeurs converties en texte comme `str()` le ferait."""
+    return pd.util.hash_array(serie.astype(object).map(str).to_numpy(dtype=object))
+
+
+def calculer_empreintes(df: pd.DataFrame, champs) -> pd.DataFrame:
+    """
+    Empreintes par champ et par ligne de `df` (même index).
+
+    Un champ absent de `df` a l'empreinte du texte vide, comme la valeur
+    que lui donne la comparaison ; un champ présent sous plusieurs colonnes
+    n'a pas d'empreinte (la comparaison reprend alors le texte).
+    """
+    par_champ = {}
+    vide = None
+    for champ in champs:
+        if champ not in df.columns:
+            if vide is None:
+                vide = pd.util.hash_array(np.full(len(df), "", dtype=object))
+            par_champ[colonne_empreinte(champ)] = vide
+        elif isinstance(df[champ], pd.Series):
+            par_champ[colonne_empreinte(champ)] = empreintes_texte(df[champ])
+    empreintes = pd.DataFrame(par_champ, index=df.index)
+    empreintes[EMPREINTE_LIGNE] = pd.util.hash_pandas_object(empreintes, index=False).to_numpy()
+    return empreintes
+
+
+def ajouter_empreintes(df: pd.DataFrame, champs, vue: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Ajoute à `df` les colonnes d'empreintes de `champs`, calculées sur `vue`
+    (mêmes lignes, colonnes sous leur nom final) ou sur `df` lui-même.
+    """
+    empreintes = calculer_empreintes(df if vue is None else vue, champs)
+    return df.assign(**{col: empreintes[col].to_numpy() for col in empreintes.columns})
+
+
+def a_empreintes(df: pd.DataFrame, champs) -> bool:
+    """`df` porte-t-il l'empreinte de ligne et celle de chacun des `champs` ?"""
+    return EMPREINTE_LIGNE in df.columns and all(
+        colonne_empreinte(champ) in df.columns for champ in champs
+    )
@@ -0,0 +1,450 @@
+"""
+Comparaison hors mémoire d'une paire de matrices.
+
+Les matrices sont relues par lots (cache Parquet du chargeur), préparées
+lot par lot puis réparties sur disque en partitions Parquet selon un
+hachage des colonnes clés : une même clé tombe dans la même partition
+pour les deux matrices. Chaque partition est ensuite comparée seule
+(`compare_matrix_entries_multi`), et ses tables de résultats sont versées
+sur disque puis relues partition par partition par les écritures (xlsx,
+base des résultats). Le nombre de partitions est choisi pour qu'une
+partition des deux matrices, avec les copies de travail de la
+comparaison, tienne dans le budget mémoire.
+
+Les résultats sont relus dans l'ordre des matrices sources (fusion des
+partitions) : les divergences et l'analyse documentaire sont identiques
+à celles de la comparaison en mémoire ; les tables des exigences
+communes et exclusives ont les mêmes lignes, dans l'ordre de leur matrice.
+"""
+
+import os
+import math
+import shutil
+import logging
+import tempfile
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from comp_sti_matrix.core.sti_loader import KEY_COLS
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.utils_structural import (
+    chemins_entrees_paire,
+    compare_matrix_entries_multi,
+    export_dfs_excel,
+    lignes_divergences_documentaires,
+    regrouper_divergences,
+    log_summary,
+    longueurs_valeurs,
+    preparer_lot,
+    preparer_onglet,
+    valeurs_cellules,
+    nom_feuille,
+)
+
+DEFAULT_TAILLE_LOT = 50_000
+# Mémoire de travail d'une comparaison rapportée à la taille des données comparées
+FACTEUR_TRAVAIL = 6
+POSITION = "__pos"
+
+
+def _ecrire(df: pd.DataFrame, base: str) -> str:
+    """Écrit un fragment en Parquet (pickle sans pyarrow) et renvoie son chemin."""
+    try:
+        df.to_parquet(base + ".parquet", index=False)
+        return base + ".parquet"
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        df.to_pickle(base + ".pkl")
+        return base + ".pkl"
+
+
+def _lire(chemins) -> pd.DataFrame:
+    """Relit et concatène des fragments, dans l'ordre."""
+    dfs = [
+        pd.read_parquet(c) if c.endswith(".parquet") else pd.read_pickle(c) for c in chemins
+    ]
+    if not dfs:
+        return pd.DataFrame()
+    return dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+
+
+def lots_matrice(nom: str, loader, taille_lot: int = DEFAULT_TAILLE_LOT):
+    """
+    Matrice lue par lots de `taille_lot` lignes, et son nombre de lignes.
+
+    Les lots sont lus dans le cache Parquet du chargeur ; sans lui, la
+    matrice est lue entière puis découpée.
+    """
+    chemin = loader.chemin_cache(nom)
+    if chemin is not None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            chemin = None
+    if chemin is None:
+        logging.info("Matrice %s lue entière (cache Parquet indisponible).", nom)
+        df = loader.get_matrix(nom)
+        return (df.iloc[i:i + taille_lot] for i in range(0, len(df), taille_lot)), len(df)
+
+    fichier = pq.ParquetFile(chemin)
+    lots = (
+        pa.Table.from_batches([lot], schema=fichier.schema_arrow).to_pandas()
+        for lot in fichier.iter_batches(batch_size=taille_lot)
+    )
+    return lots, fichier.metadata.num_rows
+
+
+def partition_des_cles(df: pd.DataFrame, key_cols, nb_partitions: int) -> np.ndarray:
+    """Numéro de partition de chaque ligne (hachage stable des colonnes clés)."""
+    cles = pd.DataFrame({col: df[col].to_numpy(dtype=object) for col in key_cols})
+    return (pd.util.hash_pandas_object(cles, index=False).to_numpy() % nb_partitions).astype(
+        np.int64
+    )
+
+
+class Partitions:
+    """Fragments sur disque d'une table, rangés par partition."""
+
+    def __init__(self, dossier: str, nom: str, nb_partitions: int) -> None:
+        self.dossier = dossier
+        self.nom = nom
+        self.fragments = [[] for _ in range(nb_partitions)]
+        self.lignes = 0
+
+    def ajouter(self, p: int, df: pd.DataFrame) -> None:
+        """Verse `df` dans la partition `p`."""
+        if df.empty:
+            return
+        base = os.path.join(self.dossier, f"{self.nom}_{p}_{len(self.fragments[p])}")
+        self.fragments[p].append(_ecrire(df, base))
+        self.lignes += len(df)
+
+    def repartir(self, df: pd.DataFrame, partitions: np.ndarray) -> None:
+        """Verse chaque ligne de `df` dans la partition indiquée."""
+        ordre = np.argsort(partitions, kind="stable")
+        valeurs, debuts = np.unique(partitions[ordre], return_index=True)
+        for p, debut, fin in zip(valeurs, debuts, list(debuts[1:]) + [len(ordre)]):
+            self.ajouter(int(p), df.iloc[ordre[debut:fin]])
+
+    def lire(self, p: int) -> pd.DataFrame:
+        """Partition `p` entière, dans l'ordre de versement."""
+        return _lire(self.fragments[p])
+
+    def lots(self):
+        """Partitions non vides, l'une après l'autre."""
+        for p in range(len(self.fragments)):
+            if self.fragments[p]:
+                yield self.lire(p)
+
+
+def nombre_partitions(tailles, budget: int) -> int:
+    """Partitions nécessaires pour que la comparaison d'une partition tienne dans `budget`."""
+    return max(1, math.ceil(FACTEUR_TRAVAIL * sum(tailles) / max(budget, 1)))
+
+
+def partitionner_matrices(noms, loader, dossier, budget, taille_lot=DEFAULT_TAILLE_LOT):
+    """
+    Lit, prépare et répartit les requis des matrices `noms` en partitions.
+
+    La taille en mémoire de chaque matrice est estimée sur son premier lot.
+
+    Returns:
+        list[Partitions] | None: une par matrice (colonne POSITION : rang du
+        requis dans sa matrice), ou None si une matrice n'a pas ses colonnes clés.
+    """
+    sources, tailles = [], []
+    for nom in noms:
+        lots, nb_lignes = lots_matrice(nom, loader, taille_lot)
+        premier = next(lots, None)
+        if premier is None:
+            sources.append(iter(()))
+            tailles.append(0)
+            continue
+        par_ligne = premier.memory_usage(deep=True).sum() / max(len(premier), 1)
+        sources.append(chain([premier], lots))
+        tailles.append(par_ligne * nb_lignes)
+    nb = nombre_partitions(tailles, budget)
+    logging.info(
+        "Comparaison hors mémoire : ~%s Mo de matrices, %s partition(s) pour %s Mo.",
+        round(sum(tailles) / 1024**2), nb, round(budget / 1024**2),
+    )
+
+    resultat = []
+    for nom, lots in zip(noms, sources):
+        partitions = Partitions(dossier, nom, nb)
+        with PROFILER.stage("partitionnement", matrix=nom) as mesure:
+            for lot in lots:
+                prepare = preparer_lot(lot, nom, loader)
+                if prepare is None:
+                    logging.warning(" Colonnes clés manquantes dans %s", nom)
+                    return None
+                requis = prepare[0]
+                requis = requis.assign(
+                    **{POSITION: np.arange(partitions.lignes, partitions.lignes + len(requis))}
+                )
+                partitions.repartir(requis, partition_des_cles(requis, KEY_COLS, nb))
+            mesure["rows"] = partitions.lignes
+        logging.info("%s contient %s requis.", nom, partitions.lignes)
+        resultat.append(partitions)
+    return resultat
+
+
+def avec_positions(table: pd.DataFrame, source: pd.DataFrame, key_cols) -> pd.DataFrame:
+    """
+    `table` complétée de POSITION, le rang dans `source` de la première
+    ligne de chaque clé, et triée selon ce rang (tri stable).
+    """
+    premieres = source.drop_duplicates(subset=key_cols, keep="first")
+    premieres = pd.DataFrame(
+        {
+            **{col: premieres[col].to_numpy(dtype=object) for col in key_cols},
+            POSITION: premieres[POSITION].to_numpy(),
+        }
+    )
+    cles = pd.DataFrame({col: table[col].to_numpy(dtype=object) for col in key_cols})
+    rangs = cles.merge(premieres, on=key_cols, how="left")[POSITION].to_numpy()
+    table = table.assign(**{POSITION: rangs})
+    return table.iloc[np.argsort(rangs, kind="stable")].reset_index(drop=True)
+
+
+def _lots_fragment(chemin: str, taille_lot: int):
+    """Relit un fragment par lots de `taille_lot` lignes."""
+    if not chemin.endswith(".parquet"):
+        df = pd.read_pickle(chemin)
+        yield from (df.iloc[i:i + taille_lot] for i in range(0, len(df), taille_lot))
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fichier = pq.ParquetFile(chemin)
+    for lot in fichier.iter_batches(batch_size=taille_lot):
+        yield pa.Table.from_batches([lot], schema=fichier.schema_arrow).to_pandas()
+
+
+def fusionner(sources):
+    """
+    Fusionne des flux de lots triés par POSITION en un flux trié (fusion
+    k-voies par lots) ; une même position ne vient que d'un flux.
+
+    À chaque tour, les lignes de rang au plus égal au plus petit des
+    derniers rangs en tampon sont émises : aucun flux ne peut plus en
+    fournir de plus petites.
+    """
+    sources = [iter(source) for source in sources]
+    tampons = {}
+
+    def remplir(i):
+        for df in sources[i]:
+            if not df.empty:
+                tampons[i] = df
+                return
+        tampons.pop(i, None)
+
+    for i in range(len(sources)):
+        remplir(i)
+    while tampons:
+        seuil = min(df[POSITION].iat[-1] for df in tampons.values())
+        morceaux = []
+        for i, df in list(tampons.items()):
+            coupe = int(np.searchsorted(df[POSITION].to_numpy(), seuil, side="right"))
+            morceaux.append(df.iloc[:coupe])
+            if coupe == len(df):
+                remplir(i)
+            else:
+                tampons[i] = df.iloc[coupe:]
+        lot = pd.concat(morceaux, ignore_index=True) if len(morceaux) > 1 else morceaux[0]
+        ordre = np.argsort(lot[POSITION].to_numpy(), kind="stable")
+        yield lot.iloc[ordre].drop(columns=POSITION).reset_index(drop=True)
+
+
+def _ecrire_classeur(path: str, feuilles: dict) -> None:
+    """
+    Écrit un classeur dont chaque onglet est donné par (colonnes, largeurs,
+    lots) ; les lots sont lus un à un (voir `export_dfs_excel`).
+    """
+    with PROFILER.stage("export_xlsx", file=os.path.basename(path)):
+        wb = Workbook(write_only=True)
+        for titre, (colonnes, longueurs, lots) in feuilles.items():
+            ws = wb.create_sheet(title=nom_feuille(titre))
+            preparer_onglet(ws, colonnes, longueurs)
+            for df in lots:
+                for row in zip(*(valeurs_cellules(df[col], as_text=False) for col in colonnes)):
+                    ws.append(row)
+        tmp_path = f"{path}.{os.getpid()}.tmp.xlsx"
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+
+
+class TableVersee:
+    """
+    Table de résultats versée sur disque partition par partition (lignes
+    triées par POSITION), avec les largeurs de ses colonnes pour l'export.
+    """
+
+    def __init__(
+        self, dossier: str, nom: str, nb_partitions: int, colonnes=None,
+        taille_lot: int = DEFAULT_TAILLE_LOT,
+    ) -> None:
+        self.partitions = Partitions(dossier, nom, nb_partitions)
+        self.colonnes = list(colonnes) if colonnes is not None else None
+        self.longueurs = [0] * len(self.colonnes) if colonnes is not None else None
+        self.taille_lot = taille_lot
+
+    def ajouter(self, p: int, df: pd.DataFrame) -> None:
+        """Verse `df` (résultat de la partition `p`) et met à jour les largeurs."""
+        if self.colonnes is None:
+            self.colonnes = [col for col in df.columns if col != POSITION]
+            self.longueurs = [0] * len(self.colonnes)
+        if df.empty:
+            return
+        valeurs = [valeurs_cellules(df[col], as_text=False) for col in self.colonnes]
+        self.longueurs = [max(a, b) for a, b in zip(self.longueurs, longueurs_valeurs(valeurs))]
+        self.partitions.ajouter(p, df)
+
+    @property
+    def vide(self) -> bool:
+        """Aucune ligne versée."""
+        return self.partitions.lignes == 0
+
+    def lots(self):
+        """Lignes de toutes les partitions, dans l'ordre de POSITION, par lots."""
+        taille = max(1000, self.taille_lot // max(len(self.partitions.fragments), 1))
+        return fusionner(
+            chain.from_iterable(_lots_fragment(chemin, taille) for chemin in fragments)
+            for fragments in self.partitions.fragments
+        )
+
+    def feuille(self):
+        """(colonnes, largeurs, lots) pour `_ecrire_classeur`."""
+        return self.colonnes or [], self.longueurs or [], self.lots()
+
+
+def analyser_couple_hors_memoire(
+    matrices_cibles,
+    loader,
+    budget: int,
+    classeur_unique=False,
+    base=None,
+    xlsx=True,
+    taille_lot: int = DEFAULT_TAILLE_LOT,
+):
+    """
+    Équivalent de `analyser_couple_matrices` à mémoire bornée par `budget`
+    (octets) : mêmes fichiers de sortie et même résultat (analyse
+    documentaire, documents cités). L'appariement approché n'y est pas
+    disponible. Les fragments sont écrits dans un dossier temporaire de
+    output/, supprimé à la fin.
+    """
+    output_dir = loader.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    cols_interessees = loader.get_fields_to_compare()
+    labels = list(matrices_cibles)
+    dossier = tempfile.mkdtemp(prefix="hors_memoire_", dir=output_dir)
+    try:
+        partitions = partitionner_matrices(labels, loader, dossier, budget, taille_lot)
+        if partitions is None:
+            raise ValueError("Comparaison impossible : matrices incomplètes.")
+        nb = len(partitions[0].fragments)
+
+        tables = {
+            nom: TableVersee(dossier, f"exclusifs_{i}", nb, KEY_COLS, taille_lot)
+            for i, nom in enumerate(labels)
+        }
+        commun = TableVersee(dossier, "communs", nb, KEY_COLS, taille_lot)
+        divergents = TableVersee(dossier, "divergences", nb, taille_lot=taille_lot)
+        summary, requis_impactes = {}, set()
+
+        for p in range(nb):
+            dfs = [partition.lire(p) for partition in partitions]
+            if all(df.empty for df in dfs):
+                continue
+            with PROFILER.stage("comparaison_partition", partition=p, rows=sum(map(len, dfs))):
+                dfs = [
+                    df if not df.empty else pd.DataFrame(columns=KEY_COLS + [POSITION])
+                    for df in dfs
+                ]
+                resume, exclusifs, communs, diffs = compare_matrix_entries_multi(
+                    dfs, labels, key_cols=KEY_COLS, compare_fields=True,
+                    fields_to_compare=cols_interessees,
+                )
+            for cle, valeur in resume.items():
+                summary[cle] = summary.get(cle, 0) + valeur
+            for i, nom in enumerate(labels):
+                tables[nom].ajouter(p, avec_positions(exclusifs[nom], dfs[i], KEY_COLS))
+            commun.ajouter(p, avec_positions(communs, dfs[0], KEY_COLS))
+            if diffs is not None and not diffs.empty:
+                # Divergences dans l'ordre de la première matrice, comme en mémoire
+                divergents.ajouter(p, avec_positions(diffs, dfs[0], KEY_COLS))
+                requis_impactes.update(diffs["Reference"])
+
+        log_summary(summary)
+        resultat = None
+        if not divergents.vide:
+            logging.info(" Nombre de requis impactés : %s", len(requis_impactes))
+            docs, set1, set2 = [], set(), set()
+            with PROFILER.stage("extraction_documents", rows=divergents.partitions.lignes):
+                for lot in divergents.lots():
+                    lignes, docs_1, docs_2 = lignes_divergences_documentaires(lot, labels)
+                    if lignes is not None:
+                        docs.append(lignes[["Reference", "Champ", "Différence", "État"]])
+                    set1 |= docs_1
+                    set2 |= docs_2
+            if docs:
+                res = regrouper_divergences(pd.concat(docs, ignore_index=True))
+            else:
+                logging.info("Aucune divergence documentaire détectée.")
+                res = pd.DataFrame()
+            resultat = res, set1, set2
+        else:
+            logging.info(" Aucun champ divergent détecté.")
+        res = resultat[0] if resultat is not None else None
+
+        if xlsx:
+            _exporter_tables(output_dir, labels, tables, commun, divergents, res, classeur_unique)
+        if base is not None:
+            with PROFILER.stage("base_resultats"):
+                base.enregistrer_paire(
+                    labels,
+                    {nom: table.partitions.lots() for nom, table in tables.items()},
+                    commun.partitions.lots(),
+                    divergents.partitions.lots(),
+                    res,
+                )
+        return resultat
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+def _exporter_tables(output_dir, labels, tables, commun, divergents, res, classeur_unique):
+    """Écrit les classeurs de la paire comme `exporter_resultats`, lot par lot."""
+    nom_concat = "-".join(labels)
+    if classeur_unique:
+        feuilles = {"Communs": commun.feuille()}
+        feuilles.update({f"Uniques {nom}": table.feuille() for nom, table in tables.items()})
+        if not divergents.vide:
+            feuilles["Comparaison"] = divergents.feuille()
+        if res is not None:
+            colonnes = [valeurs_cellules(res[col], as_text=False) for col in res.columns]
+            feuilles["Analyse documentaire"] = (
+                list(res.columns), longueurs_valeurs(colonnes), [res]
+            )
+        path = f"{output_dir}/resultats_{nom_concat}.xlsx"
+        _ecrire_classeur(path, feuilles)
+        logging.info(" Résultats de la paire enregistrés dans %s", path)
+        return
+
+    chemin_communs, chemins_exclusifs = chemins_entrees_paire(output_dir, labels)
+    _ecrire_classeur(chemin_communs, {"Sheet1": commun.feuille()})
+    for nom, table in tables.items():
+        _ecrire_classeur(chemins_exclusifs[nom], {"Sheet1": table.feuille()})
+    if not divergents.vide:
+        _ecrire_classeur(
+            f"{output_dir}/comparison_{nom_concat}.xlsx", {"Sheet1": divergents.feuille()}
+        )
+    if res is not None:
+        res_filen = f"{output_dir}/res_ana_div_{nom_concat}.xlsx"
+        export_dfs_excel({"Sheet1": res}, res_filen, as_text=False)
+        logging.info(" Analyse documentaire enregistrée dans %s", res_filen)
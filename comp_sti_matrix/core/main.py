@@ -8,47 +8,358 @@ from builtins import set, tuple
 import pandas as pd
 
 from comp_sti_matrix.core.sti_loader import STILoader
+from comp_sti_matrix.core.matrix_store import MatrixStore, DEFAULT_MAX_BYTES
+from comp_sti_matrix.core.parallel import analyser_paires_en_parallele
+from comp_sti_matrix.core.pipeline import analyser_paires_en_pipeline, DEFAULT_PREFETCH
+from comp_sti_matrix.core.manifest import RunManifest
+from comp_sti_matrix.core.doc_index import DocumentIndex
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.ppd import convertir_ppd_dataset, chemin_referentiel
+from comp_sti_matrix.core.alignement import options_alignement
+from comp_sti_matrix.core.resultats_db import BaseResultats, DEFAULT_DB_NAME
+from comp_sti_matrix.core.hors_memoire import analyser_couple_hors_memoire
+from comp_sti_matrix.core.moteur_polars import (
+    MOTEUR_PANDAS,
+    MOTEUR_POLARS,
+    analyser_couple_polars,
+    choisir_moteur,
+    consolider_polars,
+)
 from comp_sti_matrix.core.utils_structural import (
     get_matrix_pairs,
     export_df_excel,
     analyser_couple_matrices,
+    analyser_groupe_matrices,
     enrichir_colonne_difference,
+    regrouper_references,
 )
 
 
 class STIAnalyzer:
     """Encapsule le processus d'analyse sous forme orientée objet."""
 
-    def __init__(self, config_path: str) -> None:
+    def __init__(
+        self,
+        config_path: str,
+        use_cache: bool = True,
+        rebuild_cache: bool = False,
+        cache_dir: str = None,
+        store_max_bytes: int = DEFAULT_MAX_BYTES,
+        jobs: int = 1,
+        classeur_unique: bool = False,
+        force: bool = False,
+        nway: bool = False,
+        profile: bool = False,
+        profile_memory: bool = False,
+        profile_pair: str = None,
+        prune_columns: bool = True,
+        reader: str = None,
+        prefetch: int = DEFAULT_PREFETCH,
+        low_memory: bool = False,
+        lectures=None,
+        alignement_flou: float = None,
+        base_resultats: str = None,
+        xlsx_paires: bool = True,
+        budget_memoire: int = None,
+        moteur: str = MOTEUR_PANDAS,
+    ) -> None:
         self.config_path = config_path
         self.dataset_path = os.path.dirname(config_path)
         self.output_file = os.path.join(
             self.dataset_path, "output", "analyse_doc_consolidee.xlsx"
         )
-        self.labels = os.path.basename(self.dataset_path).split("_")
-        self.loader = STILoader(config_path)
+        self.loader = STILoader(
+            config_path,
+            cache_dir=cache_dir,
+            use_cache=use_cache,
+            rebuild_cache=rebuild_cache,
+            prune_columns=prune_columns,
+            reader=reader,
+            low_memory=low_memory,
+            lectures=lectures,
+        )
+        # Libellés des sources : clé `labels` de la configuration, sinon nom du dossier (GE_H2)
+        self.labels = self.loader.config.get("labels") or os.path.basename(
+            self.dataset_path
+        ).split("_")
+        self.store = MatrixStore(self.loader, max_bytes=store_max_bytes)
+        self.loader_options = {
+            "cache_dir": cache_dir,
+            "use_cache": use_cache,
+            "rebuild_cache": rebuild_cache,
+            "prune_columns": prune_columns,
+            "reader": reader,
+            "low_memory": low_memory,
+        }
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self.pair_options = {"classeur_unique": classeur_unique}
+        # Appariement approché des exclusives : section `fuzzy_alignment`, seuil CLI prioritaire
+        alignement = self.loader.config.get("fuzzy_alignment")
+        if alignement_flou is not None:
+            alignement = {**(alignement if isinstance(alignement, dict) else {}),
+                          "threshold": alignement_flou}
+        if alignement:
+            self.pair_options["alignement"] = options_alignement(alignement)
+        # Sorties des paires : base des résultats ("" pour output/resultats.sqlite)
+        # et classeurs xlsx par paire (seuls ces derniers entrent dans l'empreinte)
+        self.base = None
+        if base_resultats is not None:
+            self.base = BaseResultats(
+                base_resultats or self.loader.get_output_path(DEFAULT_DB_NAME),
+                self.dataset_path,
+            )
+        self.options_sortie = {"base": self.base, "xlsx": xlsx_paires}
+        self.budget_memoire = budget_memoire  # Octets ; comparaison hors mémoire si fourni
+        self.moteur = choisir_moteur(moteur)  # pandas, ou polars (core/moteur_polars.py)
+        self.force = force
+        self.prefetch = prefetch
+        self.nway = nway
+        self.profiler_options = None
+        if profile:
+            self.profiler_options = {
+                "trace_memory": profile_memory,
+                "cprofile_pair": profile_pair,
+                "cprofile_dir": self.loader.output_dir,
+            }
+            PROFILER.activer(**self.profiler_options)
+        self.manifest = RunManifest(self.loader.output_dir)
+        self.df_consolidated = None  # Dernière analyse consolidée (voir `run`)
+
+    def _resultats_paires(self, pairs):
+        """
+        Produit (paire, résultat, erreur) pour chaque paire, dans l'ordre.
+
+        Les paires dont les entrées n'ont pas changé depuis la dernière
+        exécution (voir RunManifest) reprennent leur résultat stocké, sauf
+        avec `force`. Les autres sont calculées puis enregistrées. Les
+        classeurs xlsx des paires font partie de l'empreinte : une paire
+        calculée sans eux est recalculée quand ils sont demandés.
+        """
+        options = {**self.pair_options, "xlsx": self.options_sortie["xlsx"]}
+        empreintes = {
+            pair: self.manifest.empreinte_paire(self.loader, pair, options)
+            for pair in pairs
+        }
+        reprises = {}
+        if not self.force:
+            for pair in pairs:
+                trouve, resultat = self.manifest.resultat(pair, empreintes[pair])
+                # Paire absente de la base des résultats : recalculée pour l'y enregistrer
+                if trouve and (self.base is None or self.base.contient(pair)):
+                    reprises[pair] = resultat
+        a_calculer = [pair for pair in pairs if pair not in reprises]
+        logging.info(
+            "%s paire(s) reprise(s) du manifeste, %s à calculer.",
+            len(reprises), len(a_calculer),
+        )
+
+        calculs = self._calculer_paires(a_calculer)
+        for pair in pairs:
+            if pair in reprises:
+                logging.info("Paire %s inchangée : résultat précédent réutilisé.", pair)
+                yield pair, reprises[pair], None
+                continue
+            pair, resultat, erreur = next(calculs)
+            if erreur is None:
+                self.manifest.enregistrer(pair, empreintes[pair], resultat)
+            else:
+                self.manifest.oublier(pair)
+            yield pair, resultat, erreur
+        calculs.close()  # Termine les écritures encore en file
+        self.manifest.sauver()
+
+    def _options_paires(self) -> dict:
+        """Options de `analyser_couple_matrices` : comparaison et sorties."""
+        return {**self.pair_options, **self.options_sortie}
+
+    def _calculer_paires(self, pairs):
+        """
+        Analyse les paires et produit (paire, résultat, erreur), dans l'ordre.
+
+        Avec `jobs` > 1, les paires sont réparties sur un pool de processus ;
+        chaque paire journalise alors dans output/logs/<paire>.log. Sinon,
+        avec `prefetch` > 0, la lecture des paires suivantes et l'écriture
+        des résultats se font en arrière-plan (voir core/pipeline.py).
+        Avec `budget_memoire`, chaque paire est comparée hors mémoire ; avec
+        le moteur polars, par un plan de requête polars.
+        """
+        if self.budget_memoire is not None:
+            yield from self._calculer_paires_hors_memoire(pairs)
+            return
+
+        if self.moteur == MOTEUR_POLARS:
+            yield from self._calculer_paires_polars(pairs)
+            return
+
+        if self.nway:
+            yield from self._calculer_paires_nway(pairs)
+            return
+
+        if (self.jobs <= 1 or len(pairs) <= 1) and self.prefetch > 0 and len(pairs) > 1:
+            yield from analyser_paires_en_pipeline(
+                pairs, self.loader, self.store, self.prefetch, self._options_paires()
+            )
+            return
+
+        if self.jobs <= 1 or len(pairs) <= 1:
+            for pair in pairs:
+                try:
+                    with PROFILER.paire(pair):
+                        resultat = analyser_couple_matrices(
+                            pair, loader=self.loader, store=self.store, **self._options_paires()
+                        )
+                except OSError as e:
+                    yield pair, None, e
+                else:
+                    yield pair, resultat, None
+            return
+
+        log_dir = self.loader.get_output_path("logs")
+        logging.info(
+            "Analyse de %s paires sur %s processus (logs : %s).",
+            len(pairs), self.jobs, log_dir,
+        )
+        for pair, resultat, erreur, compteurs in analyser_paires_en_parallele(
+            pairs,
+            self.config_path,
+            self.loader_options,
+            self.store.max_bytes,
+            self.jobs,
+            log_dir,
+            self._options_paires(),
+            self.profiler_options,
+        ):
+            if compteurs is not None:
+                cache_delta, store_delta, mesures = compteurs
+                for stats, delta in (
+                    (self.loader.cache_stats, cache_delta),
+                    (self.store.stats, store_delta),
+                ):
+                    for k, v in delta.items():
+                        stats[k] = stats.get(k, 0) + v
+                PROFILER.records.extend(mesures)
+            yield pair, resultat, erreur
+
+    def _calculer_paires_hors_memoire(self, pairs):
+        """
+        Analyse les paires l'une après l'autre par partitions sur disque
+        (voir core/hors_memoire.py), la mémoire étant bornée par `budget_memoire`.
+        """
+        ignorees = [
+            option for option, active in (
+                ("--jobs", self.jobs > 1),
+                ("--nway", self.nway),
+                ("--fuzzy-align", "alignement" in self.pair_options),
+                ("--engine polars", self.moteur == MOTEUR_POLARS),
+            ) if active
+        ]
+        if ignorees:
+            logging.warning("Comparaison hors mémoire : options ignorées %s.", ignorees)
+        for pair in pairs:
+            try:
+                with PROFILER.paire(pair):
+                    resultat = analyser_couple_hors_memoire(
+                        pair,
+                        self.loader,
+                        self.budget_memoire,
+                        classeur_unique=self.pair_options["classeur_unique"],
+                        **self.options_sortie,
+                    )
+            except OSError as e:
+                yield pair, None, e
+            else:
+                yield pair, resultat, None
+
+    def _calculer_paires_polars(self, pairs):
+        """
+        Analyse les paires l'une après l'autre avec le moteur polars (voir
+        core/moteur_polars.py), dont chaque requête est déjà multi-cœur.
+        """
+        ignorees = [
+            option for option, active in (
+                ("--jobs", self.jobs > 1),
+                ("--nway", self.nway),
+                ("--fuzzy-align", "alignement" in self.pair_options),
+            ) if active
+        ]
+        if ignorees:
+            logging.warning("Moteur polars : options ignorées %s.", ignorees)
+        for pair in pairs:
+            try:
+                with PROFILER.paire(pair):
+                    resultat = analyser_couple_polars(
+                        pair,
+                        self.loader,
+                        classeur_unique=self.pair_options["classeur_unique"],
+                        **self.options_sortie,
+                    )
+            except OSError as e:
+                yield pair, None, e
+            else:
+                yield pair, resultat, None
+
+    def _calculer_paires_nway(self, pairs):
+        """
+        Analyse les paires groupe par groupe (même suffixe) avec une seule
+        comparaison N-way par groupe, puis produit (paire, résultat, erreur)
+        dans l'ordre de `pairs`.
+        """
+        groupes = {}
+        for pair in pairs:
+            groupes.setdefault(pair[0].split("_", 1)[1], []).append(pair)
+
+        resultats = {}
+        for suffixe, pairs_groupe in groupes.items():
+            logging.info(
+                "Comparaison N-way du groupe %s (%s paires).", suffixe, len(pairs_groupe)
+            )
+            with PROFILER.paire((suffixe,)):
+                resultats.update(
+                    analyser_groupe_matrices(
+                        pairs_groupe, self.loader, store=self.store, **self._options_paires()
+                    )
+                )
+        for pair in pairs:
+            resultat, erreur = resultats[pair]
+            yield pair, resultat, erreur
 
     def analyse_sti_matrices(self):
         """Analyse toutes les paires de matrices définies dans la configuration."""
         res_sti = {}
         set1 = set()
         set2 = set()
-        for name_x, name_y in get_matrix_pairs(self.loader):
+        pairs = get_matrix_pairs(self.loader)
+        self.bilan_paires = {"paires": len(pairs), "paires_en_echec": 0}
+        for (name_x, name_y), resultat, erreur in self._resultats_paires(pairs):
             sti = name_x[3:]  # Strip prefix (e.g. GE_)
-            try:
-                res, set1_temp, set2_temp = analyser_couple_matrices((name_x, name_y))
-                res_sti[sti] = res
-                set1 |= set1_temp
-                set2 |= set2_temp
-            except OSError as e:
+            if erreur is not None:
+                self.bilan_paires["paires_en_echec"] += 1
                 logging.warning(
-                    "Échec d’analyse sur la paire (%s, %s) : %s", name_x, name_y, e
+                    "Échec d’analyse sur la paire (%s, %s) : %s", name_x, name_y, erreur
                 )
+                continue
+            if resultat is None:
+                continue
+            res, set1_temp, set2_temp = resultat
+            res_sti[sti] = res
+            set1 |= set1_temp
+            set2 |= set2_temp
         return res_sti, set1, set2
 
     @staticmethod
-    def consolider_dfs(res_sti):
-        """Concatène et structure les DataFrames valides."""
+    def consolider_dfs(res_sti, moteur=MOTEUR_PANDAS):
+        """Concatène et structure les DataFrames valides (moteur pandas ou polars)."""
+        with PROFILER.stage("consolidation") as mesure:
+            if moteur == MOTEUR_POLARS:
+                df = consolider_polars(res_sti)
+            else:
+                df = STIAnalyzer._consolider_dfs(res_sti)
+            mesure["rows"] = 0 if df is None else len(df)
+        return df
+
+    @staticmethod
+    def _consolider_dfs(res_sti):
+        """Corps de `consolider_dfs`."""
         dfs_valides = [
             df.assign(STI=sti)[["STI"] + [col for col in df.columns if col != "STI"]]
             for sti, df in res_sti.items()
@@ -61,37 +372,60 @@ class STIAnalyzer:
 
         df = pd.concat(dfs_valides, ignore_index=True)
 
-        if df["Reference"].apply(type).eq(list).any():
+        if any(isinstance(refs, list) for refs in df["Reference"]):
             df = df.explode("Reference")
 
-        df = df.groupby(["STI", "Champ", "État", "Différence"], as_index=False).agg(
-            {"Reference": set}
+        df = regrouper_references(
+            df, ["STI", "Champ", "État", "Différence"], distinctes=True
         )
-
-        df["Reference"] = df["Reference"].map(tuple)
-        df["nb_references"] = df["Reference"].apply(len)
         df.sort_values(by=["nb_references"], ascending=False, inplace=True)
 
         return df
 
     def run(self):
-        """Lance l'analyse complète."""
+        """
+        Lance l'analyse complète.
+
+        Returns:
+            dict: bilan du jeu de données (paires, divergences par champ,
+            documents cités, fichier consolidé), repris par le lot (core/batch.py).
+        """
+        try:
+            # Section `ppd` de la configuration : export DOORS régénéré si besoin
+            convertir_ppd_dataset(self.dataset_path, self.loader.config, force=self.force)
+        except OSError as e:
+            logging.warning("Conversion du PPD impossible : %s", e)
+
+        if self.base is not None:
+            self.base.demarrer(self.config_path)
         res_sti, set1, set2 = self.analyse_sti_matrices()
-        df_consolidated = self.consolider_dfs(res_sti)
-        doc_reference_path = os.path.join(self.dataset_path, "PPD_export_DOORS.csv")
+        df_consolidated = self.consolider_dfs(res_sti, self.moteur)
+        doc_reference_path = chemin_referentiel(self.dataset_path) or os.path.join(
+            self.dataset_path, "PPD_export_DOORS.csv"
+        )
         if df_consolidated is not None and os.path.exists(doc_reference_path):
-            df_ref = pd.read_csv(
-                doc_reference_path, sep="\t", dtype={"N°": str}, encoding="utf-8-sig"
+            doc_index = DocumentIndex.charger(
+                doc_reference_path,
+                cache_dir=self.loader.cache_dir if self.loader.use_cache else None,
             )
-            df_ref["index"] = df_ref["N°"].astype(str) + "_" + df_ref["Référence ALSTOM"].astype(str)
-            df_ref.set_index("index", inplace=True)
-            df_consolidated = enrichir_colonne_difference(df_consolidated, df_ref, self.labels)
+            with PROFILER.stage("enrichissement", rows=len(df_consolidated)):
+                df_consolidated = enrichir_colonne_difference(
+                    df_consolidated, doc_index, self.labels
+                )
             logging.info("Colonne 'Différence' enrichie avec les titres et révisions.")
         elif df_consolidated is not None:
             logging.warning(
                 "Fichier de référence documentaire introuvable : %s", doc_reference_path
             )
 
+        self.df_consolidated = df_consolidated
+        if self.base is not None:
+            self.base.enregistrer_consolidation(df_consolidated)
+            self.base.terminer(
+                self.bilan_paires["paires"],
+                0 if df_consolidated is None else len(df_consolidated),
+            )
+            logging.info("Base des résultats mise à jour : %s", self.base.path)
         if df_consolidated is not None:
             os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
             export_df_excel(df_consolidated, self.output_file)
@@ -102,9 +436,42 @@ class STIAnalyzer:
                 len(res_sti),
             )
 
+        logging.info(
+            "Matrices préparées : %s réutilisation(s), %s chargement(s), %s éviction(s).",
+            self.store.stats["hits"],
+            self.store.stats["misses"],
+            self.store.stats["evictions"],
+        )
+        if self.loader.use_cache:
+            logging.info(
+                "Cache des matrices : %s lecture(s) en cache, %s lecture(s) Excel.",
+                self.loader.cache_stats["hits"],
+                self.loader.cache_stats["misses"],
+            )
+
         logging.info("\n liste 1 de documents : {%s}", set1)
         logging.info("\n liste 2 de documents : {%s}", set2)
 
+        if PROFILER.enabled:
+            metrics_path = self.loader.get_output_path("profile_metrics.json")
+            PROFILER.ecrire_json(metrics_path)
+            logging.info("Profil des étapes (%s) :\n%s", metrics_path, PROFILER.tableau())
+
+        return {
+            "dataset": self.dataset_path,
+            "config": self.config_path,
+            **self.bilan_paires,
+            "matrices_comparees": len(res_sti),
+            "divergences": 0 if df_consolidated is None else len(df_consolidated),
+            "divergences_par_champ": (
+                {} if df_consolidated is None
+                else df_consolidated.groupby("Champ").size().to_dict()
+            ),
+            "documents_1": len(set1),
+            "documents_2": len(set2),
+            "fichier": None if df_consolidated is None else self.output_file,
+        }
+
 
 def main(config_path):
     """Fonction principale pour compatibilité CLI."""
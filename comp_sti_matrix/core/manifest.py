@@ -0,0 +1,169 @@
+"""Manifeste d'exécution : empreintes des entrées et résultats réutilisables par paire."""
+
+import os
+import json
+import pickle
+import hashlib
+import logging
+
+from comp_sti_matrix.core.readers import choisir_lecteur
+
+MANIFEST_NAME = "run_manifest.json"
+# À incrémenter quand le format ou le calcul des résultats par paire change
+MANIFEST_VERSION = 2
+
+
+def hash_fichier(path: str, chunk_size: int = 1 << 20) -> str:
+    """Renvoie le SHA-256 du contenu d'un fichier."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloc in iter(lambda: f.read(chunk_size), b""):
+            digest.update(bloc)
+    return digest.hexdigest()
+
+
+def hash_objet(obj) -> str:
+    """Renvoie le SHA-256 d'un objet sérialisable en JSON (ordre des clés ignoré)."""
+    texte = json.dumps(obj, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(texte.encode("utf-8")).hexdigest()
+
+
+class RunManifest:
+    """
+    Manifeste stocké dans output/run_manifest.json.
+
+    Pour chaque paire, il conserve l'empreinte de ses entrées (contenu des
+    classeurs, configuration et lecteur des deux matrices, `fields_to_compare`,
+    options de lecture et d'analyse) et le fichier où son résultat a été sauvegardé. Une paire
+    dont l'empreinte n'a pas changé peut reprendre ce résultat sans être
+    recalculée. Les résultats relus ou enregistrés restent en mémoire pour
+    les exécutions suivantes du même manifeste (mode surveillance).
+    """
+
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.results_dir = os.path.join(output_dir, "pairs")
+        self.data = {"version": MANIFEST_VERSION, "files": {}, "pairs": {}}
+        self._resultats = {}  # clé de paire -> (empreinte, résultat)
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning("Manifeste illisible %s : %s", self.path, e)
+            else:
+                if data.get("version") == MANIFEST_VERSION:
+                    self.data = data
+
+    def hash_classeur(self, path: str) -> str:
+        """
+        Renvoie le hash du contenu d'un classeur.
+
+        Le hash mémorisé est réutilisé tant que taille et date de modification
+        sont inchangées, pour ne pas relire les classeurs à chaque exécution.
+        """
+        stat = os.stat(path)
+        cle = os.path.abspath(path)
+        connu = self.data["files"].get(cle)
+        if connu and connu["size"] == stat.st_size and connu["mtime_ns"] == stat.st_mtime_ns:
+            return connu["sha256"]
+        sha = hash_fichier(path)
+        self.data["files"][cle] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha,
+        }
+        return sha
+
+    def empreinte_paire(self, loader, pair, options=None):
+        """
+        Calcule l'empreinte des entrées d'une paire.
+
+        Renvoie None si un classeur est introuvable : la paire est alors
+        recalculée et l'erreur remonte comme d'habitude.
+        """
+        entrees = []
+        for nom in pair:
+            entry = next((m for m in loader.matrices if m["name"] == nom), None)
+            if entry is None:
+                return None
+            file_path = os.path.join(loader.excel_dir, entry["file"])
+            try:
+                sha = self.hash_classeur(file_path)
+            except OSError:
+                return None
+            entrees.append({
+                "config": entry,
+                "sha256": sha,
+                "reader": choisir_lecteur(file_path, entry.get("reader") or loader.reader),
+            })
+
+        return hash_objet(
+            {
+                "matrices": entrees,
+                "fields_to_compare": loader.get_fields_to_compare(),
+                # Options de lecture qui changent les valeurs comparées ("1" / "1.0")
+                "lecture": {
+                    "prune_columns": loader.prune_columns,
+                    "low_memory": getattr(loader, "low_memory", False),
+                },
+                "options": options or {},
+            }
+        )
+
+    @staticmethod
+    def cle(pair) -> str:
+        """Clé d'une paire dans le manifeste."""
+        return "-".join(pair)
+
+    def resultat(self, pair, empreinte):
+        """
+        Renvoie (True, résultat) si la paire peut être reprise, (False, None) sinon.
+        """
+        if empreinte is None:
+            return False, None
+        entree = self.data["pairs"].get(self.cle(pair))
+        if not entree or entree["fingerprint"] != empreinte:
+            return False, None
+        en_memoire = self._resultats.get(self.cle(pair))
+        if en_memoire is not None and en_memoire[0] == empreinte:
+            return True, en_memoire[1]
+        try:
+            with open(os.path.join(self.results_dir, entree["result"]), "rb") as f:
+                resultat = pickle.load(f)
+            self._resultats[self.cle(pair)] = (empreinte, resultat)
+            return True, resultat
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning("Résultat stocké illisible pour %s : %s", self.cle(pair), e)
+            return False, None
+
+    def enregistrer(self, pair, empreinte, resultat) -> None:
+        """Sauvegarde le résultat d'une paire et son empreinte."""
+        cle = self.cle(pair)
+        if empreinte is None:
+            self.data["pairs"].pop(cle, None)
+            self._resultats.pop(cle, None)
+            return
+        os.makedirs(self.results_dir, exist_ok=True)
+        nom_fichier = f"{cle}.pkl"
+        tmp_path = os.path.join(self.results_dir, nom_fichier + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(resultat, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(self.results_dir, nom_fichier))
+        self.data["pairs"][cle] = {"fingerprint": empreinte, "result": nom_fichier}
+        self._resultats[cle] = (empreinte, resultat)
+
+    def oublier(self, pair) -> None:
+        """Retire une paire du manifeste (échec d'analyse)."""
+        self.data["pairs"].pop(self.cle(pair), None)
+        self._resultats.pop(self.cle(pair), None)
+
+    def sauver(self) -> None:
+        """Écrit le manifeste sur disque."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
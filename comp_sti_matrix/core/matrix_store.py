@@ -0,0 +1,145 @@
+"""Cache mémoire des matrices préparées, partagé par les paires d'une exécution."""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from comp_sti_matrix.core.utils_structural import preparer_matrice
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+def taille_preparee(prepared) -> int:
+    """Estime l'empreinte mémoire (octets) d'une matrice préparée."""
+    if prepared is None:
+        return 0
+    return int(sum(df.memory_usage(deep=True).sum() for df in prepared))
+
+
+class _CacheLRU:
+    """Entrées bornées en mémoire (octets), évincées de la moins récemment utilisée."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __contains__(self, nom: str) -> bool:
+        return nom in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _put(self, nom: str, prepared, taille: int) -> None:
+        """Insère une entrée et évince les plus anciennes si besoin (sous le verrou)."""
+        if nom in self._entries:
+            self.current_bytes -= self._entries.pop(nom)[1]
+
+        if taille > self.max_bytes:
+            logging.info(
+                "Matrice %s (%s octets) trop volumineuse pour le cache mémoire.",
+                nom, taille,
+            )
+            return
+
+        self._entries[nom] = (prepared, taille)
+        self.current_bytes += taille
+        while self.current_bytes > self.max_bytes:
+            ancien, (_, taille_ancien) = self._entries.popitem(last=False)
+            self.current_bytes -= taille_ancien
+            self.stats["evictions"] += 1
+            logging.info("Matrice %s évincée du cache mémoire.", ancien)
+
+    def clear(self) -> None:
+        """Vide le cache."""
+        with self._verrou:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class MatrixStore(_CacheLRU):
+    """
+    Conserve le résultat de `preparer_matrice` par nom de matrice.
+
+    Une matrice impliquée dans k paires n'est ainsi chargée et nettoyée
+    qu'une fois. La mémoire occupée est bornée par `max_bytes` : au-delà,
+    les matrices les moins récemment utilisées sont évincées (LRU).
+    Les DataFrames renvoyés sont partagés et ne doivent pas être modifiés.
+
+    Le cache peut être partagé entre threads : une matrice demandée pendant
+    sa préparation par un autre thread est attendue plutôt que relue.
+    """
+
+    def __init__(self, loader, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        super().__init__(max_bytes)
+        self.loader = loader
+        self._en_cours = {}
+
+    def get(self, nom: str):
+        """Renvoie (requis, non-requis) pour `nom`, en le préparant au besoin."""
+        while True:
+            with self._verrou:
+                if nom in self._entries:
+                    self._entries.move_to_end(nom)
+                    self.stats["hits"] += 1
+                    return self._entries[nom][0]
+                preparation = self._en_cours.get(nom)
+                if preparation is None:
+                    preparation = self._en_cours[nom] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            # Préparée par un autre thread : on attend puis on relit le cache
+            preparation.wait()
+
+        try:
+            prepared = preparer_matrice(nom, self.loader)
+            self.put(nom, prepared)
+        finally:
+            with self._verrou:
+                del self._en_cours[nom]
+            preparation.set()
+        return prepared
+
+    def oublier(self, nom: str) -> None:
+        """Retire une matrice (classeur modifié) : elle sera préparée à nouveau."""
+        with self._verrou:
+            if nom in self._entries:
+                self.current_bytes -= self._entries.pop(nom)[1]
+
+    def put(self, nom: str, prepared) -> None:
+        """Insère une matrice préparée puis évince les plus anciennes si besoin."""
+        taille = taille_preparee(prepared)
+        with self._verrou:
+            self._put(nom, prepared, taille)
+
+
+class CacheLectures(_CacheLRU):
+    """
+    Matrices lues (avant préparation), partagées par les chargeurs d'un même
+    processus : les jeux de données d'un lot qui lisent le même classeur,
+    avec la même feuille, les mêmes colonnes et le même lecteur, ne le
+    lisent qu'une fois.
+
+    Les entrées sont indexées par le nom de l'entrée du cache disque
+    (voir `STILoader._cache_base`), qui change avec le classeur.
+    """
+
+    def get(self, cle: str):
+        """Renvoie une copie superficielle de la matrice lue, ou None."""
+        with self._verrou:
+            if cle not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(cle)
+            self.stats["hits"] += 1
+            df = self._entries[cle][0]
+        # Le chargeur renomme les colonnes de la matrice renvoyée : copie superficielle
+        return df.copy(deep=False)
+
+    def put(self, cle: str, df) -> None:
+        """Conserve une copie superficielle de `df`."""
+        taille = int(df.memory_usage(deep=True).sum())
+        with self._verrou:
+            self._put(cle, df.copy(deep=False), taille)
@@ -0,0 +1,385 @@
+"""
+Moteur polars de la comparaison des paires de matrices (--engine polars).
+
+La chaîne du moteur pandas (nettoyage des colonnes, séparation des
+requis, normalisation des clés, ensembles de clés, différences champ à
+champ, analyse documentaire) y est exprimée en plans paresseux
+(LazyFrame) sur le cache Parquet du chargeur : seules les colonnes clés
+et les champs comparés sont lus, et toutes les tables d'une paire sont
+produites par un seul `collect_all`, exécuté sur plusieurs cœurs avec
+les sous-plans communs calculés une fois. La consolidation des paires a
+aussi sa version polars (`consolider_polars`).
+
+Les tables produites sont celles du moteur pandas (mêmes lignes, même
+ordre) ; l'appariement approché et la comparaison N-way n'existent pas
+dans ce moteur.
+"""
+
+import os
+import logging
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:  # Dépendance optionnelle, requise par --engine polars
+    pl = None
+
+from comp_sti_matrix.core.sti_loader import KEY_COLS, REQUIREMENT_COL
+from comp_sti_matrix.core.readers import nettoyer_nom_colonne
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.utils_structural import (
+    CHAMPS_DOCUMENTAIRES,
+    DOC_PATTERN,
+    VALEURS_REQUISES,
+    exporter_et_analyser,
+    log_summary,
+)
+
+MOTEUR_PANDAS = "pandas"
+MOTEUR_POLARS = "polars"
+MOTEURS = (MOTEUR_PANDAS, MOTEUR_POLARS)
+
+LIGNE = "__ligne"
+CHAMP = "__champ"
+
+
+def choisir_moteur(moteur: str = None) -> str:
+    """
+    Moteur effectif : `moteur` (pandas par défaut), ou pandas si polars
+    est demandé sans être installé.
+    """
+    moteur = moteur or MOTEUR_PANDAS
+    if moteur not in MOTEURS:
+        raise ValueError(f"Moteur inconnu : {moteur} (disponibles : {', '.join(MOTEURS)})")
+    if moteur == MOTEUR_POLARS and pl is None:
+        logging.warning("Moteur polars indisponible (polars non installé) : moteur pandas.")
+        return MOTEUR_PANDAS
+    return moteur
+
+
+def vers_pandas(df) -> pd.DataFrame:
+    """
+    Table polars en DataFrame pandas, par Arrow si pyarrow est installé ;
+    les colonnes de listes deviennent des listes Python (comme `regrouper_references`),
+    valeurs manquantes en NaN.
+    """
+    listes = [col for col, dtype in df.schema.items() if dtype.base_type() == pl.List]
+    try:
+        resultat = df.drop(listes).to_pandas()
+    except ImportError:
+        resultat = pd.DataFrame({col: df[col].to_list() for col in df.columns if col not in listes})
+    for col in listes:
+        valeurs = df[col].to_list()
+        if (df[col].list.drop_nulls().list.len() != df[col].list.len()).any():
+            valeurs = [[np.nan if v is None else v for v in liste] for liste in valeurs]
+        resultat[col] = pd.Series(valeurs, dtype=object)
+    return resultat[df.columns]
+
+
+def source_lazy(nom: str, loader):
+    """Matrice `nom` en LazyFrame : cache Parquet du chargeur, sinon matrice lue."""
+    chemin = loader.chemin_cache(nom)
+    if chemin is not None:
+        return pl.scan_parquet(chemin)
+    df = loader.get_matrix(nom)
+    try:
+        return pl.from_pandas(df).lazy()
+    except (TypeError, ValueError):
+        # Colonnes mixtes (ex. --all-columns, cache pickle) : converties en texte
+        return pl.from_pandas(
+            df.assign(**{
+                col: df[col].map(str, na_action="ignore")
+                for col in df.columns if df[col].dtype == object
+            })
+        ).lazy()
+
+
+def _texte(expr, dtype):
+    """Valeurs de `expr` en texte comme `str()` ; les valeurs manquantes restent nulles."""
+    if dtype == pl.String:
+        return expr
+    if dtype.is_float():
+        expr = expr.fill_nan(None)
+    return expr.map_elements(str, return_dtype=pl.String)
+
+
+def preparer_lazy(lf, nom: str, loader):
+    """
+    Version paresseuse de `preparer_lot` : requis de la matrice `nom`,
+    colonnes nettoyées et remappées, clés normalisées.
+
+    Seules les colonnes clés et une colonne texte `__v<j>` par champ
+    comparé sont gardées ; un champ vaut "nan" là où il manque et "" s'il
+    est absent de la matrice, comme dans `compute_field_diffs`.
+
+    Returns:
+        pl.LazyFrame | None: None si les colonnes clés sont absentes.
+    """
+    remap = loader.get_column_mapping(nom)
+    colonnes = {}
+    for col, dtype in lf.collect_schema().items():
+        final = nettoyer_nom_colonne(col)
+        colonnes.setdefault(remap.get(final, final), (col, dtype))  # Doublon : 1re colonne
+    if not all(col in colonnes for col in KEY_COLS):
+        return None
+
+    def texte(nom_final):
+        col, dtype = colonnes[nom_final]
+        return _texte(pl.col(col), dtype)
+
+    if REQUIREMENT_COL in colonnes:
+        lf = lf.filter(
+            texte(REQUIREMENT_COL).str.strip_chars().str.to_lowercase().is_in(VALEURS_REQUISES)
+        )
+    return lf.select(
+        *(texte(col).str.strip_chars().alias(col) for col in KEY_COLS),
+        *(
+            (texte(champ).fill_null("nan") if champ in colonnes else pl.lit("")).alias(f"__v{j}")
+            for j, champ in enumerate(loader.get_fields_to_compare())
+        ),
+    )
+
+
+def _plans_cles(requis):
+    """
+    Plans des clés exclusives de chaque matrice et des clés communes.
+
+    Les clés sont triées comme `CodesCles` les ordonne : par rang de
+    première apparition de chaque colonne dans les requis des deux matrices.
+    """
+    tous = pl.concat([r.select(KEY_COLS) for r in requis]).with_row_index(LIGNE)
+    rangs = [
+        tous.group_by(col).agg(pl.col(LIGNE).min().alias(f"__rang{k}"))
+        for k, col in enumerate(KEY_COLS)
+    ]
+
+    def ordonner(lf):
+        for col, rang in zip(KEY_COLS, rangs):
+            lf = lf.join(rang, on=col, how="left")
+        return lf.sort([f"__rang{k}" for k in range(len(KEY_COLS))]).select(KEY_COLS)
+
+    distinctes = [r.select(KEY_COLS).drop_nulls().unique() for r in requis]
+    exclusives = [
+        ordonner(distinctes[i].join(distinctes[1 - i], on=KEY_COLS, how="anti"))
+        for i in range(2)
+    ]
+    communes = ordonner(distinctes[0].join(distinctes[1], on=KEY_COLS, how="semi"))
+    return exclusives, communes
+
+
+def _plan_diffs(requis, labels, fields):
+    """
+    Plan des différences champ à champ (format de `compute_field_diffs`) :
+    jointure interne sur les clés dédoublonnées, puis une ligne par clé et
+    champ divergent, dans l'ordre des clés de la première matrice puis des champs.
+    """
+    gauche, droite = (
+        r.unique(subset=KEY_COLS, keep="first", maintain_order=True) for r in requis
+    )
+    # Comme `merge` de pandas, les clés manquantes se joignent entre elles
+    jointure = gauche.with_row_index(LIGNE).join(
+        droite, on=KEY_COLS, how="inner", nulls_equal=True, suffix="_d"
+    )
+    return pl.concat([
+        jointure.filter(pl.col(f"__v{j}") != pl.col(f"__v{j}_d")).select(
+            LIGNE,
+            pl.lit(j, dtype=pl.UInt32).alias(CHAMP),
+            *KEY_COLS,
+            pl.lit(champ).alias("Champ"),
+            pl.col(f"__v{j}").alias(labels[0]),
+            pl.col(f"__v{j}_d").alias(labels[1]),
+        )
+        for j, champ in enumerate(fields)
+    ]).sort(LIGNE, CHAMP).drop(LIGNE, CHAMP)
+
+
+def _plans_documents(diffs, labels):
+    """
+    Plans de l'analyse documentaire des différences (voir
+    `lignes_divergences_documentaires`) : divergences regroupées par
+    (Champ, État, Différence), triées par clés, puis documents cités de
+    chaque côté.
+    """
+    sources = [label.split("_")[0] for label in labels]
+
+    def documents(label):
+        return pl.col(label).str.extract_all(DOC_PATTERN.pattern).list.unique().list.sort()
+
+    docs = diffs.filter(pl.col("Champ").is_in(CHAMPS_DOCUMENTAIRES)).select(
+        "Reference",
+        "Champ",
+        documents(labels[0]).alias("Docs_1"),
+        documents(labels[1]).alias("Docs_2"),
+    ).filter((pl.col("Docs_1").list.len() > 0) | (pl.col("Docs_2").list.len() > 0))
+
+    seuls = [
+        pl.col(a).list.set_difference(pl.col(b)).list.sort()
+        for a, b in (("Docs_1", "Docs_2"), ("Docs_2", "Docs_1"))
+    ]
+    difference = pl.concat_str(
+        [
+            pl.when(seul.list.len() > 0).then(pl.lit(f"{source} : ") + seul.list.join(", "))
+            for seul, source in zip(seuls, sources)
+        ],
+        separator="\n",
+        ignore_nulls=True,
+    )
+    etat = (
+        pl.when((seuls[0].list.len() == 0) & (seuls[1].list.len() == 0))
+        .then(pl.lit("Identiques"))
+        .when(pl.col("Docs_1").list.len() == 0).then(pl.lit(f"Absent dans {sources[0]}"))
+        .when(pl.col("Docs_2").list.len() == 0).then(pl.lit(f"Absent dans {sources[1]}"))
+        .otherwise(pl.lit("Différents"))
+    )
+    cles = ["Champ", "État", "Différence"]
+    regroupees = (
+        docs.with_columns(difference.alias("Différence"), etat.alias("État"))
+        .filter(pl.col("État") != "Identiques")
+        .group_by(cles)
+        .agg(pl.col("Reference"), pl.len().alias("nb_references"))
+        .sort(cles)
+    )
+    cites = [
+        docs.select(pl.col(col).explode().drop_nulls().unique()) for col in ("Docs_1", "Docs_2")
+    ]
+    return [regroupees, *cites]
+
+
+def comparer_paire_polars(requis, labels, fields):
+    """
+    Compare deux matrices préparées par `preparer_lazy`.
+
+    Les requis sont d'abord lus (lecture Parquet limitée aux colonnes et
+    lignes utiles), puis les tables de clés et les différences sont
+    calculées par un seul `collect_all` ; l'analyse documentaire est un
+    second plan, sur les différences matérialisées. Chaque table n'est
+    ainsi calculée qu'une fois (polars recalculerait sinon les sous-plans
+    partagés par plusieurs tables).
+
+    Returns:
+        tuple: (summary, exclusifs, commun, divergents, analyse), en
+        DataFrames pandas identiques à ceux de `compare_matrix_entries_multi`
+        ; `analyse` est le résultat de `analyser_divergences_documentaires`
+        (None sans divergence).
+    """
+    fields = list(fields or [])
+    with PROFILER.stage("preparation") as mesure:
+        prepares = pl.collect_all(requis)
+        mesure["rows"] = sum(len(df) for df in prepares)
+    requis = [df.lazy() for df in prepares]
+    exclusives, communes = _plans_cles(requis)
+    plans = [*exclusives, communes] + [
+        r.select((~pl.struct(KEY_COLS).is_first_distinct()).sum()) for r in requis
+    ]
+    if fields:
+        plans.append(_plan_diffs(requis, labels, fields))
+
+    with PROFILER.stage("requete_polars") as mesure:
+        tables = pl.collect_all(plans)
+        mesure["rows"] = len(tables[5]) if fields else 0
+
+    exclusifs = {label: vers_pandas(df) for label, df in zip(labels, tables[:2])}
+    commun = vers_pandas(tables[2])
+    summary = {
+        f"Total entries in {label}": len(commun) + len(exclusifs[label]) for label in labels
+    }
+    summary["Common entries in all matrices"] = len(commun)
+    for label in labels:
+        summary[f"Entries only in {label}"] = len(exclusifs[label])
+
+    if not fields:
+        return summary, exclusifs, commun, pd.DataFrame(), None
+    for label, doublons in zip(labels, tables[3:5]):
+        if doublons.item():
+            logging.warning(
+                " %s clé(s) dupliquée(s) dans %s : seule la première occurrence est comparée.",
+                doublons.item(),
+                label,
+            )
+    diffs = tables[5]
+    if diffs.is_empty():
+        return summary, exclusifs, commun, pd.DataFrame(), None
+
+    with PROFILER.stage("extraction_documents", rows=len(diffs)):
+        regroupees, *cites = pl.collect_all(_plans_documents(diffs.lazy(), labels))
+    divergents = vers_pandas(diffs)
+    set1, set2 = (set(df.to_series().to_list()) for df in cites)
+    if not set1 and not set2:
+        logging.info("Aucune divergence documentaire détectée.")
+        return summary, exclusifs, commun, divergents, (pd.DataFrame(), set(), set())
+    # Tri final par pandas : son tri (non stable) départage les ex æquo du moteur pandas
+    res = vers_pandas(regroupees).sort_values(by="nb_references", ascending=False)
+    return summary, exclusifs, commun, divergents, (res, set1, set2)
+
+
+def analyser_couple_polars(
+    matrices_cibles, loader, classeur_unique=False, ecrire=None, base=None, xlsx=True
+):
+    """
+    Analyse une paire de matrices avec le moteur polars : mêmes fichiers,
+    même base des résultats et même résultat que `analyser_couple_matrices`.
+    """
+    output_dir = loader.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    requis, labels = [], []
+    for nom in matrices_cibles:
+        logging.info(" Chargement de la matrice %s", nom)
+        prepare = preparer_lazy(source_lazy(nom, loader), nom, loader)
+        if prepare is None:
+            logging.warning(" Colonnes clés manquantes dans %s", nom)
+            continue
+        requis.append(prepare)
+        labels.append(nom)
+
+    if len(requis) != 2:
+        raise ValueError("Comparaison impossible : matrices incomplètes.")
+
+    summary, exclusifs, commun, divergents, analyse = comparer_paire_polars(
+        requis, labels, loader.get_fields_to_compare()
+    )
+    log_summary(summary)
+    return exporter_et_analyser(
+        output_dir, exclusifs, commun, divergents, labels, classeur_unique, ecrire, base, xlsx,
+        analyse=analyse,
+    )
+
+
+def _table_eclatee(sti: str, df: pd.DataFrame):
+    """Table d'analyse documentaire d'une STI, une ligne par référence (`explode`)."""
+    references = [refs if isinstance(refs, list) else [refs] for refs in df["Reference"]]
+    longueurs = [len(refs) for refs in references]
+    eclatees = pd.Series(list(chain.from_iterable(references)), dtype=object)
+    return pl.DataFrame({
+        "STI": [sti] * sum(longueurs),
+        **{
+            col: np.repeat(df[col].to_numpy(dtype=object), longueurs).tolist()
+            for col in ("Champ", "État", "Différence")
+        },
+        "Reference": eclatees.where(eclatees.notna(), None).tolist(),
+    })
+
+
+def consolider_polars(res_sti):
+    """Version polars de `STIAnalyzer.consolider_dfs` (même résultat)."""
+    tables = [_table_eclatee(sti, df) for sti, df in res_sti.items() if not df.empty]
+    if not tables:
+        logging.info("Aucune divergence documentaire détectée.")
+        return None
+
+    cles = ["STI", "Champ", "État", "Différence"]
+    df = vers_pandas(
+        pl.concat(tables)
+        .lazy()
+        .unique(subset=[*cles, "Reference"], keep="first", maintain_order=True)
+        .group_by(cles)
+        .agg(pl.col("Reference"), pl.len().alias("nb_references"))
+        .sort(cles)
+        .collect()
+    )
+    df["Reference"] = [tuple(set(refs)) for refs in df["Reference"]]
+    df.sort_values(by=["nb_references"], ascending=False, inplace=True)
+    return df
@@ -0,0 +1,103 @@
+"""Analyse des paires de matrices réparties sur un pool de processus."""
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from comp_sti_matrix.core.sti_loader import STILoader
+from comp_sti_matrix.core.matrix_store import MatrixStore
+from comp_sti_matrix.core.utils_structural import analyser_couple_matrices
+from comp_sti_matrix.core.profiling import PROFILER
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# État propre à chaque processus de travail (chargeur et matrices préparées)
+_WORKER = {}
+
+
+def _init_worker(config_path, loader_options, store_max_bytes, profiler_options=None):
+    """Crée le chargeur et le cache de matrices du processus de travail."""
+    if profiler_options is not None:
+        PROFILER.activer(**profiler_options)
+    loader = STILoader(config_path, **loader_options)
+    _WORKER["loader"] = loader
+    _WORKER["store"] = MatrixStore(loader, max_bytes=store_max_bytes)
+
+
+def _rediriger_log(log_path):
+    """Remplace les handlers du logger racine par un fichier dédié."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handler = logging.FileHandler(log_path, mode="w", encoding="utf-8")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    return handler
+
+
+def _compteurs(loader, store):
+    """Photographie des compteurs de cache du processus."""
+    return dict(loader.cache_stats), dict(store.stats)
+
+
+def _analyser_paire(pair, log_dir, pair_options):
+    """
+    Analyse une paire dans un processus de travail.
+
+    Le log de la paire est écrit dans `log_dir` pour ne pas s'entremêler
+    avec `analyse_structure.log`. Renvoie le résultat de
+    `analyser_couple_matrices`, l'incrément des compteurs de cache et les
+    mesures de profilage de la paire.
+    """
+    loader, store = _WORKER["loader"], _WORKER["store"]
+    avant = _compteurs(loader, store)
+    handler = _rediriger_log(os.path.join(log_dir, f"{'-'.join(pair)}.log"))
+    try:
+        with PROFILER.paire(pair):
+            resultat = analyser_couple_matrices(
+                pair, loader=loader, store=store, **pair_options
+            )
+    finally:
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+    apres = _compteurs(loader, store)
+    deltas = tuple(
+        {k: apres[i][k] - avant[i].get(k, 0) for k in apres[i]} for i in range(2)
+    )
+    return resultat, deltas + (PROFILER.extraire(),)
+
+
+def analyser_paires_en_parallele(
+    pairs,
+    config_path,
+    loader_options,
+    store_max_bytes,
+    jobs,
+    log_dir,
+    pair_options,
+    profiler_options=None,
+):
+    """
+    Répartit les paires sur `jobs` processus.
+
+    Produit (paire, résultat, erreur, compteurs) dans l'ordre de `pairs`,
+    quel que soit l'ordre de fin des tâches. Une `OSError` levée par une
+    paire est renvoyée comme erreur sans interrompre les autres ; `compteurs`
+    contient l'incrément des statistiques de cache du processus de travail
+    et ses mesures de profilage.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(config_path, loader_options, store_max_bytes, profiler_options),
+    ) as pool:
+        futures = [pool.submit(_analyser_paire, pair, log_dir, pair_options) for pair in pairs]
+        for pair, future in zip(pairs, futures):
+            try:
+                resultat, deltas = future.result()
+            except OSError as e:
+                yield pair, None, e, None
+                continue
+            yield pair, resultat, None, deltas
@@ -0,0 +1,168 @@
+"""
+Pipeline de préchargement pour l'analyse séquentielle des paires.
+
+Pendant que le thread principal compare la paire courante, un thread
+prépare les matrices des paires suivantes (lecture et nettoyage, via le
+MatrixStore) et un autre écrit les classeurs des paires terminées. Les
+deux files sont bornées par la profondeur de préchargement, ce qui borne
+aussi la mémoire occupée par les matrices et résultats en attente.
+"""
+
+import queue
+import logging
+import threading
+from functools import partial
+
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.utils_structural import (
+    analyser_couple_matrices,
+    export_dfs_excel,
+)
+
+DEFAULT_PREFETCH = 2
+
+_FIN = object()
+
+
+class Ecrivain:
+    """
+    Thread d'écriture des classeurs Excel.
+
+    `pour(pair)` renvoie une fonction de la signature de `export_dfs_excel`
+    qui met en file les écritures de la paire (bloquant si `profondeur`
+    écritures sont déjà en attente). Les écritures sont faites dans l'ordre
+    de soumission ; une erreur est rattachée à la paire qui l'a soumise,
+    dont les écritures suivantes sont abandonnées, et relevée par `solder`.
+    """
+
+    def __init__(self, profondeur: int) -> None:
+        self._file = queue.Queue(maxsize=max(profondeur, 1))
+        self._condition = threading.Condition()
+        self._en_attente = {}  # paire -> écritures en file ou en cours
+        self.erreurs = {}  # paire -> première erreur d'écriture
+        self._thread = threading.Thread(target=self._boucle, name="sti-ecriture", daemon=True)
+        self._thread.start()
+
+    def pour(self, pair):
+        """Fonction d'écriture (signature de `export_dfs_excel`) de la paire `pair`."""
+        return partial(self.ecrire, tuple(pair))
+
+    def ecrire(self, pair, feuilles: dict, path: str, as_text: bool = True) -> None:
+        """Met en file l'écriture de `feuilles` dans `path` pour la paire `pair`."""
+        with self._condition:
+            self._en_attente[pair] = self._en_attente.get(pair, 0) + 1
+        self._file.put((pair, feuilles, path, as_text))
+
+    def _boucle(self) -> None:
+        while True:
+            tache = self._file.get()
+            if tache is _FIN:
+                return
+            pair, feuilles, path, as_text = tache
+            try:
+                if pair not in self.erreurs:  # Écritures de la paire abandonnées après une erreur
+                    with PROFILER.rattacher("-".join(pair)):
+                        export_dfs_excel(feuilles, path, as_text=as_text)
+            except Exception as e:  # Rattachée à la paire, relevée par `solder`
+                logging.error("Échec d'écriture de %s : %s", path, e)
+                self.erreurs[pair] = e
+            finally:
+                with self._condition:
+                    self._en_attente[pair] -= 1
+                    self._condition.notify_all()
+
+    def solder(self, pair, resultat, erreur):
+        """
+        Attend la fin des écritures de `pair` et renvoie son (paire,
+        résultat, erreur), l'erreur d'écriture éventuelle remplaçant le résultat.
+        """
+        pair = tuple(pair)
+        with self._condition:
+            self._condition.wait_for(lambda: not self._en_attente.get(pair))
+        if erreur is None and pair in self.erreurs:
+            return pair, None, self.erreurs[pair]
+        return pair, resultat, erreur
+
+    def fermer(self) -> None:
+        """Attend la fin des écritures en file et arrête le thread."""
+        self._file.put(_FIN)
+        self._thread.join()
+
+
+class Prechargeur:
+    """
+    Thread qui prépare, dans l'ordre, les matrices des paires à venir.
+
+    Il garde au plus `profondeur` paires d'avance sur le thread principal,
+    qui appelle `attendre` avant chaque paire. Une erreur de chargement est
+    ignorée ici : le thread principal la retrouvera en relisant la matrice.
+    """
+
+    def __init__(self, pairs, store, profondeur: int) -> None:
+        self.store = store
+        self._file = queue.Queue(maxsize=max(profondeur, 1))
+        self._arret = threading.Event()
+        self._thread = threading.Thread(
+            target=self._boucle, args=(list(pairs),), name="sti-prechargement", daemon=True
+        )
+        self._thread.start()
+
+    def _boucle(self, pairs) -> None:
+        for pair in pairs:
+            if self._arret.is_set():
+                return
+            with PROFILER.rattacher("-".join(pair)):
+                for nom in pair:
+                    try:
+                        self.store.get(nom)
+                    except Exception as e:  # Rejouée par le thread principal
+                        logging.debug("Préchargement de %s en échec : %s", nom, e)
+            self._file.put(pair)
+
+    def attendre(self) -> None:
+        """Attend que les matrices de la paire suivante soient préparées."""
+        self._file.get()
+
+    def arreter(self) -> None:
+        """Interrompt le préchargement (paires restantes abandonnées)."""
+        self._arret.set()
+        while self._thread.is_alive():
+            try:
+                self._file.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def analyser_paires_en_pipeline(pairs, loader, store, profondeur: int, pair_options: dict):
+    """
+    Analyse les paires dans l'ordre en recouvrant lectures, comparaisons et
+    écritures, et produit (paire, résultat, erreur) pour chacune.
+
+    Une paire n'est produite qu'une fois ses écritures terminées (pendant
+    la comparaison de la suivante) : un échec d'écriture est ainsi rendu
+    comme l'erreur de cette paire.
+    """
+    ecrivain = Ecrivain(profondeur)
+    prechargeur = Prechargeur(pairs, store, profondeur)
+    precedente = None
+    try:
+        for pair in pairs:
+            prechargeur.attendre()
+            try:
+                with PROFILER.paire(pair):
+                    resultat = analyser_couple_matrices(
+                        pair, loader=loader, store=store, ecrire=ecrivain.pour(pair),
+                        **pair_options
+                    )
+            except OSError as e:
+                courante = (pair, None, e)
+            else:
+                courante = (pair, resultat, None)
+            if precedente is not None:
+                yield ecrivain.solder(*precedente)
+            precedente = courante
+        if precedente is not None:
+            yield ecrivain.solder(*precedente)
+    finally:
+        prechargeur.arreter()
+        ecrivain.fermer()
@@ -0,0 +1,200 @@
+"""Conversion du PPD Excel en référentiel importable dans DOORS."""
+
+import os
+import json
+import logging
+
+import pandas as pd
+
+from comp_sti_matrix.core.profiling import PROFILER
+
+EXPORT_BASENAME = "PPD_export_DOORS"
+
+# 'Nom_DOORS': 'Nom_Excel'
+MAPPING_DICT_DOORS_XLS = {
+    "N°": "Ligne PPD",
+    "Titre": "Titre",
+    "Référence ALSTOM": "N°ATSA",
+    "Révision": "Indice de révision",
+    "Dans PPD Excel": None,
+    "Projets": None,
+    "Matrices": None,
+    "Validé ALSTOM": None,
+    "Métier": "Métier",
+    "Statut d'échange avec la SNCF": None,
+    "Type de document": "Type de document",
+    "Référence SNCF": "N°SNCF",
+    "Référence FNR": "N°Fournisseur",
+    "Nom FNR": "Nom Fournisseur",
+    "Numéro de bordereau": "N° Bordereau",
+    "Date d'envoi": "Date d'envoi",
+    "Date du retour SNCF": "Date du retour SNCF",
+    "Statut du retour SNCF": "Statut du retour SNCF",
+}
+MAPPING_DICT_XLS_DOORS = {
+    v: k for k, v in MAPPING_DICT_DOORS_XLS.items() if v is not None
+}
+COLONNES_DATE = ["Date d'envoi", "Date du retour SNCF"]
+
+# Lecture par défaut du PPD (surchargeable par la section `ppd` de la configuration)
+PPD_DEFAULTS = {"sheet": "PPD", "header_row": 3, "usecols": "B:AM"}
+
+
+def formater_dates(serie: pd.Series) -> pd.Series:
+    """
+    Formate une colonne de dates en jj/mm/aaaa.
+
+    Les cellules qui ne sont pas des dates (texte libre) sont conservées.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime("%d/%m/%Y")
+    dates = pd.to_datetime(serie, errors="coerce", dayfirst=True)
+    return dates.dt.strftime("%d/%m/%Y").where(dates.notna(), serie)
+
+
+def transformer_ppd(ppd_xls: pd.DataFrame) -> pd.DataFrame:
+    """
+    Transforme la feuille PPD en table DOORS indexée par 'N°'.
+
+    Sélection et renommage des colonnes connues, dates en jj/mm/aaaa,
+    suppression des lignes vides et des références commençant par '##'.
+    """
+    colonnes = [col for col in MAPPING_DICT_XLS_DOORS if col in ppd_xls.columns]
+    ppd_doors = ppd_xls[colonnes].rename(columns=MAPPING_DICT_XLS_DOORS)
+    ppd_doors = ppd_doors.assign(
+        **{
+            col: formater_dates(ppd_doors[col])
+            for col in COLONNES_DATE
+            if col in ppd_doors.columns
+        }
+    )
+
+    ppd_doors = ppd_doors.dropna(how="all")  # Suppression des lignes totalement vides
+    ppd_doors = ppd_doors.fillna("")  # Remplissage vide (attendu par DOORS)
+    references = ppd_doors["Référence ALSTOM"].astype(str)
+    ppd_doors = ppd_doors[~references.str.startswith("##")]
+
+    ordre = [col for col in MAPPING_DICT_XLS_DOORS.values() if col in ppd_doors.columns]
+    ppd_doors = ppd_doors[ordre].assign(**{"N°": ppd_doors["N°"].astype(str)})
+    return ppd_doors.set_index("N°")
+
+
+def chemins_export(output_dir: str) -> dict:
+    """Chemins des fichiers produits par `convertir_ppd`."""
+    base = os.path.join(output_dir, EXPORT_BASENAME)
+    return {
+        "csv": base + ".csv",
+        "xlsx": base + ".xlsx",
+        "parquet": base + ".parquet",
+        "empreinte": base + ".source.json",
+    }
+
+
+def empreinte_source(source: str, options: dict) -> dict:
+    """Identifie le PPD source (chemin, taille, date) et les options de lecture."""
+    stat = os.stat(source)
+    return {
+        "source": os.path.abspath(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "options": options,
+    }
+
+
+def convertir_ppd(
+    source: str,
+    output_dir: str,
+    sheet: str = PPD_DEFAULTS["sheet"],
+    header_row: int = PPD_DEFAULTS["header_row"],
+    usecols: str = PPD_DEFAULTS["usecols"],
+    xlsx: bool = True,
+    force: bool = False,
+) -> dict:
+    """
+    Convertit le PPD Excel `source` en PPD_export_DOORS.csv (tabulé, pour
+    DOORS), .xlsx (si `xlsx`) et .parquet (relu directement par l'analyse)
+    dans `output_dir`.
+
+    La conversion est sautée si le PPD et les options n'ont pas changé
+    depuis la précédente (voir PPD_export_DOORS.source.json), sauf avec `force`.
+
+    Returns:
+        dict: chemins des fichiers (clés csv, xlsx, parquet, empreinte).
+    """
+    chemins = chemins_export(output_dir)
+    attendus = ["csv"] + (["xlsx"] if xlsx else [])
+    empreinte = empreinte_source(
+        source, {"sheet": sheet, "header_row": header_row, "usecols": usecols}
+    )
+
+    if not force and all(os.path.exists(chemins[k]) for k in attendus):
+        try:
+            with open(chemins["empreinte"], "r", encoding="utf-8") as f:
+                if json.load(f) == empreinte:
+                    logging.info("PPD inchangé, conversion ignorée : %s", source)
+                    return chemins
+        except (OSError, ValueError):
+            pass
+
+    with PROFILER.stage("conversion_ppd", file=os.path.basename(source)) as mesure:
+        ppd_xls = pd.read_excel(source, sheet_name=sheet, header=header_row, usecols=usecols)
+        ppd_doors = transformer_ppd(ppd_xls)
+        mesure["rows"] = len(ppd_doors)
+
+        os.makedirs(output_dir, exist_ok=True)
+        ecritures = {
+            "csv": lambda p: ppd_doors.to_csv(p, sep="\t", index=True, encoding="utf-8-sig"),
+            "parquet": lambda p: ppd_doors.reset_index().astype(str).to_parquet(p, index=False),
+        }
+        if xlsx:
+            ecritures["xlsx"] = lambda p: ppd_doors.to_excel(p, header=True, index=True)
+        for cle, ecrire in ecritures.items():
+            tmp_path = f"{chemins[cle]}.{os.getpid()}.tmp{os.path.splitext(chemins[cle])[1]}"
+            try:
+                ecrire(tmp_path)
+            except ImportError as e:  # Sans pyarrow : le CSV reste la référence
+                logging.info("Parquet du PPD non écrit : %s", e)
+                continue
+            os.replace(tmp_path, chemins[cle])
+
+        with open(chemins["empreinte"], "w", encoding="utf-8") as f:
+            json.dump(empreinte, f, indent=2, ensure_ascii=False)
+
+    logging.info("Export PPD terminé dans %s", output_dir)
+    return chemins
+
+
+def convertir_ppd_dataset(dataset_path: str, config: dict, force: bool = False):
+    """
+    Convertit le PPD décrit par la section `ppd` de la configuration
+    (`file` relatif au dossier du jeu de données, `sheet`, `header_row`,
+    `usecols`, `xlsx`) vers le dossier du jeu. Renvoie None sans section `ppd`.
+    """
+    section = (config or {}).get("ppd")
+    if not section:
+        return None
+    options = {**PPD_DEFAULTS, **section}
+    return convertir_ppd(
+        os.path.join(dataset_path, options["file"]),
+        dataset_path,
+        sheet=options["sheet"],
+        header_row=options["header_row"],
+        usecols=options["usecols"],
+        xlsx=options.get("xlsx", True),
+        force=force,
+    )
+
+
+def chemin_referentiel(dataset_path: str):
+    """
+    Référentiel documentaire à lire pour le jeu : le Parquet de l'export
+    s'il est au moins aussi récent que le CSV, sinon le CSV (ou None).
+    """
+    chemins = chemins_export(dataset_path)
+    csv_path, parquet_path = chemins["csv"], chemins["parquet"]
+    if os.path.exists(parquet_path) and (
+        not os.path.exists(csv_path)
+        or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)
+    ):
+        return parquet_path
+    return csv_path if os.path.exists(csv_path) else None
@@ -0,0 +1,188 @@
+"""Instrumentation légère des étapes de l'analyse (temps, CPU, mémoire, lignes)."""
+
+import os
+import sys
+import json
+import time
+import logging
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def rss_max_mo():
+    """Pic de mémoire résidente du processus (Mo), ou None si indisponible."""
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return pic / 1024**2 if sys.platform == "darwin" else pic / 1024
+
+
+class StageProfiler:
+    """
+    Collecte, pour chaque étape et chaque paire, le temps écoulé, le temps
+    CPU, le pic RSS du processus, le pic tracemalloc (si activé) et le
+    nombre de lignes traitées.
+
+    Désactivé, `stage` ne coûte qu'un test : l'instrumentation peut rester
+    en place dans le code.
+
+    La paire courante et la pile des étapes sont propres à chaque thread :
+    les threads de préchargement et d'écriture mesurent leurs propres étapes.
+    Le temps CPU est celui du thread.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+        self.records = []
+        self.cprofile_pair = None
+        self.cprofile_dir = None
+        self._local = threading.local()
+
+    @property
+    def pair(self):
+        """Paire à laquelle les mesures du thread courant sont rattachées."""
+        return getattr(self._local, "pair", None)
+
+    @pair.setter
+    def pair(self, valeur):
+        self._local.pair = valeur
+
+    @property
+    def _pile(self) -> list:
+        if not hasattr(self._local, "pile"):
+            self._local.pile = []
+        return self._local.pile
+
+    def activer(self, trace_memory=False, cprofile_pair=None, cprofile_dir=None):
+        """Active la collecte (et tracemalloc si `trace_memory`)."""
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.cprofile_pair = cprofile_pair
+        self.cprofile_dir = cprofile_dir
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, **infos):
+        """
+        Mesure le bloc encadré. Le dictionnaire renvoyé peut être complété
+        (ex. `mesure["rows"] = len(df)`) avant la sortie du bloc.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        mesure = {"stage": name, "pair": self.pair, **infos}
+        cadre = {"peak_enfants": 0}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._pile.append(cadre)
+        debut, debut_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield mesure
+        finally:
+            mesure["wall_s"] = time.perf_counter() - debut
+            mesure["cpu_s"] = time.thread_time() - debut_cpu
+            mesure["peak_rss_mb"] = rss_max_mo()
+            self._pile.pop()
+            if self.trace_memory:
+                pic = max(tracemalloc.get_traced_memory()[1], cadre["peak_enfants"])
+                mesure["tracemalloc_peak_mb"] = pic / 1024**2
+                if self._pile:
+                    parent = self._pile[-1]
+                    parent["peak_enfants"] = max(parent["peak_enfants"], pic)
+            self.records.append(mesure)
+
+    @contextmanager
+    def rattacher(self, pair):
+        """Rattache les mesures du bloc à la paire `pair` (déjà jointe), sans étape."""
+        precedente = self.pair
+        self.pair = pair
+        try:
+            yield
+        finally:
+            self.pair = precedente
+
+    @contextmanager
+    def paire(self, pair):
+        """Rattache les mesures du bloc à `pair` (et lance cProfile si demandé)."""
+        precedente = self.pair
+        self.pair = "-".join(pair)
+        profil = None
+        if self.enabled and self.cprofile_pair == self.pair:
+            profil = cProfile.Profile()
+            profil.enable()
+        try:
+            with self.stage("paire") if self.enabled else nullcontext():
+                yield
+        finally:
+            if profil is not None:
+                profil.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                path = os.path.join(self.cprofile_dir, f"profile_{self.pair}.prof")
+                profil.dump_stats(path)
+                logging.info("Profil cProfile de la paire %s : %s", self.pair, path)
+            self.pair = precedente
+
+    def extraire(self):
+        """Renvoie et vide les mesures collectées (transfert depuis un processus)."""
+        records, self.records = self.records, []
+        return records
+
+    def resume(self) -> list[dict]:
+        """Agrège les mesures par étape."""
+        par_etape = {}
+        for m in self.records:
+            agg = par_etape.setdefault(
+                m["stage"],
+                {"stage": m["stage"], "count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                 "rows": 0, "peak_rss_mb": 0.0, "tracemalloc_peak_mb": None},
+            )
+            agg["count"] += 1
+            agg["wall_s"] += m["wall_s"]
+            agg["cpu_s"] += m["cpu_s"]
+            agg["rows"] += m.get("rows") or 0
+            agg["peak_rss_mb"] = max(agg["peak_rss_mb"], m["peak_rss_mb"] or 0.0)
+            if m.get("tracemalloc_peak_mb") is not None:
+                agg["tracemalloc_peak_mb"] = max(
+                    agg["tracemalloc_peak_mb"] or 0.0, m["tracemalloc_peak_mb"]
+                )
+        return sorted(par_etape.values(), key=lambda a: a["wall_s"], reverse=True)
+
+    def tableau(self) -> str:
+        """Résumé lisible des étapes, de la plus coûteuse à la moins coûteuse."""
+        lignes = [
+            f"{'étape':<28} {'appels':>7} {'temps (s)':>10} {'CPU (s)':>9} "
+            f"{'lignes':>10} {'RSS max (Mo)':>13} {'tracemalloc (Mo)':>17}"
+        ]
+        for agg in self.resume():
+            pic_py = agg["tracemalloc_peak_mb"]
+            lignes.append(
+                f"{agg['stage']:<28} {agg['count']:>7} {agg['wall_s']:>10.3f} "
+                f"{agg['cpu_s']:>9.3f} {agg['rows']:>10} {agg['peak_rss_mb']:>13.1f} "
+                f"{'-' if pic_py is None else f'{pic_py:.1f}':>17}"
+            )
+        return "\n".join(lignes)
+
+    def ecrire_json(self, path: str) -> None:
+        """Écrit les mesures détaillées et agrégées dans un fichier JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"stages": self.resume(), "records": self.records},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+# Instance partagée par les modules de l'analyse
+PROFILER = StageProfiler()
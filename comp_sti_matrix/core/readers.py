@@ -0,0 +1,188 @@
+"""
+Lecteurs des matrices STI (Excel, CSV, Parquet).
+
+Chaque lecteur prend (chemin, feuille, ligne d'en-tête, colonnes, options)
+et renvoie un DataFrame équivalent à celui de `pd.read_excel` : mêmes noms
+de colonnes, mêmes valeurs manquantes. Avec `colonnes` (en-têtes nettoyés),
+seules ces colonnes sont lues, toutes en texte.
+"""
+
+import os
+import re
+import logging
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+READER_AUTO = "auto"
+
+# Extensions lues directement, sans passer par un moteur Excel
+EXTENSIONS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".txt": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def nettoyer_nom_colonne(nom) -> str:
+    """Nettoie un en-tête comme `nettoyer_colonnes` le fait pour tout un DataFrame."""
+    return re.sub(r"\s+", " ", str(nom).strip().replace("\n", " "))
+
+
+def _usecols(colonnes):
+    """Filtre `usecols` de pandas sur les en-têtes nettoyés, ou None."""
+    if colonnes is None:
+        return None
+    return lambda col: nettoyer_nom_colonne(col) in colonnes
+
+
+def _en_texte(df: pd.DataFrame) -> pd.DataFrame:
+    """Convertit toutes les colonnes en texte en gardant les valeurs manquantes."""
+    return df.apply(lambda serie: serie.astype(object).map(str).where(serie.notna()))
+
+
+def lire_pandas(file_path, sheet, header_row, colonnes, options) -> pd.DataFrame:
+    """`pd.read_excel` avec le moteur par défaut (openpyxl pour .xlsx, xlrd pour .xls)."""
+    kwargs = {}
+    if colonnes is not None:
+        kwargs = {"usecols": _usecols(colonnes), "dtype": str}
+    return pd.read_excel(file_path, sheet_name=sheet, header=header_row, **kwargs)
+
+
+def lire_calamine(file_path, sheet, header_row, colonnes, options) -> pd.DataFrame:
+    """
+    `pd.read_excel` avec le moteur calamine (python-calamine, en Rust).
+
+    Sans python-calamine, bascule sur le moteur par défaut.
+    """
+    kwargs = {"engine": "calamine"}
+    if colonnes is not None:
+        kwargs.update(usecols=_usecols(colonnes), dtype=str)
+    try:
+        return pd.read_excel(file_path, sheet_name=sheet, header=header_row, **kwargs)
+    except ImportError as e:
+        logging.warning("Lecteur calamine indisponible (%s) : moteur par défaut.", e)
+        return lire_pandas(file_path, sheet, header_row, colonnes, options)
+
+
+def _valeur_cellule(valeur):
+    """Convertit une valeur openpyxl comme le fait le lecteur openpyxl de pandas."""
+    if valeur is None:
+        return ""
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    return valeur
+
+
+def _noms_uniques(entete) -> list[str]:
+    """Noms de colonnes tels que pandas les produit (vides et doublons compris)."""
+    noms = []
+    vus = {}
+    for i, nom in enumerate(entete):
+        nom = f"Unnamed: {i}" if nom in (None, "") else str(nom)
+        base = nom
+        while nom in vus:
+            vus[base] += 1
+            nom = f"{base}.{vus[base]}"
+        vus[nom] = 0
+        noms.append(nom)
+    return noms
+
+
+def lire_openpyxl(file_path, sheet, header_row, colonnes, options) -> pd.DataFrame:
+    """
+    Lecture en flux d'un classeur openpyxl en mode lecture seule.
+
+    Les lignes sont parcourues en valeurs brutes et seules les cellules des
+    colonnes retenues sont converties, puis le parseur texte de pandas
+    applique les mêmes règles que `pd.read_excel` (valeurs manquantes, types).
+    """
+    from openpyxl import load_workbook
+
+    classeur = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        feuille = classeur[sheet] if sheet is not None else classeur.worksheets[0]
+        lignes = feuille.iter_rows(values_only=True)
+        for _ in range(header_row):
+            next(lignes, None)
+        entete = list(next(lignes, ()))
+        while entete and entete[-1] in (None, ""):
+            entete.pop()
+        noms = _noms_uniques(entete)
+        indices = [
+            i for i, nom in enumerate(noms)
+            if colonnes is None or nettoyer_nom_colonne(nom) in colonnes
+        ]
+        data = []
+        derniere_ligne = -1
+        for ligne in lignes:
+            valeurs = [
+                _valeur_cellule(ligne[i]) if i < len(ligne) else "" for i in indices
+            ]
+            if any(v != "" for v in ligne if v is not None):
+                derniere_ligne = len(data)
+            data.append(valeurs)
+    finally:
+        classeur.close()
+
+    data = data[: derniere_ligne + 1]
+    if not indices:
+        return pd.DataFrame()
+    parser = TextParser(
+        [[noms[i] for i in indices]] + data,
+        header=0,
+        dtype=str if colonnes is not None else None,
+        skip_blank_lines=False,
+    )
+    return parser.read()
+
+
+def lire_csv(file_path, sheet, header_row, colonnes, options) -> pd.DataFrame:
+    """
+    Export CSV (ex. DOORS). Séparateur et encodage via `read_options`
+    (tabulation et utf-8-sig par défaut, comme l'export PPD).
+    """
+    kwargs = {"sep": "\t", "encoding": "utf-8-sig", **(options or {})}
+    if colonnes is not None:
+        kwargs.update(usecols=_usecols(colonnes), dtype=str)
+    return pd.read_csv(file_path, header=header_row, **kwargs)
+
+
+def lire_parquet(file_path, sheet, header_row, colonnes, options) -> pd.DataFrame:
+    """Fichier Parquet : seules les colonnes retenues sont décodées."""
+    if colonnes is None:
+        return pd.read_parquet(file_path)
+    import pyarrow.parquet as pq
+
+    noms = pq.ParquetFile(file_path).schema_arrow.names
+    retenues = [nom for nom in noms if nettoyer_nom_colonne(nom) in colonnes]
+    return _en_texte(pd.read_parquet(file_path, columns=retenues))
+
+
+LECTEURS = {
+    "pandas": lire_pandas,
+    "calamine": lire_calamine,
+    "openpyxl": lire_openpyxl,
+    "csv": lire_csv,
+    "parquet": lire_parquet,
+}
+
+
+def choisir_lecteur(file_path: str, demande: str = None) -> str:
+    """
+    Nom du lecteur à utiliser pour `file_path`.
+
+    Les fichiers CSV et Parquet sont reconnus à leur extension ; pour les
+    autres fichiers, `demande` choisit le lecteur (« pandas » par défaut).
+    """
+    demande = demande or READER_AUTO
+    if demande != READER_AUTO and demande not in LECTEURS:
+        raise ValueError(
+            f"Lecteur inconnu : {demande} (disponibles : {', '.join(LECTEURS)})"
+        )
+    format_fichier = EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+    if format_fichier is not None:
+        return format_fichier
+    return "pandas" if demande == READER_AUTO else demande
@@ -0,0 +1,299 @@
+"""
+Base SQLite des résultats d'analyse.
+
+Chaque table de résultats d'une paire (exclusives, communes, divergences
+champ à champ, analyse documentaire) et l'analyse consolidée y sont
+enregistrées en format long, indexées par jeu de données, paire, STI et
+champ. La base reflète le dernier état de chaque paire : une paire
+recalculée remplace ses lignes, `run_id` indique l'exécution qui les a
+produites (table `executions`). Les classeurs xlsx deviennent une
+présentation optionnelle de ces résultats (voir cli/query.py).
+"""
+
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+DEFAULT_DB_NAME = "resultats.sqlite"
+
+# Tables par paire : colonnes après (dataset, paire, sti, run_id)
+TABLES_PAIRE = {
+    "exclusifs": ["matrice", "reference", "requirement"],
+    "communs": [
+        "reference", "requirement", "reference_alignee", "requirement_alignee", "similarite"
+    ],
+    "divergences": [
+        "reference", "requirement", "champ", "source_1", "valeur_1", "source_2", "valeur_2"
+    ],
+    "documents": ["champ", "etat", "difference", "reference"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset TEXT, config TEXT, debut TEXT, fin TEXT,
+    paires INTEGER, divergences INTEGER
+);
+CREATE TABLE IF NOT EXISTS paires (
+    dataset TEXT, paire TEXT, sti TEXT, run_id INTEGER,
+    PRIMARY KEY (dataset, paire)
+);
+CREATE TABLE IF NOT EXISTS exclusifs (
+    dataset TEXT, paire TEXT, sti TEXT, run_id INTEGER,
+    matrice TEXT, reference TEXT, requirement TEXT
+);
+CREATE TABLE IF NOT EXISTS communs (
+    dataset TEXT, paire TEXT, sti TEXT, run_id INTEGER,
+    reference TEXT, requirement TEXT,
+    reference_alignee TEXT, requirement_alignee TEXT, similarite REAL
+);
+CREATE TABLE IF NOT EXISTS divergences (
+    dataset TEXT, paire TEXT, sti TEXT, run_id INTEGER,
+    reference TEXT, requirement TEXT, champ TEXT,
+    source_1 TEXT, valeur_1 TEXT, source_2 TEXT, valeur_2 TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    dataset TEXT, paire TEXT, sti TEXT, run_id INTEGER,
+    champ TEXT, etat TEXT, difference TEXT, reference TEXT
+);
+CREATE TABLE IF NOT EXISTS consolidation (
+    dataset TEXT, run_id INTEGER,
+    sti TEXT, champ TEXT, etat TEXT, difference TEXT, reference TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_exclusifs_paire ON exclusifs (dataset, paire);
+CREATE INDEX IF NOT EXISTS idx_exclusifs_reference ON exclusifs (reference);
+CREATE INDEX IF NOT EXISTS idx_communs_paire ON communs (dataset, paire);
+CREATE INDEX IF NOT EXISTS idx_divergences_paire ON divergences (dataset, paire);
+CREATE INDEX IF NOT EXISTS idx_divergences_champ ON divergences (champ, sti);
+CREATE INDEX IF NOT EXISTS idx_divergences_reference ON divergences (reference);
+CREATE INDEX IF NOT EXISTS idx_documents_paire ON documents (dataset, paire);
+CREATE INDEX IF NOT EXISTS idx_documents_champ ON documents (champ, sti);
+CREATE INDEX IF NOT EXISTS idx_consolidation_champ ON consolidation (dataset, champ);
+"""
+
+
+def _colonne(df: pd.DataFrame, col: str, n: int):
+    """Valeurs de `col` (None si absente ou manquante), en objets Python."""
+    if df is None or col not in df.columns:
+        return [None] * n
+    serie = df[col].astype(object)
+    return serie.where(serie.notna(), None).tolist()
+
+
+def _lots(table):
+    """Lots d'une table : aucun (None), la table elle-même ou l'itérable de lots."""
+    if table is None:
+        return []
+    if isinstance(table, pd.DataFrame):
+        return [table]
+    return table
+
+
+def _references(df: pd.DataFrame) -> pd.DataFrame:
+    """Une ligne par référence des tables regroupées (colonne 'Reference' en listes)."""
+    df = df.explode("Reference")
+    return df[df["Reference"].notna()]
+
+
+class BaseResultats:
+    """
+    Accès à la base des résultats d'un jeu de données.
+
+    L'objet ne garde que le chemin de la base, le jeu et l'exécution en
+    cours : il peut être transmis aux processus de travail, qui ouvrent
+    leur propre connexion. SQLite sérialise les écritures concurrentes.
+    """
+
+    def __init__(self, path: str, dataset: str) -> None:
+        self.path = path
+        self.dataset = dataset
+        self.run_id = None
+
+    def connexion(self) -> sqlite3.Connection:
+        """Ouvre la base (créée au besoin) en mode WAL."""
+        dossier = os.path.dirname(self.path)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=60)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(SCHEMA)
+        return con
+
+    def demarrer(self, config_path: str) -> int:
+        """Enregistre le début d'une exécution et renvoie son identifiant."""
+        with self.connexion() as con:
+            curseur = con.execute(
+                "INSERT INTO executions (dataset, config, debut) VALUES (?, ?, ?)",
+                (self.dataset, config_path, time.strftime("%Y-%m-%dT%H:%M:%S")),
+            )
+            self.run_id = curseur.lastrowid
+        con.close()
+        return self.run_id
+
+    def terminer(self, paires: int, divergences: int) -> None:
+        """Complète l'exécution en cours (fin, nombre de paires et de divergences)."""
+        with self.connexion() as con:
+            con.execute(
+                "UPDATE executions SET fin = ?, paires = ?, divergences = ? WHERE run_id = ?",
+                (time.strftime("%Y-%m-%dT%H:%M:%S"), paires, divergences, self.run_id),
+            )
+        con.close()
+
+    def contient(self, pair) -> bool:
+        """La paire a-t-elle des résultats enregistrés pour ce jeu ?"""
+        with self.connexion() as con:
+            ligne = con.execute(
+                "SELECT 1 FROM paires WHERE dataset = ? AND paire = ?",
+                (self.dataset, "-".join(pair)),
+            ).fetchone()
+        con.close()
+        return ligne is not None
+
+    def enregistrer_paire(self, labels, exclusifs, commun, divergents, res) -> None:
+        """
+        Remplace, en une transaction, les résultats de la paire `labels`.
+
+        Les tables exclusives, communes et divergentes peuvent aussi être
+        données par lots (itérables de DataFrames, voir core/hors_memoire.py) :
+        elles sont alors insérées au fil de la lecture.
+        """
+        paire = "-".join(labels)
+        sti = labels[0].split("_", 1)[-1]
+        entete = (self.dataset, paire, sti, self.run_id)
+        alignees = [f"{col} ({labels[-1]})" for col in ("Reference", "Requirement")]
+
+        def exclusives():
+            for matrice, table in exclusifs.items():
+                for df in _lots(table):
+                    n = len(df)
+                    yield from zip(
+                        [matrice] * n, _colonne(df, "Reference", n), _colonne(df, "Requirement", n)
+                    )
+
+        def communes():
+            for df in _lots(commun):
+                n = len(df)
+                yield from zip(
+                    _colonne(df, "Reference", n),
+                    _colonne(df, "Requirement", n),
+                    _colonne(df, alignees[0], n),
+                    _colonne(df, alignees[1], n),
+                    _colonne(df, "Similarité", n),
+                )
+
+        def divergences():
+            for df in _lots(divergents):
+                n = len(df)
+                yield from zip(
+                    _colonne(df, "Reference", n),
+                    _colonne(df, "Requirement", n),
+                    _colonne(df, "Champ", n),
+                    [labels[0]] * n,
+                    _colonne(df, labels[0], n),
+                    [labels[1]] * n,
+                    _colonne(df, labels[1], n),
+                )
+
+        def documents():
+            if res is None or res.empty:
+                return
+            docs = _references(res)
+            colonnes = ("Champ", "État", "Différence", "Reference")
+            yield from zip(*(_colonne(docs, col, len(docs)) for col in colonnes))
+
+        lignes = {
+            "exclusifs": exclusives,
+            "communs": communes,
+            "divergences": divergences,
+            "documents": documents,
+        }
+        with self.connexion() as con:
+            for table, colonnes in TABLES_PAIRE.items():
+                con.execute(
+                    f"DELETE FROM {table} WHERE dataset = ? AND paire = ?", (self.dataset, paire)
+                )
+                marques = ", ".join("?" * (4 + len(colonnes)))
+                con.executemany(
+                    f"INSERT INTO {table} VALUES ({marques})",
+                    (entete + tuple(ligne) for ligne in lignes[table]()),
+                )
+            con.execute(
+                "INSERT OR REPLACE INTO paires VALUES (?, ?, ?, ?)", entete
+            )
+        con.close()
+
+    def enregistrer_consolidation(self, df: pd.DataFrame) -> None:
+        """Remplace l'analyse consolidée du jeu (une ligne par référence)."""
+        colonnes = ("STI", "Champ", "État", "Différence", "Reference")
+        lignes = []
+        if df is not None and not df.empty:
+            docs = _references(df)
+            lignes = list(zip(*(_colonne(docs, col, len(docs)) for col in colonnes)))
+        with self.connexion() as con:
+            con.execute("DELETE FROM consolidation WHERE dataset = ?", (self.dataset,))
+            con.executemany(
+                "INSERT INTO consolidation VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((self.dataset, self.run_id) + ligne for ligne in lignes),
+            )
+        con.close()
+
+
+def lire_requete(path: str, sql: str, params=()) -> pd.DataFrame:
+    """Exécute une requête en lecture sur la base et renvoie le résultat."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Base des résultats introuvable : {path}")
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+
+
+def colonnes_table(table: str) -> list[str]:
+    """Colonnes d'une table de la base (ValueError si la table est inconnue)."""
+    if table in TABLES_PAIRE:
+        return ["dataset", "paire", "sti", "run_id"] + TABLES_PAIRE[table]
+    if table == "consolidation":
+        return ["dataset", "run_id", "sti", "champ", "etat", "difference", "reference"]
+    raise ValueError(f"Table inconnue : {table}")
+
+
+def interroger(
+    path: str, table: str = "divergences", filtres: dict = None, par_exigence: bool = False,
+    limite: int = None,
+) -> pd.DataFrame:
+    """
+    Lignes de `table` filtrées par égalité (`filtres` : colonne -> valeur,
+    valeurs None ignorées ; '%' dans la valeur : filtre LIKE).
+
+    Avec `par_exigence`, une ligne par exigence (reference, requirement)
+    avec le nombre et la liste des STI et paires concernées, des plus
+    touchées aux moins touchées.
+    """
+    colonnes = colonnes_table(table)
+    conditions, params = [], []
+    for colonne, valeur in (filtres or {}).items():
+        if valeur is None:
+            continue
+        if colonne not in colonnes:
+            raise ValueError(f"Filtre '{colonne}' sans objet pour la table {table}.")
+        operateur = "LIKE" if "%" in str(valeur) else "="
+        conditions.append(f"{colonne} {operateur} ?")
+        params.append(valeur)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    if par_exigence:
+        cles = ", ".join(c for c in ("reference", "requirement") if c in colonnes)
+        paires = "COUNT(DISTINCT paire) AS nb_paires, " if "paire" in colonnes else ""
+        sql = (
+            f"SELECT {cles}, COUNT(DISTINCT sti) AS nb_sti, GROUP_CONCAT(DISTINCT sti) AS sti, "
+            f"{paires}COUNT(*) AS nb_lignes FROM {table}{where} "
+            f"GROUP BY {cles} ORDER BY nb_sti DESC, nb_lignes DESC, {cles}"
+        )
+    else:
+        sql = f"SELECT * FROM {table}{where} ORDER BY rowid"
+    if limite is not None:
+        sql += f" LIMIT {int(limite)}"
+    return lire_requete(path, sql, params)
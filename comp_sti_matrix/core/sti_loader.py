@@ -1,14 +1,46 @@
 """Définit la classe pour les STI."""
 import os
+import re
+import glob
+import json
+import hashlib
 import logging
 import pandas as pd
 import yaml
 
+from comp_sti_matrix.core.profiling import PROFILER
+from comp_sti_matrix.core.empreintes import ajouter_empreintes
+from comp_sti_matrix.core.readers import LECTEURS, choisir_lecteur, nettoyer_nom_colonne
+
+KEY_COLS = ["Reference", "Requirement"]
+REQUIREMENT_COL = "isRequirement"
+
 
 class STILoader:
     """Repreyésente la classe STI."""
-    def __init__(self, config_path: str):
-        """Initie la classe."""
+    def __init__(
+        self,
+        config_path: str,
+        cache_dir: str = None,
+        use_cache: bool = True,
+        rebuild_cache: bool = False,
+        prune_columns: bool = True,
+        reader: str = None,
+        low_memory: bool = False,
+        lectures=None,
+    ):
+        """
+        Initie la classe.
+
+        `reader` impose le lecteur des matrices (voir `readers.LECTEURS`) ;
+        à défaut, la clé `reader` de la configuration, puis l'extension du
+        fichier décident. Une matrice peut aussi fixer son propre `reader`.
+        `low_memory` est lu par `preparer_matrice` (matrices compactées).
+        `lectures` (`CacheLectures`) partage les matrices lues avec les autres
+        chargeurs du processus (ex. jeux de données d'un même lot).
+        Les matrices lues portent les empreintes de leurs `fields_to_compare`
+        (voir core/empreintes.py), conservées avec elles dans les caches.
+        """
         self.config_path = config_path
         self.dataset_root = os.path.dirname(config_path)
         self.excel_dir = os.path.join(self.dataset_root, "excel_files")
@@ -20,12 +52,53 @@ class STILoader:
 
         self.matrices = self.config.get("matrices", [])
 
+        self.cache_dir = cache_dir or os.path.join(self.output_dir, "cache")
+        self.use_cache = use_cache
+        self.rebuild_cache = rebuild_cache
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.prune_columns = prune_columns
+        self.reader = reader or self.config.get("reader")
+        self.low_memory = low_memory
+        self.lectures = lectures
+
     def list_available(self) -> list[str]:
         """Liste les matrices."""
         return [entry["name"] for entry in self.matrices]
 
     def get_matrix(self, name: str) -> pd.DataFrame:
         """Renvoie le DataFrame corerspondant à la matrice."""
+        file_path, sti_sheet, header_row, colonnes, lecture = self._parametres_lecture(name)
+
+        if self.lectures is None:
+            return self._get_matrix(name, file_path, sti_sheet, header_row, colonnes, lecture)
+
+        cle = os.path.basename(
+            self._cache_base(name, file_path, sti_sheet, header_row, colonnes, lecture)
+        )
+        df = self.lectures.get(cle)
+        if df is not None:
+            logging.info("Matrice %s déjà lue dans ce processus : %s", name, cle)
+            return df
+        df = self._get_matrix(name, file_path, sti_sheet, header_row, colonnes, lecture)
+        self.lectures.put(cle, df)
+        return df
+
+    def chemin_cache(self, name: str):
+        """
+        Entrée Parquet du cache disque de la matrice, écrite au besoin (sans
+        passer par `lectures`), ou None si le cache est désactivé ou en pickle.
+        Permet de relire la matrice par lots (voir core/hors_memoire.py).
+        """
+        if not self.use_cache:
+            return None
+        parametres = self._parametres_lecture(name)
+        chemin = self._cache_base(name, *parametres) + ".parquet"
+        if self.rebuild_cache or not os.path.exists(chemin):
+            self._get_matrix(name, *parametres)
+        return chemin if os.path.exists(chemin) else None
+
+    def _parametres_lecture(self, name: str):
+        """(classeur, feuille, ligne d'en-tête, colonnes retenues, lecteur) de `name`."""
         entry = next((m for m in self.matrices if m["name"] == name), None)
         if not entry:
             raise ValueError(f"Matrice '{name}' non trouvée.")
@@ -36,14 +109,180 @@ class STILoader:
             raise FileNotFoundError(f"Fichier Excel non trouvé : {file_path}")
 
         sti_sheet = entry.get("sti_sheet")
-        sheet_cfg = entry["sheets"].get(sti_sheet, {})
+        sheet_cfg = entry.get("sheets", {}).get(sti_sheet, {})
         header_row = sheet_cfg.get("header_row", 0)
+        lecture = {
+            "reader": choisir_lecteur(file_path, entry.get("reader") or self.reader),
+            "options": entry.get("read_options", {}),
+        }
+
+        colonnes = self.get_required_columns(name) if self.prune_columns else None
+        return file_path, sti_sheet, header_row, colonnes, lecture
+
+    def _get_matrix(self, name, file_path, sti_sheet, header_row, colonnes, lecture):
+        """Lit la matrice depuis le cache disque, ou le classeur à défaut."""
+        if not self.use_cache:
+            return self._lire_avec_empreintes(
+                name, file_path, sti_sheet, header_row, colonnes, lecture
+            )
+
+        cache_base = self._cache_base(
+            name, file_path, sti_sheet, header_row, colonnes, lecture
+        )
+        if not self.rebuild_cache:
+            with PROFILER.stage("lecture_cache", matrix=name):
+                df = self._load_cache(cache_base)
+            if df is not None:
+                self.cache_stats["hits"] += 1
+                logging.info("Cache utilisé pour %s : %s", name, cache_base)
+                return df
+
+        self.cache_stats["misses"] += 1
+        df = self._lire_avec_empreintes(name, file_path, sti_sheet, header_row, colonnes, lecture)
+        self._save_cache(df, name, cache_base)
+        return df
+
+    def _lire_avec_empreintes(self, name, file_path, sti_sheet, header_row, colonnes, lecture):
+        """
+        Lit la matrice et lui ajoute les empreintes de `fields_to_compare`,
+        calculées sur les colonnes sous leur nom final (`column_mapping`).
+        """
+        df = self._read_matrix(name, file_path, sti_sheet, header_row, colonnes, lecture)
+        remap = self.get_column_mapping(name)
+        with PROFILER.stage("empreintes", matrix=name, rows=len(df)):
+            vue = df.rename(
+                columns=lambda c: remap.get(nettoyer_nom_colonne(c), nettoyer_nom_colonne(c))
+            )
+            return ajouter_empreintes(df, self.get_fields_to_compare(), vue=vue)
 
+    def get_required_columns(self, name: str) -> set:
+        """
+        En-têtes (nettoyés) utiles à l'analyse de `name` : colonnes clés,
+        isRequirement et `fields_to_compare`, sous leur nom final ou sous
+        leur nom d'origine dans `column_mapping`.
+        """
+        utiles = set(KEY_COLS) | {REQUIREMENT_COL} | set(self.get_fields_to_compare())
+        colonnes = set(utiles)
+        for origine, cible in self.get_column_mapping(name).items():
+            if cible in utiles:
+                colonnes.add(nettoyer_nom_colonne(origine))
+        return colonnes
+
+    def _read_matrix(self, name, file_path, sti_sheet, header_row, colonnes, lecture):
+        """
+        Lit la feuille STI, limitée à `colonnes` et en texte si elles sont
+        fournies. Si les colonnes clés ne sont pas retrouvées parmi les
+        en-têtes retenus, relit la feuille complète comme auparavant.
+        """
+        if colonnes is None:
+            return self._read_file(file_path, sti_sheet, header_row, None, lecture)
+
+        df = self._read_file(file_path, sti_sheet, header_row, colonnes, lecture)
+        remap = self.get_column_mapping(name)
+        resolues = {remap.get(nettoyer_nom_colonne(c), nettoyer_nom_colonne(c)) for c in df.columns}
+        if set(KEY_COLS) <= resolues:
+            return df
+
+        logging.warning(
+            "Colonnes clés introuvables dans les en-têtes de %s : lecture complète.", name
+        )
+        return self._read_file(file_path, sti_sheet, header_row, None, lecture)
+
+    @staticmethod
+    def _read_file(file_path: str, sti_sheet, header_row, colonnes, lecture) -> pd.DataFrame:
+        """
+        Lit la feuille STI avec le lecteur choisi (Excel, CSV ou Parquet).
+
+        Avec `colonnes` (en-têtes nettoyés), seules ces colonnes sont lues,
+        toutes en texte : pas d'inférence de type ni de colonnes inutiles.
+        """
         logging.info(
-            "Chargement de %s | Feuille : %s | En-tête ligne %s",
-            file_path, sti_sheet, header_row
+            "Chargement de %s | Feuille : %s | En-tête ligne %s | Lecteur : %s",
+            file_path, sti_sheet, header_row, lecture["reader"]
         )
-        return pd.read_excel(file_path, sheet_name=sti_sheet, header=header_row)
+        lire = LECTEURS[lecture["reader"]]
+        with PROFILER.stage(
+            "lecture_excel", file=os.path.basename(file_path), reader=lecture["reader"]
+        ) as mesure:
+            df = lire(file_path, sti_sheet, header_row, colonnes, lecture["options"])
+            mesure["rows"] = len(df)
+        return df
+
+    def _cache_base(
+        self, name: str, file_path: str, sti_sheet, header_row, colonnes=None, lecture=None
+    ) -> str:
+        """
+        Renvoie le chemin (sans extension) de l'entrée de cache d'une matrice.
+
+        La clé couvre le chemin du classeur, sa taille, sa date de modification,
+        la feuille lue, la ligne d'en-tête, les colonnes retenues, le lecteur,
+        ainsi que les champs comparés et le remapping (empreintes) : toute
+        modification invalide l'entrée. Le nom de l'entrée porte aussi
+        l'empreinte du seul chemin : des jeux de données partageant le même
+        dossier de cache ne suppriment pas les entrées des uns et des autres.
+        """
+        stat = os.stat(file_path)
+        key = json.dumps(
+            [os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns,
+             sti_sheet, header_row, sorted(colonnes) if colonnes is not None else None,
+             lecture, self.get_fields_to_compare(), self.get_column_mapping(name)],
+            default=str,
+        )
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{name}_{self._source(file_path)}_{digest}")
+
+    @staticmethod
+    def _source(file_path: str) -> str:
+        """Empreinte courte du chemin du classeur (préfixe des entrées de cache)."""
+        return hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:8]
+
+    @staticmethod
+    def _load_cache(cache_base: str):
+        """Relit une entrée de cache (Parquet, sinon pickle) ou renvoie None."""
+        if os.path.exists(cache_base + ".parquet"):
+            try:
+                return pd.read_parquet(cache_base + ".parquet")
+            except (ImportError, OSError, ValueError) as e:
+                logging.warning("Cache illisible %s : %s", cache_base, e)
+                return None
+        if os.path.exists(cache_base + ".pkl"):
+            try:
+                return pd.read_pickle(cache_base + ".pkl")
+            except (OSError, ValueError, EOFError) as e:
+                logging.warning("Cache illisible %s : %s", cache_base, e)
+        return None
+
+    def _save_cache(self, df: pd.DataFrame, name: str, cache_base: str) -> None:
+        """
+        Écrit la matrice dans le cache et supprime les entrées périmées.
+
+        Seules les entrées du même classeur (et celles de l'ancien format,
+        sans empreinte de chemin) sont supprimées. Parquet est privilégié ; les feuilles qu'Arrow ne sait pas typer
+        (colonnes mixtes, en-têtes non textuels) ou l'absence de pyarrow
+        basculent sur un pickle.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        source = os.path.basename(cache_base)[len(name) + 1:].split("_")[0]
+        entry_pattern = re.compile(
+            re.escape(name) + r"_(" + source + r"_)?[0-9a-f]{16}"
+        )
+        for old in glob.glob(os.path.join(self.cache_dir, f"{name}_*")):
+            stem = os.path.splitext(old)[0]
+            if stem != cache_base and entry_pattern.fullmatch(os.path.basename(stem)):
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass  # Déjà supprimée par un autre processus
+
+        tmp_path = f"{cache_base}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_base + ".parquet")
+            return
+        except (ImportError, ValueError, TypeError, NotImplementedError) as e:
+            logging.info("Cache Parquet impossible pour %s (%s), repli pickle.", name, e)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_base + ".pkl")
 
     def get_output_path(self, filename: str) -> str:
         """Renvoie le chemin de sortie complet dans output/."""
@@ -0,0 +1,286 @@
+"""
+Mode surveillance : analyse résidente relancée quand les entrées changent.
+
+Le processus garde l'analyseur, ses matrices préparées (MatrixStore), les
+matrices lues (CacheLectures), le référentiel documentaire et les
+résultats de paires (RunManifest) d'une analyse à l'autre. Les fichiers
+d'entrée (configuration, classeurs, PPD) sont relevés par scrutation ;
+une modification stable relance l'analyse, qui ne recalcule que les
+paires dont les entrées ont changé. Une petite API HTTP locale permet de
+demander une analyse et de récupérer le dernier rapport consolidé.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from comp_sti_matrix.core.main import STIAnalyzer
+from comp_sti_matrix.core.matrix_store import CacheLectures, DEFAULT_MAX_BYTES
+from comp_sti_matrix.core.ppd import chemins_export
+from comp_sti_matrix.core.profiling import PROFILER
+
+DEFAULT_INTERVALLE = 2.0
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def etat_fichiers(chemins) -> dict:
+    """Taille et date de modification de chaque fichier existant (chemins absolus)."""
+    etat = {}
+    for chemin in chemins:
+        try:
+            stat = os.stat(chemin)
+        except OSError:
+            continue
+        etat[os.path.abspath(chemin)] = (stat.st_size, stat.st_mtime_ns)
+    return etat
+
+
+class Surveillance:
+    """
+    Analyse d'un jeu de données maintenue en mémoire.
+
+    `surveiller` lance une première analyse puis relève les fichiers toutes
+    les `intervalle` secondes ; une modification est prise en compte quand
+    deux relevés successifs concordent (classeur entièrement enregistré).
+    Les analyses ont toutes lieu dans le thread de `surveiller` ; `demander`
+    (API HTTP) ne fait que le réveiller, et `attendre` attend l'analyse qui
+    a pris en charge la demande.
+    """
+
+    def __init__(self, config_path: str, intervalle: float = DEFAULT_INTERVALLE, **options):
+        self.config_path = config_path
+        self.dataset_path = os.path.dirname(config_path)
+        self.intervalle = intervalle
+        self.options = options
+        self.lectures = CacheLectures(options.get("store_max_bytes", DEFAULT_MAX_BYTES))
+        self.analyseur = None
+        self.etat = {
+            "statut": "démarrage",
+            "analyses": 0,
+            "derniere_analyse": None,
+            "duree_s": None,
+            "modifications": [],
+            "bilan": None,
+            "erreur": None,
+        }
+        self._vus = {}
+        self._force = False
+        self._demandes = 0  # Numéro de la dernière demande reçue
+        self._servies = 0  # Dernière demande prise en charge par une analyse terminée
+        self._condition = threading.Condition()
+        self._reveil = threading.Event()
+        self._arret = threading.Event()
+
+    def fichiers(self) -> list[str]:
+        """
+        Fichiers surveillés : configuration, classeurs de excel_files/ et des
+        matrices, PPD source (section `ppd`) ou, à défaut, son export CSV.
+        """
+        chemins = {self.config_path}
+        excel_dir = os.path.join(self.dataset_path, "excel_files")
+        if os.path.isdir(excel_dir):
+            chemins.update(
+                entree.path for entree in os.scandir(excel_dir)
+                if entree.is_file() and not entree.name.startswith(("~$", "."))
+            )
+        config = {}
+        if self.analyseur is not None:
+            loader = self.analyseur.loader
+            config = loader.config
+            chemins.update(os.path.join(loader.excel_dir, m["file"]) for m in loader.matrices)
+        ppd = config.get("ppd") or {}
+        if ppd.get("file"):
+            # L'export est réécrit par l'analyse elle-même : seul le PPD source compte
+            chemins.add(os.path.join(self.dataset_path, ppd["file"]))
+        else:
+            chemins.add(chemins_export(self.dataset_path)["csv"])
+        return sorted(chemins)
+
+    def _oublier_matrices(self, modifies) -> None:
+        """Retire du cache mémoire les matrices dont le classeur a changé."""
+        loader = self.analyseur.loader
+        for entree in loader.matrices:
+            chemin = os.path.abspath(os.path.join(loader.excel_dir, entree["file"]))
+            if chemin in modifies:
+                logging.info("Classeur modifié, matrice %s à relire.", entree["name"])
+                self.analyseur.store.oublier(entree["name"])
+
+    def modifies(self) -> list[str]:
+        """Fichiers surveillés modifiés, ajoutés ou supprimés depuis la dernière analyse."""
+        actuel = etat_fichiers(self.fichiers())
+        return sorted(
+            chemin for chemin in actuel.keys() | self._vus.keys()
+            if actuel.get(chemin) != self._vus.get(chemin)
+        )
+
+    def analyser(self, force: bool = False) -> None:
+        """
+        Lance une analyse. L'analyseur est recréé si la configuration a
+        changé ; sinon seules les matrices des classeurs modifiés sont relues.
+        """
+        self.etat["statut"] = "analyse en cours"
+        debut = time.perf_counter()
+        try:
+            modifies = self.modifies()
+            if self.analyseur is None or os.path.abspath(self.config_path) in modifies:
+                self.analyseur = STIAnalyzer(
+                    self.config_path, lectures=self.lectures, **self.options
+                )
+            else:
+                self._oublier_matrices(modifies)
+            self._vus = etat_fichiers(self.fichiers())
+            self.analyseur.force = force or self.options.get("force", False)
+            self.etat["bilan"] = self.analyseur.run()
+            self.etat["erreur"] = None
+        except Exception as e:  # Le service reste actif : l'erreur est exposée par l'API
+            logging.exception("Échec de l'analyse de %s", self.config_path)
+            self.etat["erreur"] = str(e)
+            self._vus = etat_fichiers(self.fichiers())
+        finally:
+            PROFILER.extraire()
+            self.etat.update(
+                statut="en attente",
+                analyses=self.etat["analyses"] + 1,
+                derniere_analyse=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                duree_s=round(time.perf_counter() - debut, 3),
+            )
+        logging.info(
+            "Analyse n°%s terminée en %s s.", self.etat["analyses"], self.etat["duree_s"]
+        )
+
+    def demander(self, force: bool = False) -> int:
+        """
+        Demande une analyse au thread de surveillance (dès que possible) et
+        renvoie le numéro de la demande (voir `attendre`).
+        """
+        with self._condition:
+            self._demandes += 1
+            self._force = self._force or force
+            self._reveil.set()
+            return self._demandes
+
+    def attendre(self, demande: int) -> None:
+        """
+        Attend la fin d'une analyse lancée après la demande n° `demande` (et
+        non celle d'une analyse déjà en cours à sa réception), ou l'arrêt.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._servies >= demande or self._arret.is_set()
+            )
+
+    def arreter(self) -> None:
+        """Termine `surveiller` après l'analyse en cours."""
+        self._arret.set()
+        self._reveil.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def surveiller(self) -> None:
+        """Première analyse, puis une analyse par modification stable ou demande."""
+        self.analyser()
+        candidat = None
+        while not self._arret.is_set():
+            self._reveil.wait(self.intervalle)
+            if self._arret.is_set():
+                break
+            if self._reveil.is_set():
+                with self._condition:
+                    self._reveil.clear()
+                    force, self._force = self._force, False
+                    prises = self._demandes  # Demandes servies par cette analyse
+                self.etat["modifications"] = self.modifies()
+                self.analyser(force=force)
+                with self._condition:
+                    self._servies = prises
+                    self._condition.notify_all()
+                candidat = None
+                continue
+
+            actuel = etat_fichiers(self.fichiers())
+            if actuel == self._vus:
+                candidat = None
+                continue
+            if actuel != candidat:
+                candidat = actuel  # Enregistrement peut-être en cours : on attend
+                continue
+            self.etat["modifications"] = self.modifies()
+            logging.info("Modifications détectées : %s", self.etat["modifications"])
+            self.analyser()
+            candidat = None
+
+
+class GestionnaireAPI(BaseHTTPRequestHandler):
+    """
+    API locale du mode surveillance :
+
+    - GET /status : état du service et bilan de la dernière analyse ;
+    - GET /report : dernier rapport consolidé (JSON, une ligne par divergence) ;
+    - GET /report.xlsx : classeur analyse_doc_consolidee.xlsx ;
+    - POST /run[?force=1][&wait=1] : demande une analyse (et attend sa fin).
+    """
+
+    def do_GET(self):
+        surveillance = self.server.surveillance
+        chemin = urlparse(self.path).path
+        if chemin == "/status":
+            self._repondre(200, json.dumps(surveillance.etat, ensure_ascii=False, default=str))
+        elif chemin == "/report":
+            analyseur = surveillance.analyseur
+            df = analyseur.df_consolidated if analyseur is not None else None
+            corps = "[]" if df is None else df.to_json(orient="records", force_ascii=False)
+            self._repondre(200, corps)
+        elif chemin == "/report.xlsx":
+            analyseur = surveillance.analyseur
+            if analyseur is None or not os.path.exists(analyseur.output_file):
+                self._repondre(404, json.dumps({"erreur": "Aucun rapport consolidé."}))
+                return
+            with open(analyseur.output_file, "rb") as f:
+                contenu = f.read()
+            self._repondre(
+                200,
+                contenu,
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+        else:
+            self._repondre(404, json.dumps({"erreur": f"Route inconnue : {chemin}"}))
+
+    def do_POST(self):
+        surveillance = self.server.surveillance
+        url = urlparse(self.path)
+        if url.path != "/run":
+            self._repondre(404, json.dumps({"erreur": f"Route inconnue : {url.path}"}))
+            return
+        params = parse_qs(url.query)
+        oui = ("1", "true", "yes")
+        demande = surveillance.demander(force=params.get("force", ["0"])[0] in oui)
+        if params.get("wait", ["0"])[0] not in oui:
+            self._repondre(202, json.dumps({"statut": "analyse demandée"}, ensure_ascii=False))
+            return
+        surveillance.attendre(demande)
+        self._repondre(200, json.dumps(surveillance.etat, ensure_ascii=False, default=str))
+
+    def _repondre(self, code: int, corps, type_contenu: str = "application/json; charset=utf-8"):
+        if isinstance(corps, str):
+            corps = corps.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, format, *args):
+        logging.info("API %s - %s", self.address_string(), format % args)
+
+
+def creer_serveur(surveillance: Surveillance, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Serveur HTTP de l'API (à lancer avec `serve_forever` dans un thread)."""
+    serveur = ThreadingHTTPServer((host, port), GestionnaireAPI)
+    serveur.daemon_threads = True
+    serveur.surveillance = surveillance
+    return serveur
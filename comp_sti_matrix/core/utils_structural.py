@@ -7,15 +7,22 @@ import logging
 from collections import defaultdict
 from pathlib import Path
 from itertools import combinations, chain
-from functools import partial
 import re
 from typing import Optional
+import numpy as np
 import pandas as pd
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
-from comp_sti_matrix.core.sti_loader import STILoader
-
-KEY_COLS = ["Reference", "Requirement"]
+from comp_sti_matrix.core.sti_loader import STILoader, KEY_COLS
+from comp_sti_matrix.core.doc_index import DocumentIndex
+from comp_sti_matrix.core.alignement import aligner_exclusifs
+from comp_sti_matrix.core.empreintes import (
+    EMPREINTE_LIGNE,
+    a_empreintes,
+    ajouter_empreintes,
+    colonne_empreinte,
+)
+from comp_sti_matrix.core.profiling import PROFILER
 
 # Configuration de base du logger
 logging.basicConfig(
@@ -58,18 +65,71 @@ def nettoyer_colonnes(df):
     return df
 
 
-def separer_requis(df):
-    """Separe les requis"""
+# Valeurs de la colonne isRequirement désignant un requis (casse et espaces ignorés)
+VALEURS_REQUISES = ["true", "vrai", "1", "yes", "requis"]
+
+
+def separer_requis(df, copier=True):
+    """
+    Separe les requis.
+
+    Sans `copier`, les requis sont une sélection de `df` (pas de copie
+    supplémentaire) et le DataFrame des non-requis, inutilisé par la
+    comparaison, n'est pas construit.
+    """
     if "isRequirement" not in df.columns:
-        return df.copy(), pd.DataFrame()  # Tout est pris comme requis par défaut
+        # Tout est pris comme requis par défaut
+        return (df.copy() if copier else df), pd.DataFrame()
 
-    valeurs_requises = ["true", "vrai", "1", "yes", "requis"]
     masque_requis = (
-        df["isRequirement"].astype(str).str.strip().str.lower().isin(valeurs_requises)
+        df["isRequirement"].astype(str).str.strip().str.lower().isin(VALEURS_REQUISES)
     )
+    if not copier:
+        return df[masque_requis], pd.DataFrame()
     return df[masque_requis].copy(), df[~masque_requis].copy()
 
 
+def dtype_texte_compact():
+    """
+    Dtype texte adossé à Arrow, avec NaN comme valeur manquante (mêmes
+    sorties que les colonnes object), ou None si pyarrow est absent.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except (TypeError, ValueError, ImportError):
+        pass
+    try:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 / 2.2
+    except (TypeError, ValueError, ImportError):
+        return None
+
+
+def compacter_matrice(df, categorielles=("isRequirement",), seuil_repetition=0.5):
+    """
+    Réduit l'empreinte mémoire d'une matrice sans changer ses valeurs.
+
+    Les colonnes `categorielles`, et les colonnes texte dont la proportion
+    de valeurs distinctes ne dépasse pas `seuil_repetition`, passent en
+    `category` ; les autres colonnes texte en chaînes Arrow. Les colonnes
+    clés sont laissées telles quelles (jointures et factorisation).
+    """
+    dtype_texte = dtype_texte_compact()
+    colonnes = {}
+    for col in df.columns:
+        serie = df[col]
+        if col in KEY_COLS or isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.infer_dtype(serie, skipna=True) not in ("string", "empty"):
+            continue
+        if col in categorielles or (
+            len(serie) and serie.nunique(dropna=False) <= seuil_repetition * len(serie)
+        ):
+            colonnes[col] = serie.astype("category")
+        elif dtype_texte is not None and serie.dtype != dtype_texte:
+            colonnes[col] = serie.astype(dtype_texte)
+    return df.assign(**colonnes) if colonnes else df
+
+
 def deduplicate_and_sort(func):
     """Decorateur utilisé."""
 
@@ -80,6 +140,17 @@ def deduplicate_and_sort(func):
     return wrapper
 
 
+# pattern = r"(?:DID|CMD|PM|SETC)[0-9]{6,}(?:[-_][A-Z0-9\.]+)*"
+DOC_PATTERN = re.compile(r"(?:DID[0-9]{10}|CMD[0-9]{6,}|PM[0-9]{6,}|SETC[0-9]{6,})")
+
+# Champs dont les identifiants documentaires sont comparés
+CHAMPS_DOCUMENTAIRES = ["CAF_Comments", "MOP_design", "MOP_test"]
+
+# Documents déjà extraits, par texte de cellule (partagé entre colonnes et paires)
+_DOCS_MEMO = {}
+DOCS_MEMO_MAX = 200_000
+
+
 @deduplicate_and_sort
 def extract_documents(text):
     """
@@ -88,15 +159,48 @@ def extract_documents(text):
     """
     if not isinstance(text, str):
         return []
-    # pattern = r"(?:DID|CMD|PM|SETC)[0-9]{6,}(?:[-_][A-Z0-9\.]+)*"
-    pattern = r"(?:DID[0-9]{10}|CMD[0-9]{6,}|PM[0-9]{6,}|SETC[0-9]{6,})"
-    return re.findall(pattern, text)
+    return DOC_PATTERN.findall(text)
+
+
+def extract_documents_series(serie: pd.Series) -> pd.Series:
+    """
+    Version colonne de `extract_documents` : renvoie, pour chaque cellule,
+    la liste triée et dédoublonnée des identifiants documentaires.
+
+    Chaque texte distinct n'est analysé qu'une fois (les colonnes
+    CAF_Comments / MOP répètent souvent le même texte) ; les nouveaux textes
+    passent par `str.findall` avec le motif précompilé. Les listes renvoyées
+    sont partagées entre cellules identiques et ne doivent pas être modifiées.
+    """
+    valeurs = serie.to_numpy(dtype=object)
+    textes = pd.unique(
+        np.fromiter((v for v in valeurs if isinstance(v, str)), dtype=object)
+    )
+    nouveaux = [t for t in textes if t not in _DOCS_MEMO]
+    if len(_DOCS_MEMO) + len(nouveaux) > DOCS_MEMO_MAX:
+        _DOCS_MEMO.clear()
+        nouveaux = list(textes)
+    if nouveaux:
+        trouves = pd.Series(nouveaux, dtype=object).str.findall(DOC_PATTERN)
+        _DOCS_MEMO.update(zip(nouveaux, (sorted(set(docs)) for docs in trouves)))
+
+    vide = []
+    return pd.Series(
+        [_DOCS_MEMO[v] if isinstance(v, str) else vide for v in valeurs],
+        index=serie.index,
+        dtype=object,
+    )
 
 
 def comparer_row(row, sources):
     """Comparaison avec affichage synthétique."""
-    set_1 = set(row["Docs_1"])
-    set_2 = set(row["Docs_2"])
+    return comparer_documents(row["Docs_1"], row["Docs_2"], sources)
+
+
+def comparer_documents(docs_1, docs_2, sources):
+    """Renvoie (Différence, État) pour deux listes de documents."""
+    set_1 = set(docs_1)
+    set_2 = set(docs_2)
 
     communs = set_1 & set_2
     only_1 = set_1 - communs
@@ -121,6 +225,23 @@ def comparer_row(row, sources):
     return "\n".join(bloc), statut
 
 
+def classer_divergences(docs_1: pd.Series, docs_2: pd.Series, sources):
+    """
+    Version colonne de `comparer_row` : renvoie les tableaux (Différence, État).
+
+    Les couples (docs_1, docs_2) sont factorisés : la comparaison et le texte
+    formaté ne sont calculés qu'une fois par couple distinct.
+    """
+    couples = pd.Series(
+        list(zip(map(tuple, docs_1), map(tuple, docs_2))), index=docs_1.index, dtype=object
+    )
+    codes, distincts = pd.factorize(couples)
+    classes = [comparer_documents(d1, d2, sources) for d1, d2 in distincts]
+    differences = np.array([c[0] for c in classes], dtype=object)
+    etats = np.array([c[1] for c in classes], dtype=object)
+    return differences[codes], etats[codes]
+
+
 def extract_unique_documents(df: pd.DataFrame, col: str) -> set[str]:
     """
     Aplatie une colonne contenant des listes de documents et renvoie un ensemble unique.
@@ -144,48 +265,87 @@ def analyser_divergences_documentaires(df, source_cols):
     Retourne un DataFrame regroupé par (Reference, Champ) avec documents
     extraits et divergences.
     """
+    with PROFILER.stage("extraction_documents", rows=len(df)):
+        return _analyser_divergences_documentaires(df, source_cols)
+
+
+def _analyser_divergences_documentaires(df, source_cols):
+    """Corps de `analyser_divergences_documentaires`."""
+    df_divergences, set1, set2 = lignes_divergences_documentaires(df, source_cols)
+    if df_divergences is None:
+        logging.info("Aucune divergence documentaire détectée.")
+        return pd.DataFrame(), set(), set()
+    return regrouper_divergences(df_divergences), set1, set2
+
+
+def lignes_divergences_documentaires(df, source_cols):
+    """
+    Divergences documentaires ligne à ligne (Reference, Champ, Différence,
+    État) et documents cités de part et d'autre, avant regroupement.
+
+    Renvoie (None, set(), set()) si aucune ligne ne cite de document.
+    """
     source_1, source_2 = source_cols
-    champs_cibles = ["CAF_Comments", "MOP_design", "MOP_test"]
-    df_docs = df[df["Champ"].isin(champs_cibles)].copy()
+    # Seules les colonnes utiles à l'analyse sont reprises (pas de copie complète)
+    df_docs = df.loc[
+        df["Champ"].isin(CHAMPS_DOCUMENTAIRES), ["Reference", "Champ", source_1, source_2]
+    ]
 
     # Extraction
-    df_docs["Docs_1"] = df_docs[source_1].apply(extract_documents)
-    df_docs["Docs_2"] = df_docs[source_2].apply(extract_documents)
+    df_docs = df_docs.assign(
+        Docs_1=extract_documents_series(df_docs[source_1]),
+        Docs_2=extract_documents_series(df_docs[source_2]),
+    )
 
     # 🔍 Supprimer les lignes sans documents de part et d’autre
     df_docs = df_docs[
         ~((df_docs["Docs_1"].str.len() == 0) & (df_docs["Docs_2"].str.len() == 0))
     ]
     if df_docs.empty:
-        logging.info("Aucune divergence documentaire détectée.")
-        return pd.DataFrame()
+        return None, set(), set()
 
     sources = [i.split("_")[0] for i in source_cols]
 
-    # Définir une version partielle de la fonction avec `sources` fixé
-    comparer_row_with_sources = partial(comparer_row, sources=sources)
-
-    df_docs[["Différence", "État"]] = df_docs.apply(
-        comparer_row_with_sources, axis=1, result_type="expand"
-    )
+    differences, etats = classer_divergences(df_docs["Docs_1"], df_docs["Docs_2"], sources)
+    df_docs = df_docs.assign(Différence=differences, État=etats)
 
     # On garde uniquement les lignes divergentes
-    df_divergences = df_docs[df_docs["État"] != "Identiques"].copy()
-
-    # Regroupement par triplet pour affichage consolidé
-    regrouped = (
-        df_divergences.groupby(["Champ", "État", "Différence"])["Reference"]
-        .apply(list)
-        .reset_index()
-    )
-
-    regrouped["nb_references"] = regrouped["Reference"].apply(len)
-    regrouped = regrouped.sort_values(by="nb_references", ascending=False)
+    df_divergences = df_docs[df_docs["État"] != "Identiques"]
 
     set1 = extract_unique_documents(df_docs, "Docs_1")
     set2 = extract_unique_documents(df_docs, "Docs_2")
 
-    return regrouped, set1, set2
+    return df_divergences, set1, set2
+
+
+def regrouper_divergences(df_divergences):
+    """Regroupement par triplet (Champ, État, Différence) pour affichage consolidé."""
+    regrouped = regrouper_references(df_divergences, ["Champ", "État", "Différence"])
+    return regrouped.sort_values(by="nb_references", ascending=False)
+
+
+def regrouper_references(df: pd.DataFrame, cles: list, distinctes: bool = False) -> pd.DataFrame:
+    """
+    Regroupe la colonne 'Reference' par `cles`, en une seule passe.
+
+    Renvoie un DataFrame (cles..., Reference, nb_references) trié par clés,
+    comme `groupby(cles)`. 'Reference' y est la liste des références du
+    groupe dans l'ordre des lignes ou, avec `distinctes`, le tuple de leur
+    set (nb_references compte alors les références distinctes).
+    """
+    if distinctes:
+        df = df.drop_duplicates(subset=cles + ["Reference"])
+    groupes = df.groupby(cles)
+    regroupees = groupes.size().reset_index(name="nb_references")
+
+    contenus = [[] for _ in range(len(regroupees))]
+    for code, ref in zip(groupes.ngroup().to_numpy(), df["Reference"].to_numpy(dtype=object)):
+        if code >= 0:  # -1 : clé manquante, ignorée par groupby
+            contenus[code].append(ref)
+    if distinctes:
+        contenus = [tuple(set(refs)) for refs in contenus]
+    regroupees.insert(len(cles), "Reference", pd.Series(contenus, dtype=object))
+    return regroupees
 
 
 def normalize(df, key_cols):
@@ -206,16 +366,101 @@ def exclusive_rows(i, sets_all):
     return sets_all[i] - other
 
 
-def compute_sets_summary(sets_all, labels, key_cols):
-    """Calcule le résumé."""
-    summary = {f"Total entries in {lbl}": len(s) for lbl, s in zip(labels, sets_all)}
-    common_keys = set.intersection(*sets_all)
-    summary["Common entries in all matrices"] = len(common_keys)
-    common_df = pd.DataFrame(common_keys, columns=key_cols)
+class CodesCles:
+    """
+    Clés de plusieurs matrices encodées dans un espace d'entiers commun.
+
+    Chaque colonne clé est factorisée une fois sur l'ensemble des matrices,
+    puis les codes de colonnes sont combinés en un entier int64 par clé.
+    Les ensembles de clés deviennent des tableaux triés d'entiers : union,
+    intersection et exclusivités se calculent en opérations vectorisées,
+    et les clés ne sont redécodées en texte que pour les tables exportées.
+    Les lignes dont une colonne clé est vide sont ignorées (comme `keyset`).
+    """
+
+    def __init__(self, dfs, key_cols):
+        self.key_cols = list(key_cols)
+        tailles = [len(df) for df in dfs]
+        codes_colonnes, self.uniques = [], []
+        for col in self.key_cols:
+            valeurs = pd.concat([df[col] for df in dfs], ignore_index=True)
+            codes, uniques = pd.factorize(valeurs)
+            codes_colonnes.append(codes)
+            self.uniques.append(np.asarray(uniques, dtype=object))
+
+        self.dims = tuple(max(len(u), 1) for u in self.uniques)
+        valides = np.all(np.column_stack(codes_colonnes) >= 0, axis=1)
+        if np.prod(self.dims, dtype=float) < 2**62:
+            codes = np.ravel_multi_index(
+                [np.where(valides, c, 0) for c in codes_colonnes], self.dims
+            ).astype(np.int64)
+            self._combinaisons = None
+        else:
+            # Espace trop grand pour un produit mixte : on factorise les n-uplets
+            codes, combinaisons = pd.MultiIndex.from_arrays(codes_colonnes).factorize()
+            codes = codes.astype(np.int64)
+            self._combinaisons = combinaisons
+        self.taille_espace = (
+            int(np.prod(self.dims)) if self._combinaisons is None else len(self._combinaisons)
+        )
+
+        bornes = np.cumsum([0] + tailles)
+        self.par_matrice = [
+            np.unique(codes[debut:fin][valides[debut:fin]])
+            for debut, fin in zip(bornes[:-1], bornes[1:])
+        ]
+        # Nombre de matrices contenant chaque code présent (tableau creux :
+        # l'espace des codes peut être bien plus grand que le nombre de clés)
+        self.codes_presents, self.occurrences = np.unique(
+            np.concatenate(self.par_matrice + [np.empty(0, dtype=np.int64)]),
+            return_counts=True,
+        )
+
+    def __len__(self) -> int:
+        return len(self.par_matrice)
+
+    def communs(self):
+        """Codes présents dans toutes les matrices (triés)."""
+        return self.codes_presents[self.occurrences == len(self.par_matrice)]
+
+    def exclusifs(self, i: int):
+        """Codes présents uniquement dans la matrice `i` (triés)."""
+        codes = self.par_matrice[i]
+        positions = np.searchsorted(self.codes_presents, codes)
+        return codes[self.occurrences[positions] == 1]
+
+    def decoder(self, codes) -> pd.DataFrame:
+        """Reconstruit les colonnes clés (texte) des codes donnés."""
+        if self._combinaisons is None:
+            par_colonne = np.unravel_index(codes, self.dims)
+        else:
+            sous_index = self._combinaisons[codes]
+            par_colonne = [sous_index.get_level_values(k) for k in range(len(self.key_cols))]
+        return pd.DataFrame(
+            {
+                col: uniques[np.asarray(idx, dtype=np.int64)]
+                for col, uniques, idx in zip(self.key_cols, self.uniques, par_colonne)
+            }
+        )
+
+
+def compute_sets_summary(cles, labels, key_cols):
+    """
+    Calcule le résumé.
+
+    Args:
+        cles (CodesCles): Clés encodées des matrices, dans l'ordre de `labels`.
+    """
+    summary = {
+        f"Total entries in {lbl}": len(codes)
+        for lbl, codes in zip(labels, cles.par_matrice)
+    }
+    common_codes = cles.communs()
+    summary["Common entries in all matrices"] = len(common_codes)
+    common_df = cles.decoder(common_codes)[key_cols]
 
     exclusive = {
-        lbl: pd.DataFrame(list(exclusive_rows(i, sets_all)), columns=key_cols)
-        for i, lbl in enumerate(labels)
+        lbl: cles.decoder(cles.exclusifs(i))[key_cols] for i, lbl in enumerate(labels)
     }
 
     for lbl in labels:
@@ -224,20 +469,304 @@ def compute_sets_summary(sets_all, labels, key_cols):
     return summary, exclusive, common_df
 
 
-def compute_field_diffs(cleaned, key_cols, labels, fields_to_compare):
-    """Calcule les différences."""
-    df1 = cleaned[0].set_index(key_cols)
-    df2 = cleaned[1].set_index(key_cols)
-    rows = []
-    for idx in df1.index.intersection(df2.index):
-        for col in fields_to_compare:
-            val1 = str(df1.at[idx, col]) if col in df1.columns else ""
-            val2 = str(df2.at[idx, col]) if col in df2.columns else ""
-            if val1 != val2:
-                row = dict(zip(key_cols, idx))
-                row.update({"Champ": col, labels[0]: val1, labels[1]: val2})
-                rows.append(row)
-    return pd.DataFrame(rows)
+def colonnes_alignees(key_cols, label):
+    """Colonnes des clés de la matrice `label` dans la table des appariements."""
+    return [f"{col} ({label})" for col in key_cols]
+
+
+def aligner_exclusifs_paire(exclusive, labels, key_cols, alignement):
+    """
+    Apparie les clés exclusives de deux matrices dont l'exigence est
+    presque identique (voir core/alignement.py).
+
+    Returns:
+        tuple: (table des appariements, clés exclusives restantes). La table
+        a les clés de la première matrice, celles de la seconde
+        (`colonnes_alignees`) et la colonne 'Similarité'.
+    """
+    gauche, droite = exclusive[labels[0]], exclusive[labels[1]]
+    couples = aligner_exclusifs(
+        gauche, droite, colonne_texte=key_cols[-1], colonne_bloc=key_cols[0], **alignement
+    )
+    g = couples["gauche"].to_numpy(dtype=np.int64)
+    d = couples["droite"].to_numpy(dtype=np.int64)
+
+    table = pd.DataFrame(
+        {
+            **{col: gauche[col].to_numpy(dtype=object)[g] for col in key_cols},
+            **{
+                nom: droite[col].to_numpy(dtype=object)[d]
+                for col, nom in zip(key_cols, colonnes_alignees(key_cols, labels[1]))
+            },
+            "Similarité": couples["Similarité"].to_numpy(dtype=float).round(3),
+        }
+    )
+    restants = {
+        labels[0]: gauche.drop(index=gauche.index[g]),
+        labels[1]: droite.drop(index=droite.index[d]),
+    }
+    return table, restants
+
+
+def remplacer_cles(df, alignes, key_cols, label):
+    """
+    Remplace les clés de `df` (matrice `label`) appariées dans `alignes`
+    par celles de la première matrice, pour que la jointure les compare.
+    """
+    sources = colonnes_alignees(key_cols, label)
+    table = alignes[sources + key_cols].set_axis(
+        key_cols + [f"__{col}" for col in key_cols], axis=1
+    )
+    fusion = df[key_cols].astype(object).merge(table, on=key_cols, how="left")
+    return df.assign(
+        **{
+            col: fusion[f"__{col}"].where(fusion[f"__{col}"].notna(), fusion[col]).to_numpy()
+            for col in key_cols
+        }
+    )
+
+
+def dedoublonner_cles(df, key_cols, label=""):
+    """
+    Ne garde que la première occurrence de chaque clé.
+
+    Une clé dupliquée rendrait la comparaison ambiguë (plusieurs valeurs
+    pour un même champ) : on le signale explicitement dans le log.
+    """
+    doublons = df.duplicated(subset=key_cols, keep="first")
+    nb_doublons = int(doublons.sum())
+    if nb_doublons:
+        logging.warning(
+            " %s clé(s) dupliquée(s) dans %s : seule la première occurrence est comparée.",
+            nb_doublons,
+            label,
+        )
+        return df[~doublons]
+    return df
+
+
+def valeurs_texte(serie):
+    """Convertit une colonne en texte comme `str()` le ferait cellule par cellule."""
+    return serie.astype(object).map(str).to_numpy(dtype=object)
+
+
+def compute_field_diffs(cleaned, key_cols, labels, fields_to_compare, alignes=None):
+    """
+    Calcule les différences.
+
+    Jointure interne sur les clés, comparaison colonne par colonne des valeurs
+    converties en texte, puis mise au format long (une ligne par clé et Champ
+    divergent, dans l'ordre des clés de la première matrice puis des champs).
+    Les lignes appariées par `alignes` (voir `aligner_exclusifs_paire`) sont
+    comparées sous les clés de la première matrice.
+
+    Si les deux matrices portent les empreintes des champs (core/empreintes.py),
+    seules les clés d'empreintes de ligne différentes sont examinées, et seuls
+    leurs champs d'empreintes différentes sont relus en texte.
+    """
+    if alignes is not None and not alignes.empty:
+        cleaned = [cleaned[0], remplacer_cles(cleaned[1], alignes, key_cols, labels[1])]
+    fields = list(fields_to_compare or [])
+    if fields and all(a_empreintes(df, fields) for df in cleaned):
+        return _diffs_par_empreintes(cleaned, key_cols, labels, fields)
+    gauche = [f"__g{i}" for i in range(len(fields))]
+    droite = [f"__d{i}" for i in range(len(fields))]
+
+    def projeter(df, noms, label):
+        df = dedoublonner_cles(df, key_cols, label)
+        present = {nom: df[col] for col, nom in zip(fields, noms) if col in df.columns}
+        return pd.DataFrame({**{col: df[col] for col in key_cols}, **present})
+
+    merged = projeter(cleaned[0], gauche, labels[0]).merge(
+        projeter(cleaned[1], droite, labels[1]), on=key_cols, how="inner", sort=False
+    )
+    if merged.empty or not fields:
+        return pd.DataFrame()
+
+    vide = np.full(len(merged), "", dtype=object)
+    val1 = np.column_stack(
+        [valeurs_texte(merged[c]) if c in merged.columns else vide for c in gauche]
+    )
+    val2 = np.column_stack(
+        [valeurs_texte(merged[c]) if c in merged.columns else vide for c in droite]
+    )
+    lignes, champs = np.nonzero(val1 != val2)
+    if len(lignes) == 0:
+        return pd.DataFrame()
+
+    diffs = {col: merged[col].to_numpy(dtype=object)[lignes] for col in key_cols}
+    diffs["Champ"] = np.asarray(fields, dtype=object)[champs]
+    diffs[labels[0]] = val1[lignes, champs]
+    diffs[labels[1]] = val2[lignes, champs]
+    return pd.DataFrame(diffs)
+
+
+def _diffs_par_empreintes(cleaned, key_cols, labels, fields):
+    """`compute_field_diffs` sur les empreintes de contenu (mêmes résultats)."""
+    empreintes = [EMPREINTE_LIGNE] + [colonne_empreinte(champ) for champ in fields]
+    dfs = [
+        dedoublonner_cles(df, key_cols, label) for df, label in zip(cleaned, labels)
+    ]
+
+    def projeter(df, suffixe):
+        cols = {col: df[col] for col in key_cols}
+        cols.update({f"{col}{suffixe}": df[col].to_numpy() for col in empreintes})
+        cols[f"__pos{suffixe}"] = np.arange(len(df))
+        return pd.DataFrame(cols)
+
+    merged = projeter(dfs[0], "_g").merge(
+        projeter(dfs[1], "_d"), on=key_cols, how="inner", sort=False
+    )
+    modifiees = np.flatnonzero(
+        merged[f"{EMPREINTE_LIGNE}_g"].to_numpy() != merged[f"{EMPREINTE_LIGNE}_d"].to_numpy()
+    )
+    if len(modifiees) == 0:
+        return pd.DataFrame()
+
+    h1 = np.column_stack(
+        [merged[f"{col}_g"].to_numpy()[modifiees] for col in empreintes[1:]]
+    )
+    h2 = np.column_stack(
+        [merged[f"{col}_d"].to_numpy()[modifiees] for col in empreintes[1:]]
+    )
+    sous_lignes, champs = np.nonzero(h1 != h2)
+    if len(sous_lignes) == 0:
+        return pd.DataFrame()
+    lignes = modifiees[sous_lignes]
+
+    # Texte des seules cellules divergentes, lu champ par champ
+    valeurs = []
+    for df, suffixe in zip(dfs, ("_g", "_d")):
+        positions = merged[f"__pos{suffixe}"].to_numpy()[lignes]
+        colonne = np.full(len(lignes), "", dtype=object)
+        for j, champ in enumerate(fields):
+            masque = champs == j
+            if masque.any() and champ in df.columns:
+                colonne[masque] = valeurs_texte(df[champ].iloc[positions[masque]])
+        valeurs.append(colonne)
+
+    diffs = {col: merged[col].to_numpy(dtype=object)[lignes] for col in key_cols}
+    diffs["Champ"] = np.asarray(fields, dtype=object)[champs]
+    diffs[labels[0]] = valeurs[0]
+    diffs[labels[1]] = valeurs[1]
+    return pd.DataFrame(diffs)
+
+
+class ComparaisonMulti:
+    """
+    Comparaison champ à champ de N matrices alignées une seule fois sur la clé.
+
+    Pour chaque (clé, champ), indique quelles familles concordent et
+    lesquelles divergent (`diffs`). Les vues deux à deux historiques
+    (`compute_field_diffs`) se déduisent de ce résultat sans nouvelle
+    jointure via `vue_paire`.
+    """
+
+    def __init__(self, cleaned, key_cols, labels, fields_to_compare):
+        self.key_cols = list(key_cols)
+        self.labels = list(labels)
+        self.fields = list(fields_to_compare or [])
+
+        # Alignement : union des clés, une position de ligne par matrice
+        aligned = None
+        for i, (df, label) in enumerate(zip(cleaned, self.labels)):
+            df = dedoublonner_cles(df, self.key_cols, label)
+            part = pd.DataFrame({col: df[col] for col in self.key_cols})
+            part[f"__pos{i}"] = np.arange(len(df), dtype=float)
+            for j, col in enumerate(self.fields):
+                if col in df.columns:
+                    part[f"__v{i}_{j}"] = valeurs_texte(df[col])
+            aligned = (
+                part if aligned is None
+                else aligned.merge(part, on=self.key_cols, how="outer", sort=False)
+            )
+
+        self.keys = {col: aligned[col].to_numpy(dtype=object) for col in self.key_cols}
+        n_keys = len(aligned)
+        # Position de la ligne dans chaque matrice (NaN si la clé y est absente)
+        self.positions = np.column_stack(
+            [aligned[f"__pos{i}"].to_numpy() for i in range(len(self.labels))]
+        ) if n_keys else np.empty((0, len(self.labels)))
+        self.present = ~np.isnan(self.positions)
+
+        # Valeurs texte : (matrice, clé, champ) ; "" si le champ est absent
+        self.values = np.full((len(self.labels), n_keys, len(self.fields)), "", dtype=object)
+        for i in range(len(self.labels)):
+            for j in range(len(self.fields)):
+                col = f"__v{i}_{j}"
+                if col in aligned.columns:
+                    self.values[i, :, j] = aligned[col].to_numpy(dtype=object)
+
+        self._diffs = None
+
+    def masque_paire(self, i: int, k: int):
+        """Masque (clé, champ) des divergences entre les matrices i et k."""
+        presentes = (self.present[:, i] & self.present[:, k])[:, None]
+        return presentes & (self.values[i] != self.values[k])
+
+    def vue_paire(self, label_a: str, label_b: str) -> pd.DataFrame:
+        """
+        Renvoie les divergences entre deux matrices, à l'identique de
+        `compute_field_diffs` (ordre des clés de `label_a`, puis des champs).
+        """
+        i, k = self.labels.index(label_a), self.labels.index(label_b)
+        masque = self.masque_paire(i, k)
+        lignes = np.flatnonzero(masque.any(axis=1))
+        if len(lignes) == 0:
+            return pd.DataFrame()
+        lignes = lignes[np.argsort(self.positions[lignes, i], kind="stable")]
+        sous_lignes, champs = np.nonzero(masque[lignes])
+        lignes = lignes[sous_lignes]
+
+        vue = {col: self.keys[col][lignes] for col in self.key_cols}
+        vue["Champ"] = np.asarray(self.fields, dtype=object)[champs]
+        vue[label_a] = self.values[i][lignes, champs]
+        vue[label_b] = self.values[k][lignes, champs]
+        return pd.DataFrame(vue)
+
+    @property
+    def diffs(self) -> pd.DataFrame:
+        """
+        Format long : une ligne par (clé, champ) où au moins deux matrices
+        présentes divergent. Une colonne par matrice (vide si la clé en est
+        absente) et une colonne 'Accord' listant les groupes de matrices de
+        même valeur, séparés par ' | '.
+        """
+        if self._diffs is not None:
+            return self._diffs
+
+        n = len(self.labels)
+        divergent = np.zeros(self.values.shape[1:], dtype=bool)
+        for i, k in combinations(range(n), 2):
+            divergent |= self.masque_paire(i, k)
+        lignes, champs = np.nonzero(divergent)
+        if len(lignes) == 0:
+            self._diffs = pd.DataFrame()
+            return self._diffs
+
+        diffs = {col: self.keys[col][lignes] for col in self.key_cols}
+        diffs["Champ"] = np.asarray(self.fields, dtype=object)[champs]
+        for i, label in enumerate(self.labels):
+            colonne = self.values[i][lignes, champs]
+            colonne[~self.present[lignes, i]] = None
+            diffs[label] = colonne
+
+        accords = []
+        for ligne, champ in zip(lignes, champs):
+            groupes = {}
+            for i, label in enumerate(self.labels):
+                if self.present[ligne, i]:
+                    groupes.setdefault(self.values[i][ligne, champ], []).append(label)
+            accords.append(" | ".join(", ".join(g) for g in groupes.values()))
+        diffs["Accord"] = accords
+
+        self._diffs = pd.DataFrame(diffs)
+        return self._diffs
+
+
+def compute_field_diffs_multi(cleaned, key_cols, labels, fields_to_compare):
+    """Calcule les différences entre N matrices (voir ComparaisonMulti)."""
+    return ComparaisonMulti(cleaned, key_cols, labels, fields_to_compare)
 
 
 def compare_matrix_entries_multi(
@@ -246,6 +775,7 @@ def compare_matrix_entries_multi(
     key_cols: Optional[list[str]] = None,
     compare_fields: Optional[bool] = False,
     fields_to_compare: Optional[list[str]] = None,
+    alignement: Optional[dict] = None,
 ):
     """
     Compare plusieurs matrices en détectant les lignes communes + divergences champ à champ.
@@ -256,12 +786,18 @@ def compare_matrix_entries_multi(
         key_cols (list of str): Colonnes servant de clé.
         compare_fields (bool): Si True, compare les champs (colonne par colonne).
         fields_to_compare (list[str]): Colonnes à comparer si champ à champ.
+        alignement (dict): Options de `aligner_exclusifs` ; si fourni (deux
+            matrices), les exclusives presque identiques sont appariées et
+            comparées champ à champ comme des lignes communes.
 
     Returns:
         summary (dict): Statistiques.
         exclusive_dfs (dict[str, pd.DataFrame]): Lignes propres à chaque source.
-        common_all_df (pd.DataFrame): Lignes strictement communes sur les clés.
-        diffs (pd.DataFrame | None): Divergences champ à champ (si activé).
+        common_all_df (pd.DataFrame): Lignes strictement communes sur les clés,
+            suivies des appariements approchés (clés de la seconde matrice et
+            'Similarité' en colonnes supplémentaires).
+        diffs (pd.DataFrame | None): Divergences champ à champ (si activé) ;
+            au-delà de deux matrices, format N-way de `ComparaisonMulti.diffs`.
     """
     if key_cols is None:
         key_cols = list(KEY_COLS)
@@ -270,64 +806,167 @@ def compare_matrix_entries_multi(
     if len(dfs) != len(labels):
         raise ValueError("dfs et labels doivent avoir la même longueur.")
 
-    cleaned = [normalize(df, key_cols) for df in dfs]
-    sets_all = [keyset(df, key_cols) for df in cleaned]
+    with PROFILER.stage("ensembles_cles", rows=sum(len(df) for df in dfs)):
+        cleaned = [normalize(df, key_cols) for df in dfs]
+        cles = CodesCles(cleaned, key_cols)
+
+        summary, exclusive, common_df = compute_sets_summary(cles, labels, key_cols)
+
+    alignes = None
+    if alignement is not None and len(dfs) == 2:
+        with PROFILER.stage("alignement_approche") as mesure:
+            alignes, exclusive = aligner_exclusifs_paire(
+                exclusive, labels, key_cols, alignement
+            )
+            mesure["rows"] = len(alignes)
+        summary["Fuzzy-aligned entries"] = len(alignes)
+        for lbl in labels:
+            summary[f"Entries only in {lbl}"] = len(exclusive[lbl])
+        if not alignes.empty:
+            common_df = pd.concat([common_df, alignes], ignore_index=True)
+
+    diffs = None
+    if compare_fields:
+        with PROFILER.stage("diff_champs") as mesure:
+            if len(dfs) == 2:
+                diffs = compute_field_diffs(
+                    cleaned, key_cols, labels, fields_to_compare, alignes=alignes
+                )
+            elif len(dfs) > 2:
+                diffs = compute_field_diffs_multi(
+                    cleaned, key_cols, labels, fields_to_compare
+                ).diffs
+            mesure["rows"] = 0 if diffs is None else len(diffs)
 
-    summary = {f"Total entries in {lbl}": len(s) for lbl, s in zip(labels, sets_all)}
-    summary["Common entries in all matrices"] = len(set.intersection(*sets_all))
-    common_df = pd.DataFrame(set.intersection(*sets_all), columns=key_cols)
+    return summary, exclusive, common_df, diffs
 
-    summary, exclusive, common_df = compute_sets_summary(sets_all, labels, key_cols)
-    diffs = (
-        compute_field_diffs(cleaned, key_cols, labels, fields_to_compare)
-        if compare_fields and len(dfs) == 2
-        else None
-    )
 
-    return summary, exclusive, common_df, diffs
+def nom_feuille(nom: str) -> str:
+    """Rend un nom utilisable comme onglet Excel (31 caractères, sans []:*?/\\)."""
+    return re.sub(r"[\[\]:*?/\\]", "_", str(nom))[:31]
 
 
-def export_df_excel(df: pd.DataFrame, path: str):
-    """Travaille l'export en excel."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Analyse consolidée"
+def valeurs_cellules(serie, as_text=True):
+    """
+    Prépare les valeurs d'une colonne pour l'écriture Excel.
+
+    En mode texte, chaque cellule vaut `str(valeur)` (comportement historique
+    de l'export consolidé). Sinon les scalaires sont conservés, les valeurs
+    manquantes deviennent des cellules vides et les objets (listes, sets…)
+    sont convertis en texte, comme le ferait `DataFrame.to_excel`.
+    """
+    if as_text:
+        return valeurs_texte(serie)
+    valeurs = serie.to_numpy(dtype=object, copy=True)
+    valeurs[pd.isna(serie).to_numpy()] = None
+    for i, valeur in enumerate(valeurs):
+        if isinstance(valeur, (list, tuple, set, frozenset, dict)):
+            valeurs[i] = str(valeur)
+    return valeurs
 
-    # Écriture du DataFrame dans la feuille
-    for r_idx, row in enumerate(df.itertuples(index=False, name=None), start=2):
-        for c_idx, value in enumerate(row, start=1):
-            ws.cell(row=r_idx, column=c_idx, value=str(value))
 
-    # Écriture de l'en-tête (ligne 1)
-    for col_idx, col_name in enumerate(df.columns, start=1):
-        ws.cell(row=1, column=col_idx, value=col_name)
+def export_dfs_excel(feuilles: dict, path: str, as_text: bool = True):
+    """
+    Exporte plusieurs DataFrames dans un même classeur, un onglet chacun.
 
-    # Ajout du filtre automatique
-    ws.auto_filter.ref = f"A1:{get_column_letter(df.shape[1])}1"
+    L'écriture passe par un classeur openpyxl en mode write-only : les lignes
+    sont envoyées au fichier au fil de l'eau, sans créer d'objets cellule,
+    et la mémoire reste stable quelle que soit la taille de la sortie.
+    Les valeurs de chaque colonne ne sont converties qu'une fois ; les
+    largeurs sont calculées sur ces mêmes valeurs (le format xlsx impose
+    de les déclarer avant la première ligne).
 
+    Args:
+        feuilles (dict[str, pd.DataFrame]): Onglets à écrire, dans l'ordre.
+        path (str): Chemin du classeur produit.
+        as_text (bool): Écrit chaque cellule sous forme de texte.
+    """
+    with PROFILER.stage(
+        "export_xlsx",
+        file=os.path.basename(path),
+        rows=sum(len(df) for df in feuilles.values()),
+    ):
+        _export_dfs_excel(feuilles, path, as_text)
+
+
+def _export_dfs_excel(feuilles: dict, path: str, as_text: bool):
+    """Corps de `export_dfs_excel`."""
+    wb = Workbook(write_only=True)
+    for titre, df in feuilles.items():
+        ws = wb.create_sheet(title=nom_feuille(titre))
+        colonnes = [valeurs_cellules(df[col], as_text) for col in df.columns]
+        preparer_onglet(ws, df.columns, longueurs_valeurs(colonnes))
+        for row in zip(*colonnes):
+            ws.append(row)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.xlsx"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def longueurs_valeurs(colonnes) -> list[int]:
+    """Longueur maximale du texte des valeurs (non vides) de chaque colonne."""
+    maxima = []
+    for valeurs in colonnes:
+        longueurs = pd.Series(valeurs, dtype=object).dropna().map(str).str.len()
+        maxima.append(int(longueurs.max()) if len(longueurs) else 0)
+    return maxima
+
+
+def preparer_onglet(ws, noms, longueurs) -> None:
+    """Largeurs de colonnes, filtre automatique et en-tête d'un onglet write-only."""
     # Ajustement dynamique des largeurs par colonne
-    for col_idx, col in enumerate(df.columns, start=1):
-        col_letter = get_column_letter(col_idx)
-        max_length = max(
-            [len(str(cell)) if cell is not None else 0 for cell in df[col]] + [len(col)]
-        )
+    for col_idx, (col, longueur) in enumerate(zip(noms, longueurs), start=1):
+        max_length = max(longueur, len(str(col)))
         # Option : limite haute pour éviter les colonnes trop larges
-        adjusted_width = min(max_length + 1.5, 60)
-        ws.column_dimensions[col_letter].width = adjusted_width
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_length + 1.5, 60)
 
-    wb.save(path)
+    if len(noms):
+        # Ajout du filtre automatique
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(noms))}1"
+        ws.append([str(col) for col in noms])
 
 
-def analyser_couple_matrices(matrices_cibles, path="./data/GE_H2"):
-    """Analyse chaque paire de matrices STI et génère les fichiers de sortie."""
-    output_dir = os.path.join(path, "output")
+def export_df_excel(df: pd.DataFrame, path: str):
+    """Travaille l'export en excel."""
+    export_dfs_excel({"Analyse consolidée": df}, path)
+
+
+def analyser_couple_matrices(
+    matrices_cibles,
+    path=None,
+    loader=None,
+    store=None,
+    classeur_unique=False,
+    ecrire=None,
+    alignement=None,
+    base=None,
+    xlsx=True,
+):
+    """
+    Analyse chaque paire de matrices STI et génère les fichiers de sortie.
+
+    Si `loader` est fourni, il est réutilisé (avec son cache) et `path` est
+    ignoré ; sinon `path` est le dossier du jeu de données (sti_config.yaml).
+    `store` permet de partager les matrices préparées entre les paires.
+    `classeur_unique` regroupe les tables de la paire dans un seul classeur.
+    `ecrire` remplace `export_dfs_excel` pour les écritures (ex. thread d'écriture).
+    `alignement` active l'appariement approché des exclusives
+    (voir `compare_matrix_entries_multi`).
+    `base` (BaseResultats) enregistre les tables de la paire dans la base
+    des résultats ; sans `xlsx`, aucun classeur de paire n'est écrit.
+    """
+    if loader is None:
+        if path is None:
+            raise ValueError("Dossier du jeu de données (path) ou chargeur (loader) requis.")
+        loader = STILoader(os.path.join(path, "sti_config.yaml"))
+    output_dir = loader.output_dir
     os.makedirs(output_dir, exist_ok=True)
 
-    loader = STILoader(os.path.join(path, "sti_config.yaml"))
     cols_interessees = loader.get_fields_to_compare()
 
     dfs_requis, _, labels = charger_et_preparer_matrices(
-        matrices_cibles, loader
+        matrices_cibles, loader, store=store
     )
 
     if len(dfs_requis) != 2:
@@ -339,41 +978,227 @@ def analyser_couple_matrices(matrices_cibles, path="./data/GE_H2"):
         key_cols=KEY_COLS,
         compare_fields=True,
         fields_to_compare=cols_interessees,
+        alignement=alignement,
     )
 
     log_summary(summary)
-    exporter_resultats(output_dir, exclusifs, commun, divergents, labels)
-    return analyser_si_divergences(divergents, output_dir, labels)
+    return exporter_et_analyser(
+        output_dir, exclusifs, commun, divergents, labels, classeur_unique, ecrire, base, xlsx
+    )
 
 
-def charger_et_preparer_matrices(matrices_cibles, loader):
-    """Charge et prépares les matrices."""
-    dfs_requis = []
-    dfs_autres = {}
-    labels = []
+def exporter_et_analyser(
+    output_dir,
+    exclusifs,
+    commun,
+    divergents,
+    labels,
+    classeur_unique=False,
+    ecrire=None,
+    base=None,
+    xlsx=True,
+    analyse=None,
+):
+    """
+    Exporte les résultats d'une paire (classeurs si `xlsx`, base des
+    résultats si `base`) puis analyse ses divergences documentaires.
+    `analyse` : voir `analyser_si_divergences`.
+    """
+    if xlsx and not classeur_unique:
+        exporter_resultats(output_dir, exclusifs, commun, divergents, labels, ecrire=ecrire)
+        resultat = analyser_si_divergences(
+            divergents, output_dir, labels, ecrire=ecrire, analyse=analyse
+        )
+    else:
+        resultat = analyser_si_divergences(
+            divergents, output_dir, labels, exporter=False, analyse=analyse
+        )
+        if xlsx:
+            exporter_resultats(
+                output_dir,
+                exclusifs,
+                commun,
+                divergents,
+                labels,
+                res=resultat[0] if resultat is not None else None,
+                classeur_unique=True,
+                ecrire=ecrire,
+            )
+
+    if base is not None:
+        with PROFILER.stage("base_resultats"):
+            base.enregistrer_paire(
+                labels, exclusifs, commun, divergents,
+                resultat[0] if resultat is not None else None,
+            )
+    return resultat
+
+
+def analyser_groupe_matrices(
+    pairs, loader, store=None, classeur_unique=False, alignement=None, base=None, xlsx=True
+):
+    """
+    Analyse en une passe N-way les paires d'un même groupe (même suffixe).
 
-    for nom in matrices_cibles:
-        logging.info(" Chargement de la matrice %s", nom)
-        df = loader.get_matrix(nom)
-        df = nettoyer_colonnes(df)
+    Les matrices du groupe sont alignées une seule fois (`ComparaisonMulti`) ;
+    chaque paire reçoit ensuite les mêmes sorties que `analyser_couple_matrices`,
+    sa vue champ à champ étant extraite du résultat commun. La comparaison
+    N-way est exportée dans comparison_nway_<suffixe>.xlsx.
 
+    L'appariement approché (`alignement`) n'est pas disponible dans ce mode.
+    `base` et `xlsx` : voir `analyser_couple_matrices`.
+
+    Returns:
+        dict: paire -> (résultat, erreur). Une `OSError` au chargement d'une
+        matrice n'affecte que les paires qui l'utilisent.
+    """
+    if alignement is not None:
+        logging.warning("Alignement approché ignoré en comparaison N-way.")
+    output_dir = loader.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    cols_interessees = loader.get_fields_to_compare()
+
+    noms = sorted({nom for pair in pairs for nom in pair})
+    prepares, erreurs = {}, {}
+    for nom in noms:
+        try:
+            prepares[nom] = store.get(nom) if store is not None else preparer_matrice(nom, loader)
+        except OSError as e:
+            erreurs[nom] = e
+
+    valides = [nom for nom in noms if prepares.get(nom) is not None]
+    comparaison = None
+    if len(valides) >= 2:
+        with PROFILER.stage("diff_nway") as mesure:
+            comparaison = ComparaisonMulti(
+                [prepares[nom][0] for nom in valides], KEY_COLS, valides, cols_interessees
+            )
+            mesure["rows"] = len(comparaison.diffs)
+    if xlsx and len(valides) > 2 and not comparaison.diffs.empty:
+        suffixe = valides[0].split("_", 1)[-1]
+        path = f"{output_dir}/comparison_nway_{suffixe}.xlsx"
+        export_dfs_excel({"Sheet1": comparaison.diffs}, path, as_text=False)
+        logging.info(" Comparaison N-way enregistrée dans %s", path)
+
+    resultats = {}
+    for pair in pairs:
+        erreur = next((erreurs[nom] for nom in pair if nom in erreurs), None)
+        if erreur is not None:
+            resultats[pair] = (None, erreur)
+            continue
+        if any(prepares[nom] is None for nom in pair):
+            raise ValueError("Comparaison impossible : matrices incomplètes.")
+
+        labels = list(pair)
+        summary, exclusifs, commun, _ = compare_matrix_entries_multi(
+            [prepares[nom][0] for nom in pair], labels, key_cols=KEY_COLS
+        )
+        log_summary(summary)
+        with PROFILER.stage("diff_champs") as mesure:
+            divergents = comparaison.vue_paire(*pair)
+            mesure["rows"] = len(divergents)
+        resultats[pair] = (
+            exporter_et_analyser(
+                output_dir, exclusifs, commun, divergents, labels, classeur_unique,
+                base=base, xlsx=xlsx,
+            ),
+            None,
+        )
+    return resultats
+
+
+def preparer_matrice(nom, loader):
+    """
+    Charge une matrice et la prépare pour la comparaison : nettoyage des
+    colonnes, remapping, séparation requis / non-requis et normalisation des clés.
+
+    Avec `loader.low_memory`, les non-requis ne sont pas conservés (DataFrame
+    vide) et les requis sont compactés (`compacter_matrice`).
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame] | None: (requis, non-requis), ou None
+        si les colonnes clés sont absentes.
+    """
+    logging.info(" Chargement de la matrice %s", nom)
+    df = loader.get_matrix(nom)
+    with PROFILER.stage("preparation", matrix=nom, rows=len(df)):
         remap = loader.get_column_mapping(nom)
         if remap:
             logging.info(" Remapping détecté : %s", remap)
-            df = df.rename(columns=remap)
 
-        if not all(col in df.columns for col in KEY_COLS):
+        low_memory = getattr(loader, "low_memory", False)
+        prepared = preparer_lot(df, nom, loader, compacter=low_memory, remap=remap)
+        if prepared is None:
             logging.warning(" Colonnes clés manquantes dans %s", nom)
-            continue
+            return None
+
+        df_requis, df_non_requis = prepared
+        if low_memory:
+            logging.info("%s contient %s requis.", nom, len(df_requis))
+        else:
+            logging.info(
+                "%s contient %s requis et %s non-requis.",
+                nom,
+                len(df_requis),
+                len(df_non_requis),
+            )
+        return prepared
+
+
+def preparer_lot(df, nom, loader, compacter=False, remap=None):
+    """
+    Corps de `preparer_matrice`, applicable à tout ou partie des lignes
+    d'une matrice lue (les traitements sont ligne à ligne).
 
-        df_requis, df_non_requis = separer_requis(df)
-        logging.info(
-            "%s contient %s requis et %s non-requis.",
-            nom,
-            len(df_requis),
-            len(df_non_requis),
-        )
+    Avec `loader.low_memory`, les non-requis ne sont pas construits ;
+    `compacter` applique en plus `compacter_matrice` aux requis.
+    `remap` : remapping des colonnes déjà lu, sinon lu dans la configuration.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame] | None: (requis, non-requis), ou None
+        si les colonnes clés sont absentes.
+    """
+    df = nettoyer_colonnes(df)
+
+    remap = loader.get_column_mapping(nom) if remap is None else remap
+    if remap:
+        df = df.rename(columns=remap)
+
+    if not all(col in df.columns for col in KEY_COLS):
+        return None
+
+    fields = loader.get_fields_to_compare()
+    if fields and not a_empreintes(df, fields):  # Matrice lue sans empreintes
+        df = ajouter_empreintes(df, fields)
+
+    low_memory = getattr(loader, "low_memory", False)
+    df_requis, df_non_requis = separer_requis(df, copier=not low_memory)
+    df_requis = normalize(df_requis, KEY_COLS)
+    if compacter:
+        df_requis = compacter_matrice(df_requis)
+    return df_requis, df_non_requis
+
+
+def charger_et_preparer_matrices(matrices_cibles, loader, store=None):
+    """
+    Charge et prépares les matrices.
 
+    Si `store` (MatrixStore) est fourni, les matrices déjà préparées pendant
+    l'exécution sont reprises telles quelles au lieu d'être relues.
+    """
+    dfs_requis = []
+    dfs_autres = {}
+    labels = []
+
+    for nom in matrices_cibles:
+        if store is not None:
+            prepared = store.get(nom)
+        else:
+            prepared = preparer_matrice(nom, loader)
+        if prepared is None:
+            continue
+
+        df_requis, df_non_requis = prepared
         dfs_requis.append(df_requis)
         dfs_autres[nom] = df_non_requis
         labels.append(nom)
@@ -388,31 +1213,98 @@ def log_summary(summary):
         logging.info("%s: %s", k, v)
 
 
-def exporter_resultats(output_dir, exclusifs, commun, divergents, labels):
-    """Exporte les résultats en Excel."""
-    commun.to_excel(f"{output_dir}/entries_common_to_all.xlsx", index=False)
+def chemins_entrees_paire(output_dir, labels):
+    """
+    Classeurs des exigences communes et exclusives d'une paire :
+    (entries_common_to_<paire>.xlsx, {matrice: entries_unique_to_<matrice>_vs_<autre>.xlsx}).
+
+    Nommés par paire, ils ne sont pas réécrits par les autres paires d'une
+    même matrice (une paire reprise du manifeste garde ainsi les siens).
+    """
+    nom_concat = "-".join(labels)
+    return (
+        f"{output_dir}/entries_common_to_{nom_concat}.xlsx",
+        {
+            nom: f"{output_dir}/entries_unique_to_{nom}_vs_"
+            + "-".join(autre for autre in labels if autre != nom)
+            + ".xlsx"
+            for nom in labels
+        },
+    )
+
+
+def exporter_resultats(
+    output_dir,
+    exclusifs,
+    commun,
+    divergents,
+    labels,
+    res=None,
+    classeur_unique=False,
+    ecrire=None,
+):
+    """
+    Exporte les résultats en Excel.
+
+    Par défaut, chaque table est écrite dans son propre fichier. Avec
+    `classeur_unique`, toutes les tables de la paire (y compris l'analyse
+    documentaire `res`) sont regroupées dans resultats_<paire>.xlsx.
+    `ecrire` remplace `export_dfs_excel` (même signature).
+    """
+    ecrire = ecrire or export_dfs_excel
+    nom_concat = "-".join(labels)
+    a_divergences = divergents is not None and not divergents.empty
+
+    if classeur_unique:
+        onglets = {"Communs": commun}
+        onglets.update({f"Uniques {nom}": df for nom, df in exclusifs.items()})
+        if a_divergences:
+            onglets["Comparaison"] = divergents
+        if res is not None:
+            onglets["Analyse documentaire"] = res
+        path = f"{output_dir}/resultats_{nom_concat}.xlsx"
+        ecrire(onglets, path, as_text=False)
+        logging.info(" Résultats de la paire enregistrés dans %s", path)
+        return
+
+    chemin_communs, chemins_exclusifs = chemins_entrees_paire(output_dir, labels)
+    ecrire({"Sheet1": commun}, chemin_communs, as_text=False)
     for nom, df in exclusifs.items():
-        df.to_excel(f"{output_dir}/entries_unique_to_{nom}.xlsx", index=False)
+        ecrire({"Sheet1": df}, chemins_exclusifs[nom], as_text=False)
 
-    if divergents is not None and not divergents.empty:
-        nom_concat = "-".join(labels)
-        divergents.to_excel(f"{output_dir}/comparison_{nom_concat}.xlsx", index=False)
+    if a_divergences:
+        ecrire(
+            {"Sheet1": divergents},
+            f"{output_dir}/comparison_{nom_concat}.xlsx",
+            as_text=False,
+        )
 
 
-def analyser_si_divergences(divergents, output_dir, labels):
-    """Analyses les divergences."""
+def analyser_si_divergences(
+    divergents, output_dir, labels, exporter=True, ecrire=None, analyse=None
+):
+    """
+    Analyses les divergences.
+
+    `analyse` reprend un résultat (res, set1, set2) déjà calculé de
+    `analyser_divergences_documentaires` (ex. moteur polars).
+    """
     if divergents is not None and not divergents.empty:
         requis_impactes = set(divergents["Reference"])
         logging.info(" Nombre de requis impactés : %s", len(requis_impactes))
-        res, set1, set2 = analyser_divergences_documentaires(divergents, source_cols=labels)
-        res_filen = f"{output_dir}/res_ana_div_{'-'.join(labels)}.xlsx"
-        res.to_excel(res_filen, index=False)
-        logging.info(" Analyse documentaire enregistrée dans %s", res_filen)
+        if analyse is None:
+            analyse = analyser_divergences_documentaires(divergents, source_cols=labels)
+        res, set1, set2 = analyse
+        if exporter:
+            res_filen = f"{output_dir}/res_ana_div_{'-'.join(labels)}.xlsx"
+            (ecrire or export_dfs_excel)({"Sheet1": res}, res_filen, as_text=False)
+            logging.info(" Analyse documentaire enregistrée dans %s", res_filen)
         return res, set1, set2
 
     logging.info(" Aucun champ divergent détecté.")
     return None
 
+
 def enrichir_colonne_difference(df_diff: pd.DataFrame, df_docs: pd.DataFrame, labels) -> pd.DataFrame:
     """
     Transforme et enrichit la colonne 'Différence' en format lisible,
@@ -420,45 +1312,11 @@ def enrichir_colonne_difference(df_diff: pd.DataFrame, df_docs: pd.DataFrame, la
 
     Args:
         df_diff (pd.DataFrame): DataFrame contenant une colonne 'Différence'.
-        df_docs (pd.DataFrame): Référentinel documentaire avec 'Référence ALSTOM', 'Titre', 'Révision'.
+        df_docs (pd.DataFrame | DocumentIndex): Référentinel documentaire avec
+            'Référence ALSTOM', 'Titre', 'Révision', ou index déjà construit.
 
     Returns:
         pd.DataFrame: DataFrame avec nouvelle colonne 'Différence intitulée' enrichie.
     """
-     # Nettoyage
-    df_docs["N°"] = df_docs["N°"].astype(str).str.strip()
-    df_docs["Référence ALSTOM"] = df_docs["Référence ALSTOM"].astype(str).str.strip()
-    df_docs["Titre"] = df_docs["Titre"].fillna("").astype(str).str.strip()
-    df_docs["Révision"] = df_docs["Révision"].fillna("").astype(str).str.strip()
-
-    # Clé composée
-    df_docs["clé"] = df_docs["N°"] + "_" + df_docs["Référence ALSTOM"]
-    doc_info = {
-        row["Référence ALSTOM"]: {"Titre": row["Titre"], "Révision": row["Révision"]}
-        for _, row in df_docs.iterrows()
-    }
-
-    def enrichir_cellule(cellule: str) -> str:
-        if not isinstance(cellule, str):
-            return ""
-        lignes = cellule.strip().splitlines()
-        lignes_enrichies = []
-        for ligne in lignes:
-            m = re.match(f"^({labels[0]}|{labels[1]})\\s*:\\s*(.*)", ligne.strip())
-            if not m:
-                continue
-            prefixe, contenu = m.groups()
-            ids = [s.strip() for s in contenu.split(",")]
-            bloc = []
-            for doc_id in ids:
-                info = doc_info.get(doc_id, {})
-                titre = info.get("Titre", "❓")
-                rev = info.get("Révision", "")
-                bloc.append(f"- {doc_id} – {rev} – {titre}")
-            lignes_enrichies.append(f"{prefixe} :\n  " + "\n  ".join(bloc))
-        return "\n".join(lignes_enrichies)
-
-    df_diff["Différence intitulée"] = df_diff["Différence"].apply(enrichir_cellule)
-    df_diff["Différence"] = df_diff["Différence intitulée"]
-    df_diff.drop(columns=["Différence intitulée"], inplace=True)
-    return df_diff
+    index = df_docs if isinstance(df_docs, DocumentIndex) else DocumentIndex.from_frame(df_docs)
+    return index.enrichir(df_diff, labels)
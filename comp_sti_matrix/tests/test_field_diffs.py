@@ -0,0 +1,80 @@
+"""Parité de `compute_field_diffs` avec la comparaison historique clé par clé."""
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from comp_sti_matrix.core.sti_loader import KEY_COLS
+from comp_sti_matrix.core.empreintes import ajouter_empreintes
+from comp_sti_matrix.core.utils_structural import (
+    compute_field_diffs,
+    dedoublonner_cles,
+    normalize,
+)
+
+LABELS = ["GE_LOC", "H2_LOC"]
+CHAMPS = ["Texte", "Entier", "Reel", "Option", "Absent"]
+
+
+def diffs_par_cle(cleaned, key_cols, labels, fields_to_compare):
+    """Implémentation historique : boucle sur les clés communes et les champs."""
+    df1 = dedoublonner_cles(cleaned[0], key_cols).set_index(key_cols)
+    df2 = dedoublonner_cles(cleaned[1], key_cols).set_index(key_cols)
+    rows = []
+    for idx in df1.index.intersection(df2.index):
+        for col in fields_to_compare:
+            val1 = str(df1.at[idx, col]) if col in df1.columns else ""
+            val2 = str(df2.at[idx, col]) if col in df2.columns else ""
+            if val1 != val2:
+                row = dict(zip(key_cols, idx))
+                row.update({"Champ": col, labels[0]: val1, labels[1]: val2})
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def matrice_aleatoire(rng, avec_option):
+    """Requis aléatoires : NaN, entiers, réels, champ optionnel et clés dupliquées."""
+    n = rng.randint(0, 60)
+    cles = rng.sample(range(80), n)
+    cles += rng.sample(cles, min(len(cles), rng.randint(0, 3)))  # Doublons
+    df = pd.DataFrame({
+        "Reference": [f"R{k % 9}" for k in cles],
+        "Requirement": [f" exigence {k} " for k in cles],
+        "Texte": [rng.choice(["voir DOC-1", "voir DOC-2", None, np.nan]) for _ in cles],
+        "Entier": [rng.choice([1, 2]) for _ in cles],
+        "Reel": [rng.choice([1.5, np.nan]) for _ in cles],
+    })
+    if avec_option:
+        df["Option"] = [rng.choice(["a", "b"]) for _ in cles]
+    return normalize(df, KEY_COLS)
+
+
+@pytest.mark.parametrize("empreintes", [False, True])
+@pytest.mark.parametrize("graine", range(40))
+def test_parite_boucle_historique(graine, empreintes):
+    rng = random.Random(graine)
+    cleaned = [matrice_aleatoire(rng, graine % 2), matrice_aleatoire(rng, graine % 3 == 0)]
+    attendu = diffs_par_cle(cleaned, KEY_COLS, LABELS, CHAMPS)
+
+    if empreintes:
+        cleaned = [ajouter_empreintes(df, CHAMPS) for df in cleaned]
+    obtenu = compute_field_diffs(cleaned, KEY_COLS, LABELS, CHAMPS)
+
+    pd.testing.assert_frame_equal(obtenu, attendu)
+
+
+def test_cles_dupliquees_premiere_occurrence():
+    gauche = normalize(pd.DataFrame({
+        "Reference": ["R1", "R1"], "Requirement": ["q", "q"], "Texte": ["a", "b"],
+    }), KEY_COLS)
+    droite = normalize(pd.DataFrame({
+        "Reference": ["R1"], "Requirement": ["q"], "Texte": ["b"],
+    }), KEY_COLS)
+
+    diffs = compute_field_diffs([gauche, droite], KEY_COLS, LABELS, ["Texte"])
+
+    assert diffs.to_dict("records") == [
+        {"Reference": "R1", "Requirement": "q", "Champ": "Texte", "GE_LOC": "a", "H2_LOC": "b"}
+    ]
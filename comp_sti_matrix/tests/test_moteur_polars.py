@@ -0,0 +1,94 @@
+"""Parité du moteur polars avec le moteur pandas sur un jeu synthétique."""
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("polars")
+
+from comp_sti_matrix.bench.synthetic import generer_dataset
+from comp_sti_matrix.core.main import STIAnalyzer
+from comp_sti_matrix.core.sti_loader import STILoader, KEY_COLS
+from comp_sti_matrix.core.moteur_polars import (
+    MOTEUR_POLARS,
+    comparer_paire_polars,
+    preparer_lazy,
+    source_lazy,
+)
+from comp_sti_matrix.core.utils_structural import (
+    analyser_divergences_documentaires,
+    compare_matrix_entries_multi,
+    get_matrix_pairs,
+    preparer_matrice,
+)
+
+
+def assert_memes_tables(attendu, obtenu):
+    """Mêmes colonnes, lignes et valeurs, dans le même ordre (types ignorés)."""
+    pd.testing.assert_frame_equal(
+        attendu.astype(object), obtenu.astype(object),
+        check_dtype=False, check_index_type=False,
+    )
+
+
+@pytest.fixture(scope="module")
+def config_synthetique(tmp_path_factory):
+    return generer_dataset(
+        str(tmp_path_factory.mktemp("synthetique") / "GE_H2"),
+        n_requirements=400,
+        stis=("LOC", "ENE"),
+        n_fields=4,
+        taux_divergence=0.2,
+        taux_absence=0.1,
+        n_docs=40,
+        n_extra_cols=2,
+        seed=3,
+    )
+
+
+@pytest.fixture(scope="module", params=[True, False], ids=["parquet", "sans-cache"])
+def comparaisons(request, config_synthetique):
+    """(labels, résultat pandas, résultat polars) de chaque paire du jeu."""
+    loader = STILoader(config_synthetique, use_cache=request.param)
+    fields = loader.get_fields_to_compare()
+    resultats = []
+    for pair in get_matrix_pairs(loader):
+        labels = list(pair)
+        dfs = [preparer_matrice(nom, loader)[0] for nom in labels]
+        _, exclusifs, commun, divergents = compare_matrix_entries_multi(
+            dfs, labels, key_cols=KEY_COLS, compare_fields=True, fields_to_compare=fields
+        )
+        analyse = analyser_divergences_documentaires(divergents, source_cols=labels)
+        polars = comparer_paire_polars(
+            [preparer_lazy(source_lazy(nom, loader), nom, loader) for nom in labels],
+            labels,
+            fields,
+        )
+        resultats.append((labels, (exclusifs, commun, divergents, analyse), polars[1:]))
+    return resultats
+
+
+def test_memes_differences(comparaisons):
+    for labels, attendu, obtenu in comparaisons:
+        exclusifs, commun, divergents, _ = attendu
+        exclusifs_pl, commun_pl, divergents_pl, _ = obtenu
+        assert not divergents.empty
+        assert_memes_tables(divergents, divergents_pl)
+        assert_memes_tables(commun, commun_pl)
+        for nom in labels:
+            assert_memes_tables(exclusifs[nom], exclusifs_pl[nom])
+
+
+def test_meme_analyse_documentaire(comparaisons):
+    for _, attendu, obtenu in comparaisons:
+        res, set1, set2 = attendu[3]
+        res_pl, set1_pl, set2_pl = obtenu[3]
+        assert_memes_tables(res, res_pl)
+        assert (set1, set2) == (set1_pl, set2_pl)
+
+
+def test_meme_consolidation(comparaisons):
+    attendu = {"-".join(labels): res[3][0] for labels, res, _ in comparaisons}
+    obtenu = {"-".join(labels): res[3][0] for labels, _, res in comparaisons}
+    consolide = STIAnalyzer.consolider_dfs(attendu)
+    assert consolide is not None
+    assert_memes_tables(consolide, STIAnalyzer.consolider_dfs(obtenu, MOTEUR_POLARS))